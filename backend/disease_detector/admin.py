@@ -1,10 +1,11 @@
 from django.contrib import admin
-from .models import PlantDisease, Treatment, PreventionTip, Diagnosis, DiagnosisHistory
+from django.utils.html import format_html
+from .models import PlantDisease, Treatment, PreventionTip, Diagnosis, DiagnosisHistory, DiagnosisRollup
 
 
 @admin.register(PlantDisease)
 class PlantDiseaseAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description')
+    list_display = ('name', 'plant_type', 'scientific_name', 'is_healthy')
 
 
 @admin.register(Treatment)
@@ -19,10 +20,23 @@ class PreventionTipAdmin(admin.ModelAdmin):
 
 @admin.register(Diagnosis)
 class DiagnosisAdmin(admin.ModelAdmin):
-    list_display = ('result', 'confidence', 'created_at')
+    list_display = ('preview', 'result', 'confidence', 'created_at')
+    readonly_fields = ('preview', 'content_hash')
+
+    @admin.display(description='Image')
+    def preview(self, obj):
+        # Thumbnails keep the changelist light; originals can be several megabytes each
+        if not obj.thumbnail:
+            return '-'
+        return format_html('<img src="{}" alt="" loading="lazy">', obj.thumbnail.url)
 
 
 @admin.register(DiagnosisHistory)
 class DiagnosisHistoryAdmin(admin.ModelAdmin):
     list_display = ('diagnosis', 'date', 'notes')
 
+
+@admin.register(DiagnosisRollup)
+class DiagnosisRollupAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'period', 'result', 'plant_type', 'is_healthy', 'count')
+    list_filter = ('period', 'is_healthy', 'plant_type')
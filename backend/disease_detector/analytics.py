@@ -0,0 +1,178 @@
+"""
+Outbreak analytics from pre-aggregated diagnosis rollups.
+
+Every saved diagnosis adds one to its day row and its week row in
+DiagnosisRollup, inside the transaction that saves it, so the rollups always
+agree with the diagnosis table. Queries read at most one row per period,
+disease and health flag, whatever the size of the history.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Diagnosis, DiagnosisRollup
+
+PERIODS = (DiagnosisRollup.DAY, DiagnosisRollup.WEEK)
+KEY_FIELDS = ('period', 'period_start', 'result', 'plant_type', 'is_healthy')
+
+
+def period_start(day, period):
+    """The day itself, or the Monday of its week"""
+    return day - timedelta(days=day.weekday()) if period == DiagnosisRollup.WEEK else day
+
+
+def period_starts(start, end, period):
+    """Every period start from the period containing start up to end, inclusive"""
+    step = timedelta(days=7 if period == DiagnosisRollup.WEEK else 1)
+    current = period_start(start, period)
+    starts = []
+    while current <= end:
+        starts.append(current)
+        current += step
+    return starts
+
+
+def _add(totals, key, count, confidence_sum):
+    previous_count, previous_sum = totals.get(key, (0, 0.0))
+    totals[key] = (previous_count + count, previous_sum + confidence_sum)
+
+
+def record_diagnoses(diagnoses, sign=1):
+    """Add saved diagnoses to the rollups (sign=-1 takes deleted ones out); call inside the saving transaction"""
+    deltas = {}
+    for diagnosis in diagnoses:
+        day = timezone.localdate(diagnosis.created_at)
+        for period in PERIODS:
+            key = (period, period_start(day, period), diagnosis.result, diagnosis.plant_type, diagnosis.is_healthy)
+            _add(deltas, key, sign, sign * diagnosis.confidence)
+
+    # Sorted, so concurrent writers lock rows in the same order and can't deadlock
+    for key, (count, confidence_sum) in sorted(deltas.items()):
+        rows = DiagnosisRollup.objects.filter(**dict(zip(KEY_FIELDS, key)))
+        changes = {'count': F('count') + count, 'confidence_sum': F('confidence_sum') + confidence_sum}
+        if rows.update(**changes) or count <= 0:
+            continue
+        try:
+            # Savepoint: another worker may create the same row between our update and insert
+            with transaction.atomic():
+                DiagnosisRollup.objects.create(count=count, confidence_sum=confidence_sum, **dict(zip(KEY_FIELDS, key)))
+        except IntegrityError:
+            rows.update(**changes)
+
+
+def rebuild_rollups(since=None):
+    """
+    Recompute the rollups from the diagnosis table: all of them, or from the week
+    containing `since` onwards. Returns the number of rollup rows written.
+    """
+    rollups = DiagnosisRollup.objects.all()
+    diagnoses = Diagnosis.objects.all()
+    if since is not None:
+        # Whole weeks, so the first week row is recomputed from all of its days
+        since = period_start(since, DiagnosisRollup.WEEK)
+        rollups = rollups.filter(period_start__gte=since)
+        diagnoses = diagnoses.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+
+    with transaction.atomic():
+        rollups.delete()
+        # One aggregate query per rebuild; day rows come from the database, week rows from the day rows
+        daily = (
+            diagnoses.annotate(day=TruncDate('created_at'))
+            .values('day', 'result', 'plant_type', 'is_healthy')
+            .annotate(count=Count('id'), confidence_sum=Sum('confidence'))
+            .order_by()
+        )
+        totals = {}
+        for row in daily.iterator():
+            for period in PERIODS:
+                key = (period, period_start(row['day'], period), row['result'], row['plant_type'], row['is_healthy'])
+                _add(totals, key, row['count'], row['confidence_sum'] or 0.0)
+
+        DiagnosisRollup.objects.bulk_create(
+            [
+                DiagnosisRollup(count=count, confidence_sum=confidence_sum, **dict(zip(KEY_FIELDS, key)))
+                for key, (count, confidence_sum) in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def _ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def _summary(count, healthy, confidence_sum):
+    return {
+        'count': count,
+        'healthy': healthy,
+        'diseased': count - healthy,
+        'healthy_ratio': _ratio(healthy, count),
+        'mean_confidence': _ratio(confidence_sum, count),
+    }
+
+
+def query_rollups(start, end, period=DiagnosisRollup.DAY, plant_type=None, result=None):
+    """Diagnosis counts from start to end (inclusive dates): totals, per disease, per plant type and per period"""
+    starts = period_starts(start, end, period)
+    rows = DiagnosisRollup.objects.filter(period=period, period_start__gte=starts[0], period_start__lte=end)
+    if plant_type:
+        rows = rows.filter(plant_type__iexact=plant_type)
+    if result:
+        rows = rows.filter(result=result)
+
+    series = {day: {'count': 0, 'healthy': 0, 'confidence_sum': 0.0, 'by_disease': {}} for day in starts}
+    diseases, plant_types = {}, {}
+    for row in rows.values('period_start', 'result', 'plant_type', 'is_healthy', 'count', 'confidence_sum'):
+        healthy = row['count'] if row['is_healthy'] else 0
+        for entry in (
+            series[row['period_start']],
+            diseases.setdefault((row['result'], row['plant_type'], row['is_healthy']), {}),
+            plant_types.setdefault(row['plant_type'], {}),
+        ):
+            entry['count'] = entry.get('count', 0) + row['count']
+            entry['healthy'] = entry.get('healthy', 0) + healthy
+            entry['confidence_sum'] = entry.get('confidence_sum', 0.0) + row['confidence_sum']
+        by_disease = series[row['period_start']]['by_disease']
+        by_disease[row['result']] = by_disease.get(row['result'], 0) + row['count']
+
+    total = sum(entry['count'] for entry in series.values())
+    healthy = sum(entry['healthy'] for entry in series.values())
+    confidence_sum = sum(entry['confidence_sum'] for entry in series.values())
+    return {
+        'period': period,
+        'start': starts[0],
+        'end': end,
+        'totals': _summary(total, healthy, confidence_sum),
+        'by_disease': sorted(
+            (
+                {
+                    'disease': name, 'plant_type': plant, 'is_healthy': is_healthy, 'count': entry['count'],
+                    'share': _ratio(entry['count'], total),
+                    'mean_confidence': _ratio(entry['confidence_sum'], entry['count']),
+                }
+                for (name, plant, is_healthy), entry in diseases.items()
+            ),
+            key=lambda entry: entry['count'],
+            reverse=True,
+        ),
+        'by_plant_type': sorted(
+            (
+                dict(_summary(entry['count'], entry['healthy'], entry['confidence_sum']), plant_type=plant)
+                for plant, entry in plant_types.items()
+            ),
+            key=lambda entry: entry['count'],
+            reverse=True,
+        ),
+        'series': [
+            dict(
+                _summary(entry['count'], entry['healthy'], entry['confidence_sum']),
+                period_start=day,
+                by_disease=entry['by_disease'],
+            )
+            for day, entry in series.items()
+        ],
+    }
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class DiseaseDetectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'disease_detector'
\ No newline at end of file
+    name = 'disease_detector'
+
+    def ready(self):
+        from . import signals  # noqa: F401
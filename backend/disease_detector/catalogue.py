@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.pagination import PageNumberPagination
+
+from .models import PlantDisease
+from .serializers import PlantDiseaseSerializer
+from .versioning import CATALOGUE, VersionedCache
+
+
+class Catalogue:
+    """The whole disease catalogue, serialized once for one data version"""
+
+    def __init__(self, version, updated_at, items):
+        self.version = version
+        self.last_modified = int(updated_at.timestamp()) if updated_at else None
+        self.items = items
+        self.by_id = {item['id']: item for item in items}
+
+
+def build_catalogue(version, updated_at):
+    # Three queries in total, however many diseases, treatments and tips there are
+    diseases = PlantDisease.objects.prefetch_related('treatments', 'prevention_tips').order_by('id')
+    return Catalogue(version, updated_at, PlantDiseaseSerializer(diseases, many=True).data)
+
+
+catalogue_cache = VersionedCache(CATALOGUE, build_catalogue, settings.KNOWLEDGE_VERSION_CHECK_SECONDS)
+
+
+def get_catalogue():
+    return catalogue_cache.get()
+
+
+def etag_for(request, catalogue, *parts):
+    """Strong ETag for one representation: data version plus everything that shapes the body"""
+    digest = hashlib.sha1(
+        '|'.join([str(catalogue.version), request.get_host(), *map(str, parts)]).encode()
+    ).hexdigest()[:20]
+    return f'"{catalogue.version}-{digest}"'
+
+
+def conditional_response(request, catalogue, etag, response):
+    """Attach validators and turn the response into a 304 when the client's copy is current"""
+    response['ETag'] = etag
+    if catalogue.last_modified is not None:
+        response['Last-Modified'] = http_date(catalogue.last_modified)
+    # Clients may keep the copy but must revalidate; revalidation is a cheap 304
+    patch_cache_control(response, no_cache=True)
+    return get_conditional_response(request, etag=etag, last_modified=catalogue.last_modified, response=response)
+
+
+def paginate(request, catalogue):
+    """Apply the configured DRF pagination to the cached catalogue list"""
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(catalogue.items, request)
+    return paginator.get_paginated_response(page)
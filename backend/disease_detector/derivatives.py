@@ -0,0 +1,85 @@
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from ml_model.image_io import encode_jpeg, reduce_image, thumbnail_image
+from ml_model.metrics import time_stage
+from .models import Diagnosis
+from .storage import diagnosis_storage
+from .write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+
+def digest_of(name):
+    """Content hash encoded in a content-addressed storage name"""
+    return posixpath.splitext(posixpath.basename(name))[0]
+
+
+def model_resolution_copy(data):
+    """Re-encoded JPEG of an image scaled so its shorter side is the model input size"""
+    return encode_jpeg(reduce_image(data, settings.DIAGNOSIS_MODEL_IMAGE_SIZE), settings.DIAGNOSIS_JPEG_QUALITY)
+
+
+def derivative_job(diagnosis):
+    return {
+        'diagnosis_id': diagnosis.pk,
+        'image': diagnosis.image.name,
+        'content_hash': diagnosis.content_hash,
+        'model_image': diagnosis.model_image.name or None,
+    }
+
+
+def build_derivatives(jobs):
+    """Make thumbnails and model-resolution copies for a batch of diagnoses, reusing any already made for the same content"""
+    with time_stage('derivatives'):
+        hashes = {job['content_hash'] for job in jobs}
+        done = {
+            content_hash: (thumbnail, model_image)
+            for content_hash, thumbnail, model_image in Diagnosis.objects.filter(content_hash__in=hashes)
+            .exclude(thumbnail='').values_list('content_hash', 'thumbnail', 'model_image')
+        }
+
+        updates = []
+        for job in jobs:
+            content_hash = job['content_hash']
+            if content_hash not in done:
+                try:
+                    with diagnosis_storage.open(job['image']) as f:
+                        data = f.read()
+                    thumbnail = diagnosis_storage.save('diagnoses/thumbnails/thumbnail.jpg', ContentFile(encode_jpeg(
+                        thumbnail_image(data, settings.DIAGNOSIS_THUMBNAIL_SIZE), settings.DIAGNOSIS_JPEG_QUALITY
+                    )))
+                    model_image = job['model_image'] or diagnosis_storage.save(
+                        'diagnoses/model/model.jpg', ContentFile(model_resolution_copy(data))
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not build derivatives for diagnosis {job['diagnosis_id']}: {e}")
+                    continue
+                done[content_hash] = (thumbnail, model_image)
+
+            thumbnail, model_image = done[content_hash]
+            updates.append(Diagnosis(pk=job['diagnosis_id'], thumbnail=thumbnail, model_image=model_image))
+
+        Diagnosis.objects.bulk_update(updates, ['thumbnail', 'model_image'])
+
+
+derivative_queue = WriteBehindQueue(
+    build_derivatives,
+    max_records=settings.DIAGNOSIS_DERIVATIVE_QUEUE_MAX,
+    batch_size=50,
+    flush_interval=1.0,
+    name='derivative-builder',
+)
+# Drained at exit by write_behind.shutdown_queues, after the history writer whose flushes feed it
+
+
+def queue_derivatives(diagnoses):
+    """Schedule thumbnails and model-resolution copies to be built in the background"""
+    for diagnosis in diagnoses:
+        if not derivative_queue.submit(derivative_job(diagnosis)):
+            logger.warning(
+                f'Derivative queue full; diagnosis {diagnosis.pk} has no thumbnail until backfill_derivatives runs'
+            )
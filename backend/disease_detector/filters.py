@@ -0,0 +1,29 @@
+from datetime import datetime, time, timedelta
+
+import django_filters
+from django.utils import timezone
+
+from .models import DiagnosisHistory
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class DiagnosisHistoryFilter(django_filters.FilterSet):
+    """History filters, each served by one of DiagnosisHistory's composite indexes"""
+    disease = django_filters.CharFilter(field_name='result')
+    is_healthy = django_filters.BooleanFilter()
+    # Whole local days, as ranges on the raw column (date__date would defeat the index)
+    start = django_filters.DateFilter(method='filter_start')
+    end = django_filters.DateFilter(method='filter_end')
+
+    class Meta:
+        model = DiagnosisHistory
+        fields = ['disease', 'is_healthy', 'start', 'end']
+
+    def filter_start(self, queryset, name, value):
+        return queryset.filter(date__gte=_start_of(value))
+
+    def filter_end(self, queryset, name, value):
+        return queryset.filter(date__lt=_start_of(value + timedelta(days=1)))
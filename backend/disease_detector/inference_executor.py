@@ -0,0 +1,97 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from ml_model.metrics import QUEUE_DEPTH
+
+
+class InferenceOverloaded(Exception):
+    """Raised instead of queueing when the inference executor is at its depth limit"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Inference queue is full; retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class BoundedInferenceExecutor:
+    """
+    Dedicated thread pool for blocking inference work with admission control.
+
+    depth counts jobs running or waiting in the pool. Once it reaches max_depth,
+    run() raises InferenceOverloaded straight away so the caller can shed load,
+    rather than letting the backlog (and with it latency) grow without bound.
+    """
+
+    def __init__(self, max_workers=4, max_depth=32):
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+        self.depth = 0
+        self.completed = 0
+        self.rejected = 0
+        # Exponentially weighted mean job time, used to estimate Retry-After
+        self.mean_seconds = 0.5
+        self._depth_gauge = QUEUE_DEPTH.labels('inference_executor')
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        return max(1, math.ceil(self.mean_seconds * self.depth / self.max_workers))
+
+    @property
+    def saturated(self):
+        return self.depth >= self.max_depth
+
+    def shed(self):
+        """Record a request turned away before submission; returns its Retry-After"""
+        with self._lock:
+            self.rejected += 1
+        return self.retry_after()
+
+    def _call(self, fn, args):
+        try:
+            return fn(*args)
+        finally:
+            # Pool threads are long-lived; don't let them hold stale DB connections
+            close_old_connections()
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.depth >= self.max_depth:
+                self.rejected += 1
+                raise InferenceOverloaded(self.retry_after())
+            self.depth += 1
+        self._depth_gauge.inc()
+
+        started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._call, fn, args)
+        finally:
+            elapsed = time.monotonic() - started
+            self._depth_gauge.dec()
+            with self._lock:
+                self.depth -= 1
+                self.completed += 1
+                self.mean_seconds = 0.9 * self.mean_seconds + 0.1 * elapsed
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'workers': self.max_workers,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'mean_seconds': round(self.mean_seconds, 4),
+        }
+
+
+inference_executor = BoundedInferenceExecutor(
+    max_workers=settings.INFERENCE_EXECUTOR_WORKERS,
+    max_depth=settings.INFERENCE_MAX_QUEUE_DEPTH,
+)
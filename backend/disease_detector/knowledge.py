@@ -0,0 +1,41 @@
+from django.conf import settings
+
+from ml_model.custom_predictor import predictor
+from ml_model.knowledge import BUILTIN_DISEASES, DiseaseKnowledgeIndex, default_info, normalize_label
+from .models import PlantDisease
+from .versioning import CATALOGUE, VersionedCache
+
+
+def _disease_entry(disease, fallback):
+    """Knowledge entry from a PlantDisease row; blank fields keep the built-in/default values"""
+    treatments = [t.name for t in disease.treatments.all()]
+    tips = [t.tip for t in disease.prevention_tips.all()]
+    return {
+        'scientific_name': disease.scientific_name or fallback['scientific_name'],
+        'plant_type': disease.plant_type or fallback['plant_type'],
+        'symptoms': disease.symptoms or fallback['symptoms'],
+        'causes': disease.causes or fallback['causes'],
+        'treatment_advice': treatments or fallback['treatment_advice'],
+        'prevention_tips': tips or fallback['prevention_tips'],
+        'is_healthy': disease.is_healthy or fallback['is_healthy'],
+    }
+
+
+def build_index(version, updated_at):
+    """Compile built-in entries overlaid with the database into one index"""
+    entries = {normalize_label(key): info for key, info in BUILTIN_DISEASES.items()}
+    for disease in PlantDisease.objects.prefetch_related('treatments', 'prevention_tips'):
+        key = normalize_label(disease.name)
+        entries[key] = _disease_entry(disease, entries.get(key) or default_info(disease.name))
+
+    # Labels can only be pre-matched once the model (and its id2label) is loaded
+    id2label = predictor.id2label if predictor.model_loaded else None
+    return DiseaseKnowledgeIndex(entries, id2label, version=version)
+
+
+knowledge_index = VersionedCache(CATALOGUE, build_index, settings.KNOWLEDGE_VERSION_CHECK_SECONDS)
+
+
+def get_disease_info(disease_name):
+    """O(1) disease info lookup; reflects admin edits within KNOWLEDGE_VERSION_CHECK_SECONDS"""
+    return knowledge_index.get().lookup(disease_name)
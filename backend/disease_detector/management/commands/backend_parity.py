@@ -0,0 +1,57 @@
+import json
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model.custom_predictor import MODEL_NAME, MODEL_REVISION
+from ml_model.image_io import load_image
+from ml_model.inference_backends import compare_backends, get_backend
+from ml_model.preprocessing import BatchPreprocessor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class Command(BaseCommand):
+    help = 'Check that two inference backends agree on top-1 label and confidence'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reference', default='torch')
+        parser.add_argument('--candidate', default='onnx')
+        parser.add_argument('--images', help='Directory of sample images (synthetic images when omitted)')
+        parser.add_argument('--limit', type=int, default=32)
+        parser.add_argument('--tolerance', type=float, default=1e-3)
+
+    def load_images(self, directory, limit):
+        if not directory:
+            rng = np.random.default_rng(0)
+            return [load_image(rng.integers(0, 255, size=(256, 256, 3), dtype=np.uint8)) for _ in range(limit)]
+
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )[:limit]
+        if not paths:
+            raise CommandError(f'No images found in {directory}')
+        return [load_image(path) for path in paths]
+
+    def handle(self, *args, **options):
+        from transformers import ViTFeatureExtractor
+
+        feature_extractor = ViTFeatureExtractor.from_pretrained(MODEL_NAME, revision=MODEL_REVISION)
+        images = self.load_images(options['images'], options['limit'])
+        pixel_values = BatchPreprocessor.from_feature_extractor(feature_extractor)(images).copy()
+
+        reference = get_backend(options['reference'])(MODEL_NAME, MODEL_REVISION)
+        candidate = get_backend(options['candidate'])(MODEL_NAME, MODEL_REVISION)
+        report = compare_backends(reference, candidate, pixel_values, tolerance=options['tolerance'])
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if not report['passed']:
+            raise CommandError(
+                f"{candidate.name} diverges from {reference.name} "
+                f"(max confidence delta {report['max_confidence_delta']:.2e})"
+            )
+        self.stdout.write(self.style.SUCCESS(f'{candidate.name} matches {reference.name} within {options["tolerance"]}'))
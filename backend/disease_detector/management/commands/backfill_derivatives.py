@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from disease_detector.derivatives import build_derivatives, derivative_job
+from disease_detector.models import Diagnosis
+from disease_detector.storage import content_digest, diagnosis_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill in content hashes, thumbnails and model-resolution copies for diagnoses that lack them '
+        '(rows from before content-addressed storage, or ones the background queue had to drop)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        pending = Diagnosis.objects.filter(thumbnail='').exclude(image='').order_by('pk')
+        last_pk = 0
+        built = missing = 0
+
+        while True:
+            # Keyset pages: rows that fail stay without a thumbnail and must not be fetched again
+            batch = list(pending.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            hashed = []
+            for diagnosis in batch:
+                if not diagnosis.content_hash:
+                    try:
+                        with diagnosis_storage.open(diagnosis.image.name) as f:
+                            diagnosis.content_hash = content_digest(f)
+                    except OSError:
+                        missing += 1
+                        continue
+                    hashed.append(diagnosis)
+            Diagnosis.objects.bulk_update(hashed, ['content_hash'])
+
+            build_derivatives([derivative_job(diagnosis) for diagnosis in batch if diagnosis.content_hash])
+            built += len(batch)
+            self.stdout.write(f'Processed {built} diagnoses')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {built} diagnoses processed, {missing} with missing image files'))
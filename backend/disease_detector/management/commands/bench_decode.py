@@ -0,0 +1,73 @@
+import io
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+from django.core.management.base import BaseCommand
+
+from ml_model.image_io import load_image
+
+
+def make_photo(megapixels, seed=0):
+    """Synthetic 4:3 JPEG at roughly the given megapixel count"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    rng = np.random.default_rng(seed)
+    # Low-frequency pattern plus noise compresses like a real photo
+    small = rng.integers(40, 200, size=(height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def _measure(data, target_size, iterations, results):
+    # Runs in a fresh process so the peak RSS belongs to this decode mode alone
+    baseline = _max_rss_mb()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        image = load_image(data, target_size=target_size, max_pixels=0, max_bytes=0)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    results.put({
+        'decoded_size': list(image.size),
+        'median_ms': round(statistics.median(timings), 2),
+        'peak_rss_increase_mb': round(_max_rss_mb() - baseline, 1),
+    })
+
+
+class Command(BaseCommand):
+    help = 'Compare full-resolution and reduced-resolution decode latency and peak RSS on large JPEGs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 24, 48])
+        parser.add_argument('--target', type=int, default=224, help='Model input side in pixels')
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('spawn')
+        report = []
+
+        for megapixels in options['megapixels']:
+            data = make_photo(megapixels)
+            row = {'megapixels': megapixels, 'jpeg_bytes': len(data)}
+            for label, target_size in (('full', None), ('reduced', (options['target'], options['target']))):
+                results = context.Queue()
+                process = context.Process(target=_measure, args=(data, target_size, options['iterations'], results))
+                process.start()
+                row[label] = results.get()
+                process.join()
+            report.append(row)
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,66 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model.custom_predictor import MODEL_NAME, MODEL_REVISION
+from ml_model.image_io import load_image
+from ml_model.preprocessing import BatchPreprocessor
+
+
+class Command(BaseCommand):
+    help = 'Compare per-image ViTFeatureExtractor calls with the vectorized BatchPreprocessor (single core)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=256)
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--resolution', type=int, nargs=2, default=[640, 480], metavar=('WIDTH', 'HEIGHT'))
+        parser.add_argument('--tolerance', type=float, default=1e-4)
+
+    def handle(self, *args, **options):
+        from transformers import ViTFeatureExtractor
+
+        width, height = options['resolution']
+        batch_size = options['batch_size']
+        rng = np.random.default_rng(0)
+        images = [
+            load_image(rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8))
+            for _ in range(options['images'])
+        ]
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+
+        feature_extractor = ViTFeatureExtractor.from_pretrained(MODEL_NAME, revision=MODEL_REVISION)
+        preprocessor = BatchPreprocessor.from_feature_extractor(feature_extractor)
+
+        # Parity on the first batch
+        expected = np.concatenate([
+            feature_extractor(images=image, return_tensors='np')['pixel_values'] for image in batches[0]
+        ])
+        max_delta = float(np.abs(preprocessor(batches[0]) - expected).max())
+
+        started = time.perf_counter()
+        for batch in batches:
+            for image in batch:
+                feature_extractor(images=image, return_tensors='np')
+        extractor_seconds = time.perf_counter() - started
+
+        preprocessor(batches[0])  # grow the buffers once
+        started = time.perf_counter()
+        for batch in batches:
+            preprocessor(batch)
+        vectorized_seconds = time.perf_counter() - started
+
+        report = {
+            'images': len(images),
+            'batch_size': batch_size,
+            'resolution': [width, height],
+            'extractor_images_per_sec': round(len(images) / extractor_seconds, 1),
+            'vectorized_images_per_sec': round(len(images) / vectorized_seconds, 1),
+            'speedup': round(extractor_seconds / vectorized_seconds, 2),
+            'max_abs_delta': max_delta,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if max_delta > options['tolerance']:
+            raise CommandError(f'Preprocessing differs from the feature extractor by {max_delta:.2e}')
@@ -0,0 +1,79 @@
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.management.base import BaseCommand
+
+from ml_model.image_io import load_image
+
+
+def make_jpeg(target_mb, quality=90, seed=0):
+    """Build a synthetic leaf-like JPEG whose encoded size is close to target_mb"""
+    rng = np.random.default_rng(seed)
+    side = int((target_mb * 1024 * 1024 / 1.5) ** 0.5)
+
+    for _ in range(4):
+        height, width = side * 3 // 4, side
+        base = np.zeros((height, width, 3), dtype=np.uint8)
+        base[..., 1] = 140
+        noise = rng.integers(0, 90, size=(height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(base + noise).save(buffer, format='JPEG', quality=quality)
+        data = buffer.getvalue()
+        side = int(side * (target_mb * 1024 * 1024 / len(data)) ** 0.5)
+    return data
+
+
+def as_upload(data):
+    """Wrap bytes the way Django's MemoryFileUploadHandler does"""
+    return InMemoryUploadedFile(io.BytesIO(data), 'image', 'leaf.jpg', 'image/jpeg', len(data), None)
+
+
+def via_temp_file(upload):
+    """The previous detect_disease path: copy chunks to a temp file, reopen by path, delete"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
+        for chunk in upload.chunks():
+            tmp_file.write(chunk)
+        temp_path = tmp_file.name
+    try:
+        return Image.open(temp_path).convert('RGB')
+    finally:
+        os.unlink(temp_path)
+
+
+def via_memory(upload):
+    return load_image(upload)
+
+
+class Command(BaseCommand):
+    help = 'Compare temp-file vs in-memory upload decoding latency (model forward pass excluded)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=float, nargs='+', default=[3, 5, 8],
+                            help='Synthetic JPEG sizes in MB')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'size':>8} {'temp-file ms':>14} {'in-memory ms':>14} {'saved ms':>10}")
+
+        for target_mb in options['sizes']:
+            data = make_jpeg(target_mb)
+            timings = {}
+            for label, fn in (('temp', via_temp_file), ('memory', via_memory)):
+                samples = []
+                for _ in range(options['iterations']):
+                    upload = as_upload(data)
+                    started = time.perf_counter()
+                    fn(upload)
+                    samples.append((time.perf_counter() - started) * 1000.0)
+                timings[label] = statistics.median(samples)
+
+            self.stdout.write(
+                f"{len(data) / 1024 / 1024:>6.1f}MB {timings['temp']:>14.2f} {timings['memory']:>14.2f} "
+                f"{timings['temp'] - timings['memory']:>10.2f}"
+            )
@@ -0,0 +1,198 @@
+import io
+import json
+import os
+import platform
+import secrets
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+
+from ml_model.benchmarking import summarize, synthetic_leaf_jpeg, time_calls
+from ml_model.custom_predictor import predictor
+from ml_model.image_io import check_limits, read_bytes
+from disease_detector.knowledge import get_disease_info
+from disease_detector.models import Diagnosis
+from disease_detector.storage import diagnosis_storage
+from disease_detector.write_behind import diagnosis_record, persist_diagnoses
+
+
+def parse_resolution(value):
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise CommandError(f"Resolution must look like 1280x960, got '{value}'")
+    return width, height
+
+
+def as_upload(data):
+    return InMemoryUploadedFile(io.BytesIO(data), 'image', 'leaf.jpg', 'image/jpeg', len(data), None)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the detection pipeline stage by stage and end to end through /api/detect/, '
+        'reporting p50/p95/p99 latency and throughput as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolutions', nargs='+', default=['640x480', '1920x1440', '4032x3024'])
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 16])
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--requests', type=int, default=64, help='Endpoint requests per concurrency level')
+        parser.add_argument('--endpoint-resolution', default='1280x960')
+        parser.add_argument('--authenticated', action='store_true',
+                            help='Log in a "benchmark" user so requests also persist diagnosis history')
+        parser.add_argument('--image-seed', type=int,
+                            help='Seed for the endpoint images; by default a fresh one per run, so the persistent '
+                                 'prediction cache left by earlier runs is never hit. Reuse a seed to measure cache hits')
+        parser.add_argument('--skip-stages', action='store_true')
+        parser.add_argument('--skip-endpoint', action='store_true')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def bench_forward(self, batch_sizes, iterations):
+        image = predictor.decode_image(synthetic_leaf_jpeg(640, 480))
+        report = {}
+        for batch_size in batch_sizes:
+            pixel_values = predictor.preprocessor([image] * batch_size).copy()
+            predictor.backend.forward(pixel_values)  # warm-up
+            samples, wall, _ = time_calls(predictor.backend.forward, iterations, pixel_values)
+            report[str(batch_size)] = summarize(samples, wall, items=batch_size * iterations)
+        return report
+
+    def bench_db_write(self, data, label, iterations):
+        info = get_disease_info(label)
+
+        def write(count):
+            records = [diagnosis_record(as_upload(data), label, 0.9, info) for _ in range(count)]
+            with transaction.atomic():
+                persist_diagnoses(records)
+                transaction.set_rollback(True)
+            for record in records:
+                # Storage is content-addressed: keep files that real diagnoses point at
+                if not Diagnosis.objects.filter(image=record['image_path']).exists():
+                    diagnosis_storage.delete(record['image_path'])
+
+        report = {}
+        for count in (1, settings.HISTORY_FLUSH_BATCH_SIZE):
+            samples, wall, _ = time_calls(write, iterations, count)
+            report[f'batch_{count}'] = summarize(samples, wall, items=count * iterations)
+        return report
+
+    def bench_stages(self, width, height, batch_sizes, iterations):
+        data = synthetic_leaf_jpeg(width, height)
+        report = {'resolution': f'{width}x{height}', 'jpeg_bytes': len(data)}
+
+        def upload():
+            upload_file = as_upload(data)
+            check_limits(upload_file)
+            return predictor.cache.key_for(read_bytes(upload_file))
+
+        report['upload'] = summarize(*time_calls(upload, iterations)[:2])
+
+        samples, wall, image = time_calls(predictor.decode_image, iterations, data)
+        report['decode'] = summarize(samples, wall)
+
+        report['preprocess'] = {}
+        for batch_size in batch_sizes:
+            samples, wall, _ = time_calls(predictor.preprocessor, iterations, [image] * batch_size)
+            report['preprocess'][str(batch_size)] = summarize(samples, wall, items=batch_size * iterations)
+
+        label, _ = predictor.predict_batch([image])[0]
+        samples, wall, _ = time_calls(get_disease_info, iterations * 10, label)
+        report['knowledge_lookup'] = summarize(samples, wall)
+
+        report['db_write'] = self.bench_db_write(data, label, iterations)
+        return report
+
+    def bench_endpoint(self, concurrency, images, user):
+        local = threading.local()
+
+        def post(data):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+                if user is not None:
+                    client.force_login(user)
+            started = time.perf_counter()
+            response = client.post('/api/detect/', {'image': SimpleUploadedFile('leaf.jpg', data, 'image/jpeg')})
+            return (time.perf_counter() - started) * 1000.0, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(post, images))
+        wall = time.perf_counter() - started
+
+        report = summarize([ms for ms, _ in results], wall)
+        report['concurrency'] = concurrency
+        report['errors'] = sum(1 for _, code in results if code != 200)
+        return report
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        predictor.warm_up()
+
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'backend': predictor.get_backend_info(),
+            'max_batch_size': predictor.batcher.max_batch_size,
+            'max_batch_wait_ms': predictor.batcher.max_wait * 1000.0,
+        }
+
+        if not options['skip_stages']:
+            report['forward'] = self.bench_forward(options['batch_sizes'], options['iterations'])
+            report['stages'] = [
+                self.bench_stages(*parse_resolution(resolution), options['batch_sizes'], options['iterations'])
+                for resolution in options['resolutions']
+            ]
+
+        if not options['skip_endpoint']:
+            user = None
+            if options['authenticated']:
+                from django.contrib.auth import get_user_model
+                user, _ = get_user_model().objects.get_or_create(username='benchmark')
+
+            width, height = parse_resolution(options['endpoint_resolution'])
+            image_seed = options['image_seed']
+            report['endpoint_images'] = {
+                'seed': secrets.randbits(32) if image_seed is None else image_seed,
+                # 'cold': images no earlier run has sent; 'repeat': a given seed, so a rerun may hit the cache
+                'cache': 'cold' if image_seed is None else 'repeat',
+            }
+            report['endpoint'] = []
+            for concurrency in options['concurrency']:
+                # Distinct images per request so the prediction cache never short-circuits the model
+                offset = concurrency * options['requests']
+                images = [
+                    synthetic_leaf_jpeg(width, height, seed=[report['endpoint_images']['seed'], offset + i])
+                    for i in range(options['requests'])
+                ]
+                report['endpoint'].append(self.bench_endpoint(concurrency, images, user))
+
+        report['total_seconds'] = round(time.perf_counter() - started, 2)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
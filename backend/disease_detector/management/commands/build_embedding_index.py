@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from disease_detector.models import Diagnosis
+from disease_detector.storage import diagnosis_storage
+from ml_model.custom_predictor import predictor
+from ml_model.embedding_index import open_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Add past diagnoses to the active model version\'s embedding index (for similar-case search and '
+        'near-duplicate answers). Already indexed diagnoses are skipped, so it can be re-run at any time, '
+        'e.g. after activating a new model version.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=32)
+
+    def handle(self, *args, **options):
+        model = predictor.load().model
+        index = open_index(model.namespace)
+        indexed = set(index.ids().tolist())
+        self.stdout.write(f'Indexing diagnoses for {model.namespace} into {index.directory} ({len(indexed)} already)')
+
+        # The model-resolution copy where there is one: smaller to read, same pixels after preprocessing
+        pending = Diagnosis.objects.exclude(image='').order_by('pk').only('pk', 'image', 'model_image', 'result')
+        last_pk = 0
+        added = skipped = failed = 0
+
+        while True:
+            # Keyset pages: unreadable rows stay unindexed and must not be fetched again
+            batch = list(pending.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            diagnoses, images = [], []
+            for diagnosis in batch:
+                if diagnosis.pk in indexed:
+                    skipped += 1
+                    continue
+                try:
+                    with diagnosis_storage.open(diagnosis.model_image.name or diagnosis.image.name) as f:
+                        images.append(predictor.decode_image(f.read()))
+                except Exception as e:
+                    self.stderr.write(f'Diagnosis {diagnosis.pk}: {e}')
+                    failed += 1
+                    continue
+                diagnoses.append(diagnosis)
+            if not diagnoses:
+                continue
+
+            results = model.score_batch(images, record_metrics=False, embeddings=True)
+            if results[0][2] is None:
+                raise CommandError(f'The {model.backend.name} backend does not provide image embeddings')
+            # Indexed under the label the model gives now, which is what a near-duplicate would be answered with
+            index.add(
+                [diagnosis.pk for diagnosis in diagnoses],
+                [vector for _, _, vector in results],
+                [label for label, _, _ in results],
+                [confidence for _, confidence, _ in results],
+            )
+            added += len(diagnoses)
+            self.stdout.write(f'Indexed {added} diagnoses')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {added} indexed, {skipped} already indexed, {failed} unreadable; {len(index)} entries in total'
+        ))
@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model.cascade import (
+    CASCADE_CONFIG_FILE,
+    FAST_MODEL_DIR,
+    NEVER_ACCEPT,
+    FastClassifier,
+    calibrate_thresholds,
+    cascade_report,
+    load_keras_model,
+    load_labels,
+    load_preprocessor_config,
+    map_labels,
+)
+from ml_model.image_io import load_image
+from ml_model.preprocessing import BatchPreprocessor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class Command(BaseCommand):
+    help = (
+        'Calibrate per-class confidence thresholds for the fast cascade model on a labelled '
+        'class-per-folder image set, and write them to cascade.json'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('data_dir', help='Labelled images, one sub-directory per class name')
+        parser.add_argument('--model-dir', default=FAST_MODEL_DIR)
+        parser.add_argument('--target-precision', type=float, default=0.98,
+                            help='Minimum top-1 precision the fast path must keep for a class')
+        parser.add_argument('--min-support', type=int, default=20,
+                            help='Accepted samples needed before a class may use the fast path')
+        parser.add_argument('--label-map', help="JSON file mapping the model's class names to the ViT's labels, "
+                                                 "for a model not trained with train_model --class-names vit")
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--dry-run', action='store_true', help='Report without writing cascade.json')
+
+    def labelled_paths(self, data_dir, class_names, vit_names):
+        # Folders may be named after either vocabulary
+        index = {name: i for i, name in enumerate(class_names)}
+        index.update((name, i) for i, name in enumerate(vit_names))
+        samples = []
+        for folder in sorted(os.listdir(data_dir)):
+            path = os.path.join(data_dir, folder)
+            if not os.path.isdir(path):
+                continue
+            if folder not in index:
+                self.stderr.write(f"Skipping '{folder}': not one of the model's classes")
+                continue
+            samples.extend(
+                (os.path.join(root, name), index[folder])
+                for root, _, names in os.walk(path)
+                for name in sorted(names)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        if not samples:
+            raise CommandError(f'No labelled images found in {data_dir}')
+        return samples
+
+    def handle(self, *args, **options):
+        model_dir = options['model_dir']
+        try:
+            class_names = load_labels(model_dir)
+            preprocessor_config = load_preprocessor_config(model_dir)
+        except OSError as e:
+            raise CommandError(f'Cannot read the fast model labels: {e}')
+
+        label_map = {}
+        if options['label_map']:
+            with open(options['label_map']) as f:
+                label_map = json.load(f)
+        # Checked now rather than when the predictor refuses to enable the cascade
+        from ml_model.custom_predictor import predictor
+
+        try:
+            vit_names = map_labels(class_names, label_map, predictor.load().id2label.values())
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        preprocessor = BatchPreprocessor(**preprocessor_config)
+        # Thresholds are irrelevant here: only the raw probabilities are used
+        fast = FastClassifier(
+            load_keras_model(model_dir), class_names, np.full(len(class_names), NEVER_ACCEPT), preprocessor, None
+        )
+
+        samples = self.labelled_paths(options['data_dir'], class_names, vit_names)
+        target_size = (preprocessor.width, preprocessor.height)
+        confidences, predicted, actual = [], [], []
+        for start in range(0, len(samples), options['batch_size']):
+            chunk = samples[start:start + options['batch_size']]
+            probs = fast.predict_proba([load_image(path, target_size=target_size) for path, _ in chunk])
+            predicted.extend(probs.argmax(axis=1).tolist())
+            confidences.extend(probs.max(axis=1).tolist())
+            actual.extend(label for _, label in chunk)
+            self.stdout.write(f'Scored {min(start + len(chunk), len(samples))}/{len(samples)} images')
+
+        thresholds = calibrate_thresholds(
+            confidences, predicted, actual, len(class_names),
+            target_precision=options['target_precision'],
+            min_support=options['min_support'],
+        )
+        report = cascade_report(confidences, predicted, actual, thresholds)
+        report['classes_enabled'] = int((thresholds <= 1.0).sum())
+
+        config = {
+            'class_names': class_names,
+            'label_map': label_map,
+            'thresholds': [round(float(t), 6) for t in thresholds],
+            'preprocessor': preprocessor_config,
+            'calibration': {
+                'target_precision': options['target_precision'],
+                'min_support': options['min_support'],
+                **report,
+            },
+        }
+        self.stdout.write(json.dumps(config['calibration'], indent=2))
+
+        if options['dry_run']:
+            return
+        path = os.path.join(model_dir, CASCADE_CONFIG_FILE)
+        with open(path, 'w') as f:
+            json.dump(config, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {path}: the fast path would answer {report['fast_path_share']:.1%} of the calibration set"
+        ))
@@ -0,0 +1,70 @@
+import json
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from ml_model.custom_predictor import MODEL_NAME, MODEL_REVISION
+from ml_model.inference_backends import ONNX_MODEL_DIR
+
+
+class Command(BaseCommand):
+    help = 'Export the Hugging Face ViT checkpoint to an ONNX graph for PREDICTOR_BACKEND=onnx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=ONNX_MODEL_DIR, help='Directory to write model.onnx and configs to')
+        parser.add_argument('--opset', type=int, default=14)
+        parser.add_argument('--verify', action='store_true', help='Run backend_parity against torch afterwards')
+
+    def handle(self, *args, **options):
+        import torch
+        from transformers import ViTFeatureExtractor, ViTForImageClassification
+
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+
+        feature_extractor = ViTFeatureExtractor.from_pretrained(MODEL_NAME, revision=MODEL_REVISION)
+        model = ViTForImageClassification.from_pretrained(MODEL_NAME, revision=MODEL_REVISION)
+        model.eval()
+
+        class LogitsAndEmbedding(torch.nn.Module):
+            # Plain tensor outputs instead of a ModelOutput dict; the [CLS] embedding feeds similar-case search
+            def __init__(self, wrapped):
+                super().__init__()
+                self.wrapped = wrapped
+
+            def forward(self, pixel_values):
+                pooled = self.wrapped.vit(pixel_values=pixel_values).last_hidden_state[:, 0, :]
+                return self.wrapped.classifier(pooled), pooled
+
+        size = feature_extractor.size
+        height, width = (size['height'], size['width']) if isinstance(size, dict) else (size, size)
+        dummy = torch.zeros(1, 3, height, width, dtype=torch.float32)
+
+        model_path = os.path.join(output, 'model.onnx')
+        self.stdout.write(f'Exporting {MODEL_NAME}@{MODEL_REVISION} to {model_path} (opset {options["opset"]})...')
+        torch.onnx.export(
+            LogitsAndEmbedding(model),
+            (dummy,),
+            model_path,
+            input_names=['pixel_values'],
+            output_names=['logits', 'embedding'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'logits': {0: 'batch'}, 'embedding': {0: 'batch'}},
+            opset_version=options['opset'],
+            do_constant_folding=True,
+        )
+
+        model.config.save_pretrained(output)
+        feature_extractor.save_pretrained(output)
+        with open(os.path.join(output, 'export_info.json'), 'w') as f:
+            json.dump({
+                'model_name': MODEL_NAME,
+                'revision': getattr(model.config, '_commit_hash', None) or MODEL_REVISION,
+                'opset': options['opset'],
+                'torch_version': torch.__version__,
+            }, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f'ONNX model written to {output}'))
+
+        if options['verify']:
+            call_command('backend_parity', candidate='onnx', stdout=self.stdout)
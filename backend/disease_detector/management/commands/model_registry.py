@@ -0,0 +1,193 @@
+import os
+import shutil
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model import model_registry
+from ml_model.custom_predictor import MODEL_NAME, MODEL_REVISION, PREDICTION_CACHE_PATH
+from ml_model.inference_backends import BACKENDS
+from ml_model.prediction_cache import purge_namespace
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage model versions under ml_model/trained_models/registry: add, activate or remove a version, '
+        'roll back, or shadow-score a candidate. Running workers switch within '
+        'PREDICTOR_REGISTRY_CHECK_SECONDS, without a restart.'
+    )
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+
+        subcommands.add_parser('list', help='Show registered versions and the registry state')
+
+        add = subcommands.add_parser('add', help='Register a new version directory')
+        add.add_argument('version', help='Version name, used as the directory name')
+        source = add.add_mutually_exclusive_group()
+        source.add_argument('--from-hub', action='store_true',
+                            help=f'Snapshot {MODEL_NAME} (at --revision) as a torch checkpoint')
+        source.add_argument('--from-dir', help='Copy an existing model directory, e.g. the output of export_onnx')
+        add.add_argument('--revision', default=MODEL_REVISION, help='Hub revision for --from-hub')
+        add.add_argument('--backend', choices=[name for name in BACKENDS if name != 'remote'],
+                         help='Engine that runs the version (default: onnx if the directory has model.onnx, else torch)')
+        add.add_argument('--notes', default='', help='Free text kept in version.json')
+        add.add_argument('--activate', action='store_true', help='Make it the active version right away')
+
+        activate = subcommands.add_parser('activate', help='Switch all workers to a version')
+        activate.add_argument('version')
+
+        subcommands.add_parser('rollback', help='Switch back to the previously active version')
+
+        remove = subcommands.add_parser('remove', help='Delete a version that is no longer active, previous or shadow')
+        remove.add_argument('version')
+
+        shadow = subcommands.add_parser('shadow', help='Score a share of live traffic with a candidate version too')
+        shadow.add_argument('version', nargs='?')
+        shadow.add_argument('--percent', type=float, default=5.0)
+        shadow.add_argument('--off', action='store_true', help='Stop shadow scoring')
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_list(self, options):
+        state = model_registry.read_state()
+        versions = model_registry.list_versions()
+        if not versions:
+            self.stdout.write(f'No versions registered in {model_registry.REGISTRY_DIR}; serving {MODEL_NAME}')
+            return
+
+        roles = {state['active']: 'active', state['previous']: 'previous', state['shadow']: 'shadow'}
+        for manifest in versions:
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest.get('created_at', 0)))
+            role = roles.get(manifest['version'], '')
+            if role == 'shadow':
+                role = f"shadow {state['shadow_percent']:g}%"
+            self.stdout.write(
+                f"{manifest['version']:<20} {manifest.get('backend', 'torch'):<6} {created}  {role:<12} "
+                f"{manifest.get('source', '')} {manifest.get('notes', '')}".rstrip()
+            )
+
+    def handle_add(self, options):
+        version = options['version']
+        try:
+            target = model_registry.version_dir(version)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if os.path.exists(target):
+            raise CommandError(f'Version {version} already exists in {model_registry.REGISTRY_DIR}')
+
+        # Built under a temporary name, so a half-copied version can never be activated
+        partial = f'{target}.partial'
+        shutil.rmtree(partial, ignore_errors=True)
+        try:
+            backend, source = self.build_version(partial, options)
+            os.replace(partial, target)
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+
+        model_registry.write_manifest(version, {
+            'backend': backend,
+            'source': source,
+            'notes': options['notes'],
+            'created_at': time.time(),
+        })
+        self.stdout.write(self.style.SUCCESS(f'Registered {version} ({backend}) in {target}'))
+
+        if options['activate']:
+            self.handle_activate(options)
+
+    def build_version(self, path, options):
+        """Fill the version directory; returns (backend name, description of where it came from)"""
+        if options['from_hub']:
+            from transformers import ViTFeatureExtractor, ViTForImageClassification
+
+            revision = options['revision']
+            self.stdout.write(f'Downloading {MODEL_NAME}@{revision}...')
+            model = ViTForImageClassification.from_pretrained(MODEL_NAME, revision=revision)
+            model.save_pretrained(path)
+            ViTFeatureExtractor.from_pretrained(MODEL_NAME, revision=revision).save_pretrained(path)
+            commit = getattr(model.config, '_commit_hash', None) or revision
+            return options['backend'] or 'torch', f'{MODEL_NAME}@{commit}'
+
+        if options['from_dir']:
+            if not os.path.isdir(options['from_dir']):
+                raise CommandError(f"{options['from_dir']} is not a directory")
+            shutil.copytree(options['from_dir'], path)
+            default = 'onnx' if os.path.exists(os.path.join(path, 'model.onnx')) else 'torch'
+            return options['backend'] or default, os.path.abspath(options['from_dir'])
+
+        if options['backend'] != 'stub':
+            raise CommandError('Give --from-hub or --from-dir (only --backend stub needs no model files)')
+        os.makedirs(path)
+        return 'stub', 'stub'
+
+    def handle_activate(self, options):
+        version = options['version']
+        self.require_version(version)
+        state = model_registry.read_state()
+        if state['active'] == version:
+            self.stdout.write(f'{version} is already active')
+            return
+
+        state['previous'], state['active'] = state['active'], version
+        if state['shadow'] == version:
+            state['shadow'], state['shadow_percent'] = None, 0.0
+        model_registry.write_state(state)
+        self.stdout.write(self.style.SUCCESS(
+            f"Activated {version} (previous: {state['previous'] or MODEL_NAME}); workers switch after loading it"
+        ))
+
+    def handle_rollback(self, options):
+        state = model_registry.read_state()
+        if not state['previous']:
+            raise CommandError('There is no previous version to roll back to')
+
+        state['active'], state['previous'] = state['previous'], state['active']
+        model_registry.write_state(state)
+        self.stdout.write(self.style.SUCCESS(f"Rolled back to {state['active']} (from {state['previous']})"))
+
+    def handle_remove(self, options):
+        version = options['version']
+        self.require_version(version)
+        state = model_registry.read_state()
+        roles = [role for role in ('active', 'previous', 'shadow') if state[role] == version]
+        if roles:
+            raise CommandError(f"{version} is the {' and '.join(roles)} version; switch away from it first")
+
+        shutil.rmtree(model_registry.version_dir(version))
+        # Its cached answers can never be served again; other versions' entries stay warm
+        purged = 0
+        if PREDICTION_CACHE_PATH:
+            purged = purge_namespace(PREDICTION_CACHE_PATH, model_registry.cache_namespace(version))
+        self.stdout.write(self.style.SUCCESS(f'Removed {version} and {purged} cached predictions'))
+
+    def handle_shadow(self, options):
+        state = model_registry.read_state()
+        if options['off']:
+            state['shadow'], state['shadow_percent'] = None, 0.0
+            model_registry.write_state(state)
+            self.stdout.write(self.style.SUCCESS('Shadow scoring stopped'))
+            return
+
+        version = options['version']
+        if not version:
+            raise CommandError('Give a version to shadow, or --off')
+        if not 0 < options['percent'] <= 100:
+            raise CommandError('--percent must be in (0, 100]')
+        self.require_version(version)
+        if version == state['active']:
+            raise CommandError(f'{version} is the active version')
+
+        state['shadow'], state['shadow_percent'] = version, options['percent']
+        model_registry.write_state(state)
+        self.stdout.write(self.style.SUCCESS(
+            f"Shadow scoring {options['percent']:g}% of traffic with {version}; see /api/model-info/"
+        ))
+
+    def require_version(self, version):
+        try:
+            model_registry.read_manifest(version)
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
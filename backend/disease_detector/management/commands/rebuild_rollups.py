@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from disease_detector.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the analytics rollups from the diagnosis table: after the first deploy (backfill), '
+        'or to repair them after diagnoses were changed outside the app'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild from the week containing this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date (YYYY-MM-DD)')
+
+        rows = rebuild_rollups(since)
+        scope = f'from the week of {since}' if since else 'for the whole history'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rollup rows {scope}'))
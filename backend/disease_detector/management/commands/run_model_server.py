@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model.custom_predictor import MODEL_NAME, MODEL_REVISION, build_preprocessor
+from ml_model.inference_backends import MODEL_SERVER_SOCKET, get_backend
+from ml_model.model_server import ModelServer
+
+
+class Command(BaseCommand):
+    help = 'Run the shared model server that web workers reach with PREDICTOR_BACKEND=remote'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=MODEL_SERVER_SOCKET)
+        parser.add_argument('--backend', default='torch', help='Engine the server runs: torch or onnx')
+        parser.add_argument('--threads', type=int, default=0, help='Inference threads (0 = engine default)')
+        parser.add_argument('--max-batch-size', type=int, default=8, help='Client requests merged per forward pass')
+        parser.add_argument('--max-wait-ms', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        if options['backend'] == 'remote':
+            raise CommandError('The model server cannot itself use the remote backend')
+
+        if options['threads']:
+            # Read by the onnx backend when it builds its session
+            os.environ['PREDICTOR_ONNX_THREADS'] = str(options['threads'])
+            if options['backend'] == 'torch':
+                import torch
+                torch.set_num_threads(options['threads'])
+
+        backend = get_backend(options['backend'])(MODEL_NAME, MODEL_REVISION)
+        server = ModelServer(
+            backend,
+            build_preprocessor(backend),
+            options['socket'],
+            max_batch_size=options['max_batch_size'],
+            max_wait_ms=options['max_wait_ms'],
+        )
+        self.stdout.write(f"Serving {MODEL_NAME} ({backend.name}) on {options['socket']}")
+        server.serve_forever()
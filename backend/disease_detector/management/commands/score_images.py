@@ -0,0 +1,173 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model.bulk_scoring import Checkpoint, decode_chunk, init_decoder, list_images, paths_digest, result_writer
+from ml_model.custom_predictor import predictor
+from disease_detector.knowledge import get_disease_info
+
+# Explicit types keep every Parquet part on one schema, even when a part has no errors at all
+COLUMNS = {
+    'path': 'string',
+    'disease_detected': 'string',
+    'confidence': 'float64',
+    'plant_type': 'string',
+    'is_healthy': 'boolean',
+    'error': 'string',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Score a directory or CSV manifest of images offline: parallel decode, large model batches, '
+        'incremental CSV/Parquet output and resumable checkpoints'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Image directory, or a CSV manifest with a path column')
+        parser.add_argument('--output', required=True,
+                            help='results.csv, or a directory name for a Parquet dataset of part files')
+        parser.add_argument('--path-column', default='path', help='Manifest column holding image paths')
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Decode processes')
+        parser.add_argument('--chunk-size', type=int, default=16, help='Images per decode task')
+        parser.add_argument('--flush-rows', type=int, default=2048, help='Rows written per checkpoint')
+        parser.add_argument('--checkpoint', help='Defaults to <output>.checkpoint.json')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--limit', type=int)
+
+    def read_paths(self, source, column):
+        if source.lower().endswith('.csv'):
+            manifest = pd.read_csv(source, usecols=[column])
+            base = os.path.dirname(os.path.abspath(source))
+            # Relative manifest paths are relative to the manifest itself
+            return [path if os.path.isabs(path) else os.path.join(base, path) for path in manifest[column].astype(str)]
+        if os.path.isdir(source):
+            return list_images(source)
+        raise CommandError(f'{source} is neither a directory nor a .csv manifest')
+
+    def open_checkpoint(self, path, source, namespace, paths, restart):
+        if restart or not os.path.exists(path):
+            return Checkpoint(path, source, namespace, len(paths), paths_digest(paths))
+
+        checkpoint = Checkpoint.load(path)
+        if checkpoint.source != source:
+            raise CommandError(f'{path} belongs to a run over {checkpoint.source}; use --restart or another --output')
+        if checkpoint.namespace != namespace:
+            raise CommandError(
+                f'{path} was written by model {checkpoint.namespace}, not {namespace}; use --restart to re-score'
+            )
+        # completed is an offset into the path list: resuming over a different list would skip or repeat images
+        if checkpoint.total != len(paths):
+            raise CommandError(
+                f'{path} covers {checkpoint.total} images, but the input now lists {len(paths)} '
+                f'(files added or removed, or --limit changed); use --restart to re-score'
+            )
+        if checkpoint.digest != paths_digest(paths):
+            raise CommandError(f'{path} covers a different list of images than the input; use --restart to re-score')
+        self.stdout.write(f'Resuming after {checkpoint.completed} images')
+        return checkpoint
+
+    def handle(self, *args, **options):
+        source = os.path.abspath(options['source'])
+        paths = self.read_paths(source, options['path_column'])
+        if options['limit']:
+            paths = paths[:options['limit']]
+
+        model = predictor.load()
+        checkpoint = self.open_checkpoint(
+            options['checkpoint'] or f"{options['output'].rstrip(os.sep)}.checkpoint.json",
+            source, model.cache.namespace, paths, options['restart'],
+        )
+        remaining = paths[checkpoint.completed:]
+        if not remaining:
+            self.stdout.write(self.style.SUCCESS(f'All {len(paths)} images are already scored'))
+            return
+
+        writer = result_writer(options['output'], checkpoint.position)
+        batch_size = options['batch_size']
+        chunk_size = options['chunk_size']
+        workers = max(1, options['workers'])
+
+        rows = []      # output rows waiting for the next flush, in input order
+        to_score = []  # (row, pixels) still waiting for a model batch
+        scored = failed = 0
+        started = time.monotonic()
+
+        def score():
+            nonlocal scored
+            if not to_score:
+                return
+            results = model.predict_batch([pixels for _, pixels in to_score])
+            for (row, _), (disease_name, confidence) in zip(to_score, results):
+                info = get_disease_info(disease_name)
+                row.update(disease_detected=disease_name, confidence=confidence,
+                           plant_type=info['plant_type'], is_healthy=info['is_healthy'])
+            scored += len(to_score)
+            to_score.clear()
+
+        def flush():
+            score()
+            if not rows:
+                return
+            checkpoint.position = writer.write(pd.DataFrame(rows, columns=list(COLUMNS)).astype(COLUMNS))
+            checkpoint.completed += len(rows)
+            checkpoint.save()
+            rows.clear()
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{checkpoint.completed}/{len(paths)} images, {scored / elapsed:.1f} images/sec'
+            )
+
+        chunks = (remaining[i:i + chunk_size] for i in range(0, len(remaining), chunk_size))
+        # Spawned, not forked: the parent already holds the model and its thread pools
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_decoder,
+            initargs=(model.preprocessor.width, model.preprocessor.height, model.preprocessor.resample),
+        )
+        try:
+            # A fixed look-ahead of decode tasks bounds memory however large the input is
+            window = deque()
+
+            def fill():
+                while len(window) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        return
+                    window.append(pool.submit(decode_chunk, chunk))
+
+            fill()
+            while window:
+                for path, pixels, error in window.popleft().result():
+                    row = {'path': path, 'error': error}
+                    rows.append(row)
+                    if pixels is None:
+                        failed += 1
+                    else:
+                        to_score.append((row, pixels))
+                        if len(to_score) >= batch_size:
+                            score()
+                fill()
+                if len(rows) >= options['flush_rows']:
+                    flush()
+            flush()
+        finally:
+            pool.shutdown(cancel_futures=True)
+            writer.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(json.dumps({
+            'scored': scored,
+            'failed': failed,
+            'seconds': round(elapsed, 2),
+            'images_per_sec': round(scored / elapsed, 2) if elapsed else None,
+            'output': options['output'],
+        }, indent=2))
@@ -0,0 +1,101 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_model.cascade import FAST_MODEL_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        'Train a Keras classifier from model_architecture on a class-per-folder dataset with a streaming '
+        'tf.data pipeline, and export it where the cascade fast path loads it'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('data_dir', help='One sub-directory of images per class name')
+        parser.add_argument('--architecture', choices=['cnn', 'mobilenet'], default='mobilenet')
+        parser.add_argument('--epochs', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--image-size', type=int, default=224)
+        parser.add_argument('--learning-rate', type=float, default=1e-3)
+        parser.add_argument('--validation-split', type=float, default=0.1)
+        parser.add_argument('--cache-dir', help='Cache decoded images on disk here (default: in memory)')
+        parser.add_argument('--shuffle-buffer', type=int, default=1024)
+        parser.add_argument('--mixed-precision', action='store_true', help='Train with the mixed_float16 policy')
+        parser.add_argument('--class-names', choices=['vit', 'predictor', 'folders'], default='vit',
+                            help="Output classes: the active ViT's labels (so cascade answers match the ViT's), "
+                                 "PlantDiseasePredictor's class_names, or the dataset folders")
+        parser.add_argument('--output-dir', default=FAST_MODEL_DIR)
+        parser.add_argument('--log-every', type=int, default=50, help='Steps between throughput log lines')
+        parser.add_argument('--benchmark-input', type=int, default=0, metavar='STEPS',
+                            help='First time this many batches of the input pipeline alone')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # TensorFlow is only imported by the commands that need it
+        import tensorflow as tf
+
+        from ml_model import training
+        from ml_model.model_loader import CLASS_NAMES
+
+        data_dir = options['data_dir']
+        if not os.path.isdir(data_dir):
+            raise CommandError(f'{data_dir} is not a directory')
+
+        if options['class_names'] == 'vit':
+            from ml_model.custom_predictor import predictor
+
+            id2label = predictor.load().id2label
+            class_names = [id2label[i] for i in sorted(id2label)]
+        elif options['class_names'] == 'predictor':
+            class_names = list(CLASS_NAMES)
+        else:
+            class_names = sorted(name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name)))
+
+        paths, labels = training.list_dataset(data_dir, class_names)
+        if not paths:
+            raise CommandError(f'No images of known classes found in {data_dir}')
+        (train_paths, train_labels), (val_paths, val_labels) = training.split_dataset(
+            paths, labels, options['validation_split'], options['seed']
+        )
+        self.stdout.write(
+            f'{len(train_paths)} training and {len(val_paths)} validation images, '
+            f'{len(set(labels))} of {len(class_names)} classes present'
+        )
+
+        if options['mixed_precision']:
+            tf.keras.mixed_precision.set_global_policy('mixed_float16')
+
+        image_size = (options['image_size'], options['image_size'])
+        batch_size = options['batch_size']
+        dataset_options = dict(
+            image_size=image_size, batch_size=batch_size, cache_dir=options['cache_dir'],
+            shuffle_buffer=options['shuffle_buffer'], seed=options['seed'],
+        )
+        train_ds = training.build_dataset(train_paths, train_labels, training=True, **dataset_options)
+        val_ds = training.build_dataset(val_paths, val_labels, **dataset_options) if val_paths else None
+
+        if options['benchmark_input']:
+            rate = training.benchmark_input(train_ds, options['benchmark_input'])
+            self.stdout.write(f'Input pipeline alone: {rate:.2f} steps/sec, {rate * batch_size:.1f} images/sec')
+
+        model = training.ARCHITECTURES[options['architecture']](len(class_names), input_shape=(*image_size, 3))
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(options['learning_rate']),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy'],
+        )
+        history = model.fit(
+            train_ds,
+            validation_data=val_ds,
+            epochs=options['epochs'],
+            callbacks=[training.ThroughputLogger(batch_size, options['log_every'], log=self.stdout.write)],
+            verbose=0,
+        )
+        for epoch, accuracy in enumerate(history.history.get('val_accuracy', []), start=1):
+            self.stdout.write(f'epoch {epoch}: val_accuracy {accuracy:.4f}')
+
+        training.export_model(model, options['architecture'], class_names, options['output_dir'], image_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported to {options['output_dir']}; run calibrate_cascade on a held-out labelled set to enable it"
+        ))
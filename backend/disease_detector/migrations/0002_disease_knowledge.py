@@ -0,0 +1,45 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disease_detector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantdisease',
+            name='scientific_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='plantdisease',
+            name='plant_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='plantdisease',
+            name='symptoms',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='plantdisease',
+            name='causes',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='plantdisease',
+            name='is_healthy',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
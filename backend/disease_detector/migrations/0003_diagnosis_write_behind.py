@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('disease_detector', '0002_disease_knowledge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosis',
+            name='is_healthy',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='plant_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='diagnosishistory',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='diagnosis_history', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
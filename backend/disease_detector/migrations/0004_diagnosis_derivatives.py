@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:17
+
+import disease_detector.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disease_detector', '0003_diagnosis_write_behind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosis',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='model_image',
+            field=models.ImageField(blank=True, storage=disease_detector.storage.get_diagnosis_storage, upload_to='diagnoses/model/'),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='thumbnail',
+            field=models.ImageField(blank=True, storage=disease_detector.storage.get_diagnosis_storage, upload_to='diagnoses/thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='diagnosis',
+            name='image',
+            field=models.ImageField(storage=disease_detector.storage.get_diagnosis_storage, upload_to='diagnoses/'),
+        ),
+    ]
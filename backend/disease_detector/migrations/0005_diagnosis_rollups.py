@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disease_detector', '0004_diagnosis_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiagnosisRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('result', models.CharField(max_length=200)),
+                ('plant_type', models.CharField(blank=True, default='', max_length=100)),
+                ('is_healthy', models.BooleanField(default=False)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='diagnosisrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'result', 'plant_type', 'is_healthy'), name='unique_diagnosis_rollup'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_diagnosis_fields(apps, schema_editor):
+    Diagnosis = apps.get_model('disease_detector', 'Diagnosis')
+    DiagnosisHistory = apps.get_model('disease_detector', 'DiagnosisHistory')
+    diagnosis = Diagnosis.objects.filter(pk=OuterRef('diagnosis_id'))
+    DiagnosisHistory.objects.update(
+        result=Subquery(diagnosis.values('result')[:1]),
+        is_healthy=Subquery(diagnosis.values('is_healthy')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disease_detector', '0005_diagnosis_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosishistory',
+            name='is_healthy',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='diagnosishistory',
+            name='result',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        # Before the indexes are built, so the update doesn't maintain them row by row
+        migrations.RunPython(copy_diagnosis_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['created_at'], name='diagnosis_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosishistory',
+            index=models.Index(fields=['user', 'date', 'id'], name='history_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosishistory',
+            index=models.Index(fields=['user', 'result', 'date', 'id'], name='history_user_result_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diagnosishistory',
+            index=models.Index(fields=['user', 'is_healthy', 'date', 'id'], name='history_user_healthy_idx'),
+        ),
+    ]
@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.db import models
 
+from .storage import get_diagnosis_storage
+
 
 class PlantDisease(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
+    scientific_name = models.CharField(max_length=200, blank=True, default='')
+    plant_type = models.CharField(max_length=100, blank=True, default='')
+    symptoms = models.TextField(blank=True, default='')
+    causes = models.TextField(blank=True, default='')
+    is_healthy = models.BooleanField(default=False)
 
     def __str__(self):
         return self.name
@@ -28,19 +36,82 @@ class PreventionTip(models.Model):
 
 
 class Diagnosis(models.Model):
-    image = models.ImageField(upload_to='diagnoses/')
+    # Content-addressed: identical images share one file, so files outlive any single row
+    image = models.ImageField(upload_to='diagnoses/', storage=get_diagnosis_storage)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    thumbnail = models.ImageField(upload_to='diagnoses/thumbnails/', storage=get_diagnosis_storage, blank=True)
+    model_image = models.ImageField(upload_to='diagnoses/model/', storage=get_diagnosis_storage, blank=True)
     result = models.CharField(max_length=200)
     confidence = models.FloatField()
+    plant_type = models.CharField(max_length=100, blank=True, default='')
+    is_healthy = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='diagnosis_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.result} ({self.confidence*100:.1f}% confidence)"
 
 
 class DiagnosisHistory(models.Model):
     diagnosis = models.ForeignKey(Diagnosis, on_delete=models.CASCADE, related_name='history')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='diagnosis_history',
+        blank=True, null=True
+    )
     date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
+    # Copied from the diagnosis (which never changes) so history filters are served by one index, without a join
+    result = models.CharField(max_length=200, blank=True, default='')
+    is_healthy = models.BooleanField(default=False)
+
+    class Meta:
+        # One per history filter, each ending in the keyset pagination order (date, id)
+        indexes = [
+            models.Index(fields=['user', 'date', 'id'], name='history_user_date_idx'),
+            models.Index(fields=['user', 'result', 'date', 'id'], name='history_user_result_idx'),
+            models.Index(fields=['user', 'is_healthy', 'date', 'id'], name='history_user_healthy_idx'),
+        ]
 
     def __str__(self):
         return f"History for {self.diagnosis.result} on {self.date.strftime('%Y-%m-%d')}"
+
+
+class DiagnosisRollup(models.Model):
+    """Diagnosis counts per day or week, disease, plant type and health, kept up to date as diagnoses are saved"""
+    DAY = 'day'
+    WEEK = 'week'
+    PERIOD_CHOICES = [(DAY, 'Day'), (WEEK, 'Week')]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # The day itself, or the Monday a week starts on
+    period_start = models.DateField()
+    result = models.CharField(max_length=200)
+    plant_type = models.CharField(max_length=100, blank=True, default='')
+    is_healthy = models.BooleanField(default=False)
+    count = models.PositiveBigIntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'result', 'plant_type', 'is_healthy'],
+                name='unique_diagnosis_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.result}: {self.count} ({self.period} of {self.period_start})"
+
+
+class DataVersion(models.Model):
+    """Monotonic version counter per data set, bumped on every change so all workers can see it"""
+    key = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import PlantDisease, Treatment, PreventionTip, BestPractice, DiagnosisHistory
+from .models import PlantDisease, Treatment, PreventionTip, DiagnosisHistory
 
 class TreatmentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,18 +19,16 @@ class PlantDiseaseSerializer(serializers.ModelSerializer):
         model = PlantDisease
         fields = '__all__'
 
-class BestPracticeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = BestPractice
-        fields = '__all__'
-
 class DiagnosisHistorySerializer(serializers.ModelSerializer):
-    disease_name = serializers.CharField(source='disease_detected.name', read_only=True)
+    disease_name = serializers.CharField(source='result', read_only=True)
+    confidence = serializers.FloatField(source='diagnosis.confidence', read_only=True)
+    plant_type = serializers.CharField(source='diagnosis.plant_type', read_only=True)
+    thumbnail = serializers.ImageField(source='diagnosis.thumbnail', read_only=True)
     
     class Meta:
         model = DiagnosisHistory
-        fields = '__all__'
-        read_only_fields = ('user', 'created_at')
+        fields = ('id', 'diagnosis', 'disease_name', 'confidence', 'plant_type', 'is_healthy', 'thumbnail', 'date', 'notes')
+        read_only_fields = ('diagnosis', 'is_healthy', 'date')
 
 class ImageUploadSerializer(serializers.Serializer):
     image = serializers.ImageField()
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+
+from .analytics import record_diagnoses
+from .models import Diagnosis, PlantDisease, PreventionTip, Treatment
+from .versioning import CATALOGUE, bump_version
+
+
+def catalogue_changed(sender, **kwargs):
+    bump_version(CATALOGUE)
+
+
+for model in (PlantDisease, Treatment, PreventionTip):
+    post_save.connect(catalogue_changed, sender=model, dispatch_uid=f'catalogue_save_{model.__name__}')
+    post_delete.connect(catalogue_changed, sender=model, dispatch_uid=f'catalogue_delete_{model.__name__}')
+
+
+def diagnosis_deleted(sender, instance, **kwargs):
+    # Saves are counted by write_behind._persist: bulk_create sends no post_save
+    record_diagnoses([instance], sign=-1)
+
+
+post_delete.connect(diagnosis_deleted, sender=Diagnosis, dispatch_uid='analytics_delete_Diagnosis')
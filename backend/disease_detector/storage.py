@@ -0,0 +1,82 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_digest(content):
+    """SHA-256 hex digest of a Django File/ContentFile, leaving it rewound"""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names every file after the SHA-256 of its bytes.
+
+    save('diagnoses/whatever.jpg', content) stores diagnoses/ab/abcdef....jpg,
+    so identical uploads share one file and saving them again writes nothing.
+    Files may be referenced by many rows: never delete one just because a row
+    pointing at it went away.
+    """
+
+    def content_name(self, name, content):
+        """Storage name for content under name's directory, keeping its extension"""
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_digest(content)
+        return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Same name means same bytes: an existing file is the file we wanted to write
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write a private temp file and rename it into place: workers storing the same
+        # bytes concurrently both succeed, and readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+
+diagnosis_storage = ContentAddressedStorage()
+
+
+def get_diagnosis_storage():
+    """Storage for Diagnosis images, referenced by the model fields so migrations stay storage-agnostic"""
+    return diagnosis_storage
@@ -3,8 +3,17 @@ from . import views
 
 urlpatterns = [
     path('detect/', views.detect_disease),
+    path('detect/batch/', views.detect_disease_batch),
+    path('detect/async/', views.detect_disease_async),
+    path('detect/tiled/', views.detect_disease_tiled),
     path('diseases/', views.get_diseases),
     path('model-info/', views.get_model_info),
+    path('ready/', views.get_readiness),
+    path('metrics/', views.get_metrics),
     path('diseases/<int:disease_id>/', views.get_disease_detail),
+    path('analytics/diagnoses/', views.get_diagnosis_analytics),
+    path('history/', views.get_diagnosis_history),
+    path('similar/', views.find_similar_cases),
+    path('diagnoses/<int:diagnosis_id>/similar/', views.get_similar_diagnoses),
 ]
 
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DataVersion
+
+# Version key shared by everything derived from PlantDisease, Treatment and PreventionTip
+CATALOGUE = 'disease_catalogue'
+
+_caches = {}
+
+
+def get_version(key):
+    """Return (version, updated_at) for a data set; (0, None) before the first change"""
+    row = DataVersion.objects.filter(key=key).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def bump_version(key):
+    """Increment a data set's version; other workers pick it up on their next check"""
+    now = timezone.now()
+    if not DataVersion.objects.filter(key=key).update(version=F('version') + 1, updated_at=now):
+        _, created = DataVersion.objects.get_or_create(key=key, defaults={'version': 1})
+        if not created:
+            DataVersion.objects.filter(key=key).update(version=F('version') + 1, updated_at=now)
+
+    # This worker doesn't need to wait for its next check
+    transaction.on_commit(lambda: [cache.invalidate() for cache in _caches.get(key, [])])
+
+
+class VersionedCache:
+    """
+    In-process value rebuilt by build(version, updated_at) whenever the DataVersion for key changes.
+
+    The version row is read at most once every check_interval seconds, so
+    steady-state reads cost no queries while changes made in any worker still
+    propagate within that interval.
+    """
+
+    def __init__(self, key, build, check_interval=5.0):
+        self.key = key
+        self.build = build
+        self.check_interval = check_interval
+        self.version = None
+        self.updated_at = None
+        self._value = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        _caches.setdefault(key, []).append(self)
+
+    def get(self):
+        if self._value is not None and time.monotonic() < self._next_check:
+            return self._value
+
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._next_check:
+                return self._value
+            version, updated_at = get_version(self.key)
+            if self._value is None or version != self.version:
+                self._value = self.build(version, updated_at)
+                self.version, self.updated_at = version, updated_at
+            self._next_check = time.monotonic() + self.check_interval
+            return self._value
+
+    def invalidate(self):
+        self._next_check = 0.0
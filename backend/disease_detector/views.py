@@ -1,13 +1,35 @@
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-import os
-import tempfile
-from .models import DiagnosisHistory, PlantDisease
-from ml_model.custom_predictor import predictor  # Use your custom model
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import timedelta
+import json
+import zipfile
+from .analytics import period_start, query_rollups
+from .catalogue import conditional_response, etag_for, get_catalogue, paginate
+from .filters import DiagnosisHistoryFilter
+from .inference_executor import InferenceOverloaded, inference_executor
+from .knowledge import get_disease_info
+from .models import Diagnosis, DiagnosisHistory, DiagnosisRollup
+from .pagination import KeysetPagination
+from .serializers import DiagnosisHistorySerializer
+from .write_behind import diagnosis_record, save_diagnosis
+from ml_model.custom_predictor import predictor, BACKEND  # Use your custom model
+from ml_model.image_io import ImageTooLarge, check_limits
+from ml_model.metrics import render as render_metrics, time_stage, track_in_flight
+from ml_model.tiling import PREFILTER, PREFILTERS, TILE_OVERLAP, TILE_SIZE
 
 
 # ==========================================
@@ -25,68 +47,60 @@ def detect_disease(request):
     
     image_file = request.FILES['image']
     
-    try:
-        # Save uploaded image to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            for chunk in image_file.chunks():
-                tmp_file.write(chunk)
-            temp_path = tmp_file.name
-        
-        # Use your custom model to predict disease
-        disease_name, confidence = predictor.predict_disease(temp_path)
-        
-        # Get detailed disease information
-        disease_info = predictor.get_disease_info(disease_name)
-        
-        # Clean up temporary file
+    with track_in_flight('detect'):
+        # Reject oversized uploads from the header alone, before any decode
         try:
-            os.unlink(temp_path)
-        except:
-            pass
-        
-        # Prepare comprehensive response
-        response_data = {
-            'disease_detected': disease_name,
-            'scientific_name': disease_info['scientific_name'],
-            'confidence': confidence,
-            'is_healthy': disease_info['is_healthy'],
-            'plant_type': disease_info['plant_type'],
-            'symptoms': disease_info['symptoms'],
-            'causes': disease_info['causes'],
-            'treatment_advice': disease_info['treatment_advice'],
-            'prevention_tips': disease_info['prevention_tips'],
-            'model_type': 'Custom PyTorch Model',
-            'message': 'AI analysis complete using your trained model'
-        }
+            with time_stage('upload'):
+                check_limits(image_file)
+        except ImageTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except Exception:
+            return Response({'error': 'Uploaded file is not a valid image'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Save to diagnosis history if user is authenticated
-        if request.user.is_authenticated:
-            disease_obj, created = PlantDisease.objects.get_or_create(
-                name=disease_name,
-                defaults={
-                    'scientific_name': disease_info['scientific_name'],
-                    'description': f'{disease_info["symptoms"]}. Causes: {disease_info["causes"]}',
-                    'symptoms': disease_info['symptoms'],
-                    'causes': disease_info['causes']
-                }
-            )
+        try:
+            response_data = run_detection(image_file, request.user)
+            return Response(response_data, status=status.HTTP_200_OK)
             
-            DiagnosisHistory.objects.create(
-                user=request.user,
-                image=image_file,
-                plant_type=disease_info['plant_type'],
-                disease_detected=disease_obj,
-                confidence=confidence,
-                is_healthy=disease_info['is_healthy']
+        except Exception as e:
+            return Response(
+                {'error': f'Error processing image: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        
-        return Response(response_data, status=status.HTTP_200_OK)
-        
-    except Exception as e:
-        return Response(
-            {'error': f'Error processing image: {str(e)}'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+
+
+def run_detection(image_file, user):
+    """Predict, look up disease info and queue history persistence; shared by the sync and async views"""
+    # Decode straight from the upload buffer, no temp-file round trip
+    disease_name, confidence, stage, embedding = predictor.predict_with_embedding(image_file)
+    if stage is None:
+        # The predictor logged the cause; a failed prediction is not saved, counted or indexed
+        raise RuntimeError('Prediction failed')
+    
+    # Get detailed disease information
+    with time_stage('knowledge_lookup'):
+        disease_info = get_disease_info(disease_name)
+    
+    # Prepare comprehensive response
+    response_data = {
+        'disease_detected': disease_name,
+        'scientific_name': disease_info['scientific_name'],
+        'confidence': confidence,
+        'stage': stage,
+        'is_healthy': disease_info['is_healthy'],
+        'plant_type': disease_info['plant_type'],
+        'symptoms': disease_info['symptoms'],
+        'causes': disease_info['causes'],
+        'treatment_advice': disease_info['treatment_advice'],
+        'prevention_tips': disease_info['prevention_tips'],
+        'model_type': 'Custom PyTorch Model',
+        'message': 'AI analysis complete using your trained model'
+    }
+    
+    # Save to diagnosis history if user is authenticated (written behind the response)
+    if user.is_authenticated:
+        save_diagnosis(diagnosis_record(image_file, disease_name, confidence, disease_info, user, embedding))
+    
+    return response_data
 
 
 # ==========================================
@@ -95,11 +109,10 @@ def detect_disease(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_diseases(request):
-    """Return list of diseases stored in the database"""
-    diseases = PlantDisease.objects.all().values(
-        'id', 'name', 'scientific_name', 'symptoms', 'causes'
-    )
-    return Response(list(diseases))
+    """Return the paginated disease catalogue with treatments and prevention tips"""
+    catalogue = get_catalogue()
+    etag = etag_for(request, catalogue, request.get_full_path())
+    return conditional_response(request, catalogue, etag, paginate(request, catalogue))
 
 
 # ==========================================
@@ -109,22 +122,15 @@ def get_diseases(request):
 @permission_classes([AllowAny])
 def get_disease_detail(request, disease_id):
     """Return full disease details"""
-    try:
-        disease = PlantDisease.objects.get(id=disease_id)
-        data = {
-            'id': disease.id,
-            'name': disease.name,
-            'scientific_name': disease.scientific_name,
-            'description': disease.description,
-            'symptoms': disease.symptoms,
-            'causes': disease.causes,
-        }
-        return Response(data)
-    except PlantDisease.DoesNotExist:
+    catalogue = get_catalogue()
+    disease = catalogue.by_id.get(disease_id)
+    if disease is None:
         return Response(
             {'error': 'Disease not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    etag = etag_for(request, catalogue, disease_id)
+    return conditional_response(request, catalogue, etag, Response(disease))
 
 
 # ==========================================
@@ -134,12 +140,521 @@ def get_disease_detail(request, disease_id):
 @permission_classes([AllowAny])
 def get_model_info(request):
     """Return information about the AI model"""
+    if predictor.model_loaded:
+        # Also how an idle worker notices a registry change
+        predictor.check_registry()
     model_info = {
         "model_name": "Custom Plant Disease Model",
-        "framework": "PyTorch",
+        "framework": predictor.backend.framework if predictor.model_loaded else BACKEND,
         "input_type": "Leaf Image",
-        "version": "1.0",
-        "status": "Model Loaded Successfully" if predictor.model_loaded else "Using Mock Model"
+        "version": predictor.active_version if predictor.model_loaded else None,
+        "status": "Model Loaded Successfully" if predictor.model_loaded else "Model Not Loaded Yet",
+        "ready": predictor.is_ready,
+        "load_seconds": predictor.load_seconds
     }
+    # Reporting stats must not trigger a model load
+    if predictor.model_loaded:
+        model_info["backend"] = predictor.get_backend_info()
+        model_info["registry"] = predictor.get_registry_info()
+        model_info["batching"] = predictor.get_batching_stats()
+        model_info["cache"] = predictor.get_cache_stats()
+        model_info["embeddings"] = predictor.get_embedding_stats()
     return Response(model_info)
 
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_readiness(request):
+    """Readiness probe: 200 once the model is loaded and warm, 503 until then"""
+    if predictor.is_ready:
+        return Response({'ready': True, 'load_seconds': predictor.load_seconds})
+
+    # Servers without a post_fork hook (runserver, non-preloaded gunicorn) warm up on first probe
+    predictor.start_warm_up()
+    return Response(
+        {'ready': False, 'model_loaded': predictor.model_loaded, 'error': predictor.load_error},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
+
+# ==========================================
+# 5. BATCH DETECTION (STREAMED NDJSON)
+# ==========================================
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+
+def _iter_batch_uploads(request):
+    """Yield (filename, bytes) for every uploaded image part or zip archive entry"""
+    max_bytes = settings.BATCH_DETECT_MAX_IMAGE_BYTES
+    count = 0
+
+    for upload in request.FILES.getlist('image'):
+        count += 1
+        if count > settings.BATCH_DETECT_MAX_IMAGES:
+            return
+        if upload.size > max_bytes:
+            yield upload.name, None
+            continue
+        yield upload.name, upload.read()
+
+    if 'archive' in request.FILES:
+        # ZipFile reads entries lazily, so only one entry is held in memory at a time
+        with zipfile.ZipFile(request.FILES['archive']) as archive:
+            for entry in archive.infolist():
+                if entry.is_dir() or not entry.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                count += 1
+                if count > settings.BATCH_DETECT_MAX_IMAGES:
+                    return
+                if entry.file_size > max_bytes:
+                    yield entry.filename, None
+                    continue
+                yield entry.filename, archive.read(entry)
+
+
+def _batch_result_line(index, filename, result):
+    """Format one finished (disease_name, confidence, stage) prediction as an NDJSON line"""
+    disease_name, confidence, stage = result
+
+    with time_stage('knowledge_lookup'):
+        disease_info = get_disease_info(disease_name)
+    return json.dumps({
+        'index': index,
+        'filename': filename,
+        'disease_detected': disease_name,
+        'confidence': confidence,
+        'stage': stage,
+        'is_healthy': disease_info['is_healthy'],
+        'plant_type': disease_info['plant_type'],
+    }) + '\n'
+
+
+def _stream_batch_results(uploads):
+    """Submit images to the predictor and yield results as they complete"""
+    # The request stays in flight until the last line is streamed (or the client goes away)
+    with track_in_flight('detect_batch'):
+        yield from _batch_results(uploads)
+
+
+def _batch_results(uploads):
+    predictor.check_registry()
+    # One model version's cache for the whole request, even if a swap happens meanwhile
+    cache = predictor.cache
+    pending = {}
+    total = 0
+
+    def drain(block_until_empty):
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, filename, cache_key = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield json.dumps({'index': index, 'filename': filename, 'error': str(e)}) + '\n'
+                    continue
+                cache.set_by_key(cache_key, result[:2])
+                yield _batch_result_line(index, filename, result)
+            if not block_until_empty:
+                return
+
+    for index, (filename, data) in enumerate(uploads):
+        total += 1
+        if data is None:
+            yield json.dumps({'index': index, 'filename': filename, 'error': 'Image too large'}) + '\n'
+            continue
+
+        cache_key = cache.key_for(data)
+        cached = cache.get_by_key(cache_key)
+        if cached is not None:
+            yield _batch_result_line(index, filename, (*cached, 'cache'))
+            continue
+
+        try:
+            with time_stage('decode'):
+                image = predictor.decode_image(data)
+        except Exception as e:
+            yield json.dumps({'index': index, 'filename': filename, 'error': f'Invalid image: {e}'}) + '\n'
+            continue
+        del data
+
+        pending[predictor.predict_image_async(image)] = (index, filename, cache_key)
+
+        # Bound memory: never hold more than BATCH_DETECT_WINDOW decoded images
+        if len(pending) >= settings.BATCH_DETECT_WINDOW:
+            yield from drain(block_until_empty=False)
+
+    yield from drain(block_until_empty=True)
+    yield json.dumps({'done': True, 'total': total}) + '\n'
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def detect_disease_batch(request):
+    """Detect diseases for many images (multiple 'image' parts or one zip 'archive'), streamed as NDJSON"""
+    if 'image' not in request.FILES and 'archive' not in request.FILES:
+        return Response(
+            {'error': 'Provide one or more image files or a zip archive'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if 'archive' in request.FILES and not zipfile.is_zipfile(request.FILES['archive']):
+        return Response(
+            {'error': 'Archive is not a valid zip file'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    response = StreamingHttpResponse(
+        _stream_batch_results(_iter_batch_uploads(request)),
+        content_type='application/x-ndjson'
+    )
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ==========================================
+# 6. ASYNC DETECTION (ASGI, ADMISSION CONTROLLED)
+# ==========================================
+def _accept_async_upload(request):
+    """Authenticate like the DRF views and validate the upload; returns (error response, image, user)"""
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        # SessionAuthentication enforces CSRF here; requests no authenticator accepts are anonymous
+        user = drf_request.user
+    except APIException as e:
+        # As APIView does: a 401 needs a WWW-Authenticate header from the first authenticator, else it is a 403
+        status_code, header = e.status_code, None
+        if status_code == 401:
+            if drf_request.authenticators:
+                header = drf_request.authenticators[0].authenticate_header(drf_request)
+            if not header:
+                status_code = 403
+        response = JsonResponse({'error': str(e.detail)}, status=status_code)
+        if header:
+            response['WWW-Authenticate'] = header
+        return response, None, None
+
+    if 'image' not in drf_request.FILES:
+        return JsonResponse({'error': 'No image file provided'}, status=400), None, None
+
+    image_file = drf_request.FILES['image']
+    try:
+        with time_stage('upload'):
+            check_limits(image_file)
+    except ImageTooLarge as e:
+        return JsonResponse({'error': str(e)}, status=413), None, None
+    except Exception:
+        return JsonResponse({'error': 'Uploaded file is not a valid image'}, status=400), None, None
+    return None, image_file, user
+
+
+async def detect_disease_async(request):
+    """Async variant of detect_disease: inference runs on a bounded executor, overload returns 429"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    # Shed load before touching the upload at all
+    if inference_executor.saturated:
+        retry_after = inference_executor.shed()
+        response = JsonResponse({'error': 'Server busy, retry later'}, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    with track_in_flight('detect_async'):
+        # Session lookup, CSRF check and multipart parsing all block: keep them off the event loop
+        error, image_file, user = await sync_to_async(_accept_async_upload)(request)
+        if error is not None:
+            return error
+
+        try:
+            response_data = await inference_executor.run(run_detection, image_file, user)
+        except InferenceOverloaded as e:
+            response = JsonResponse({'error': 'Server busy, retry later'}, status=429)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception as e:
+            return JsonResponse({'error': f'Error processing image: {str(e)}'}, status=500)
+
+    return JsonResponse(response_data)
+
+
+# Like DRF's APIView: the middleware skips it and _accept_async_upload enforces CSRF for session users only.
+# Set directly since csrf_exempt can't wrap coroutines on Django 4.2
+detect_disease_async.csrf_exempt = True
+
+
+# ==========================================
+# 7. METRICS (PROMETHEUS)
+# ==========================================
+# Plain Django view: DRF content negotiation would answer 406 to a scraper asking for text/plain only
+@require_GET
+def get_metrics(request):
+    """Per-stage latency histograms, counters and queue/model gauges in Prometheus text format"""
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+# ==========================================
+# 8. TILED DETECTION (FIELD AND CANOPY IMAGES)
+# ==========================================
+def _tiling_options(data):
+    """tile_size, overlap and prefilter from the request, with the configured defaults"""
+    tile_size = int(data.get('tile_size', TILE_SIZE))
+    overlap = float(data.get('overlap', TILE_OVERLAP))
+    prefilter = data.get('prefilter', PREFILTER)
+    if not 64 <= tile_size <= 4096:
+        raise ValueError('tile_size must be between 64 and 4096 pixels')
+    if not 0 <= overlap <= 0.75:
+        raise ValueError('overlap must be between 0 and 0.75')
+    if prefilter not in PREFILTERS:
+        raise ValueError(f"prefilter must be one of: {', '.join(PREFILTERS)}")
+    return tile_size, overlap, prefilter
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def detect_disease_tiled(request):
+    """Score a large multi-leaf image as a grid of overlapping tiles; returns a heat-grid and an overall verdict"""
+    if 'image' not in request.FILES:
+        return Response(
+            {'error': 'No image file provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        tile_size, overlap, prefilter = _tiling_options(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    image_file = request.FILES['image']
+
+    with track_in_flight('detect_tiled'):
+        try:
+            with time_stage('upload'):
+                check_limits(image_file)
+        except ImageTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except Exception:
+            return Response({'error': 'Uploaded file is not a valid image'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = predictor.predict_tiles(
+                image_file, tile_size=tile_size, overlap=overlap, prefilter=prefilter,
+                is_healthy=lambda label: get_disease_info(label)['is_healthy'],
+            )
+        except Exception as e:
+            return Response(
+                {'error': f'Error processing image: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        disease_name, confidence = result['disease_detected'], result['confidence']
+        with time_stage('knowledge_lookup'):
+            disease_info = get_disease_info(disease_name)
+        result.update({
+            'scientific_name': disease_info['scientific_name'],
+            'is_healthy': disease_info['is_healthy'],
+            'plant_type': disease_info['plant_type'],
+            'treatment_advice': disease_info['treatment_advice'],
+            'prevention_tips': disease_info['prevention_tips'],
+        })
+
+        if request.user.is_authenticated:
+            save_diagnosis(diagnosis_record(image_file, disease_name, confidence, disease_info, request.user))
+
+    return Response(result, status=status.HTTP_200_OK)
+
+
+# ==========================================
+# 9. SIMILAR PAST CASES (EMBEDDING INDEX)
+# ==========================================
+SIMILAR_MAX_RESULTS = 50
+
+
+def _similar_count(data):
+    k = int(data.get('k', 10))
+    if not 1 <= k <= SIMILAR_MAX_RESULTS:
+        raise ValueError(f'k must be between 1 and {SIMILAR_MAX_RESULTS}')
+    return k
+
+
+def _similar_cases(neighbours, user):
+    """Diagnosis details for index neighbours; thumbnails only of the requester's own diagnoses"""
+    diagnoses = Diagnosis.objects.in_bulk([neighbour.id for neighbour in neighbours])
+    own = set()
+    if user.is_authenticated:
+        own = set(DiagnosisHistory.objects.filter(user=user, diagnosis_id__in=diagnoses)
+                  .values_list('diagnosis_id', flat=True))
+
+    cases = []
+    for neighbour in neighbours:
+        diagnosis = diagnoses.get(neighbour.id)
+        if diagnosis is None:  # deleted since it was indexed
+            continue
+        cases.append({
+            'diagnosis_id': diagnosis.pk,
+            'distance': neighbour.distance,
+            'disease_detected': diagnosis.result,
+            'confidence': diagnosis.confidence,
+            'plant_type': diagnosis.plant_type,
+            'is_healthy': diagnosis.is_healthy,
+            'created_at': diagnosis.created_at,
+            'own': diagnosis.pk in own,
+            'thumbnail': diagnosis.thumbnail.url if diagnosis.pk in own and diagnosis.thumbnail else None,
+        })
+    return cases
+
+
+def _embeddings_disabled():
+    return Response(
+        {'error': 'Similar-case search is not enabled on this server (PREDICTOR_EMBEDDINGS=1)'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def find_similar_cases(request):
+    """Predict an uploaded image and return the most similar past diagnoses"""
+    if 'image' not in request.FILES:
+        return Response(
+            {'error': 'No image file provided'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        k = _similar_count(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if predictor.embeddings is None:
+        return _embeddings_disabled()
+
+    image_file = request.FILES['image']
+
+    with track_in_flight('similar'):
+        try:
+            with time_stage('upload'):
+                check_limits(image_file)
+        except ImageTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except Exception:
+            return Response({'error': 'Uploaded file is not a valid image'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            disease_name, confidence, vector = predictor.embed_image(image_file)
+        except Exception as e:
+            return Response(
+                {'error': f'Error processing image: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        if vector is None:
+            return Response(
+                {'error': f'The {predictor.backend.name} backend does not provide image embeddings'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        neighbours = predictor.find_similar(vector, k=k)
+        return Response({
+            'disease_detected': disease_name,
+            'confidence': confidence,
+            'similar': _similar_cases(neighbours, request.user),
+        })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_similar_diagnoses(request, diagnosis_id):
+    """Past diagnoses most similar to one of the requester's own"""
+    try:
+        k = _similar_count(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not DiagnosisHistory.objects.filter(user=request.user, diagnosis_id=diagnosis_id).exists():
+        return Response({'error': 'Diagnosis not found'}, status=status.HTTP_404_NOT_FOUND)
+    if predictor.embeddings is None:
+        return _embeddings_disabled()
+
+    vector = predictor.embeddings.vector(diagnosis_id)
+    if vector is None:
+        return Response(
+            {'error': 'Diagnosis is not in the similarity index yet (see manage.py build_embedding_index)'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    neighbours = predictor.find_similar(vector, k=k, exclude_id=diagnosis_id)
+    return Response({'diagnosis_id': diagnosis_id, 'similar': _similar_cases(neighbours, request.user)})
+
+
+# ==========================================
+# 10. OUTBREAK ANALYTICS (ROLLUPS)
+# ==========================================
+ANALYTICS_DEFAULT_PERIODS = {DiagnosisRollup.DAY: 30, DiagnosisRollup.WEEK: 12}
+
+
+def _analytics_range(params):
+    """(start, end, period) from the query string: the last 30 days (or 12 weeks) by default"""
+    period = params.get('period', DiagnosisRollup.DAY)
+    if period not in ANALYTICS_DEFAULT_PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(ANALYTICS_DEFAULT_PERIODS)}")
+
+    dates = {}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        dates[name] = parse_date(value) if value else None
+        if value and dates[name] is None:
+            raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+    end = dates['end'] or timezone.localdate()
+    days_per_period = 7 if period == DiagnosisRollup.WEEK else 1
+    start = dates['start'] or end - timedelta(days=ANALYTICS_DEFAULT_PERIODS[period] * days_per_period - 1)
+
+    if start > end:
+        raise ValueError('start must not be after end')
+    # Bounding the periods bounds the rollup rows read, which is what keeps the query cost flat
+    if (end - period_start(start, period)).days // days_per_period + 1 > settings.ANALYTICS_MAX_PERIODS:
+        raise ValueError(f'At most {settings.ANALYTICS_MAX_PERIODS} {period}s per query; shorten the range')
+    return start, end, period
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_diagnosis_analytics(request):
+    """Diagnosis counts by disease, plant type and day or week, with healthy/diseased ratios, from the rollups"""
+    try:
+        start, end, period = _analytics_range(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    with time_stage('analytics_query'):
+        data = query_rollups(
+            start, end, period,
+            plant_type=request.query_params.get('plant_type'),
+            result=request.query_params.get('disease'),
+        )
+    return Response(data)
+
+
+# ==========================================
+# 11. DIAGNOSIS HISTORY (KEYSET PAGINATED)
+# ==========================================
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_diagnosis_history(request):
+    """The requester's past diagnoses, newest first, filtered by disease, healthy flag and date range"""
+    history = DiagnosisHistory.objects.filter(user=request.user).select_related('diagnosis')
+    filterset = DiagnosisHistoryFilter(request.query_params, queryset=history)
+    if not filterset.is_valid():
+        return Response({'error': 'Invalid filters', 'fields': filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Cursor pages instead of PageNumberPagination: no OFFSET scan and no COUNT, so page N costs what page 1 does
+    paginator = KeysetPagination()
+    try:
+        page = paginator.paginate_queryset(filterset.qs, request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = DiagnosisHistorySerializer(page, many=True, context={'request': request})
+    return Response({'next': paginator.get_next_link(request), 'results': serializer.data})
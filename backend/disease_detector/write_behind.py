@@ -0,0 +1,347 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from ml_model.metrics import QUEUE_DEPTH, time_stage
+from .models import Diagnosis, DiagnosisHistory, PlantDisease
+from .storage import diagnosis_storage
+
+logger = logging.getLogger(__name__)
+
+
+def diagnosis_record(image_file, disease_name, confidence, disease_info, user=None, embedding=None):
+    """Snapshot everything needed to persist one diagnosis, detached from the request"""
+    image_file.seek(0)
+    extension = os.path.splitext(image_file.name or '')[1].lower() or '.jpg'
+    return {
+        'image_name': f'{uuid.uuid4().hex}{extension}',
+        'image_bytes': image_file.read(),
+        'result': disease_name,
+        'confidence': confidence,
+        'plant_type': disease_info['plant_type'],
+        'is_healthy': disease_info['is_healthy'],
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        # ml_model.embedding_index.Embedding from predict_with_embedding, indexed once the row exists
+        'embedding': embedding,
+        'disease_defaults': {
+            'scientific_name': disease_info['scientific_name'],
+            'description': f'{disease_info["symptoms"]}. Causes: {disease_info["causes"]}',
+            'symptoms': disease_info['symptoms'],
+            'causes': disease_info['causes'],
+            'plant_type': disease_info['plant_type'],
+            'is_healthy': disease_info['is_healthy'],
+        },
+    }
+
+
+def persist_diagnoses(records):
+    """Write a batch of diagnosis records: images to storage, rows with bulk_create"""
+    if not records:
+        return []
+
+    with time_stage('history_write'):
+        return _persist(records)
+
+
+def _persist(records):
+    # Imported here: derivatives builds its queue from WriteBehindQueue in this module
+    from .analytics import record_diagnoses
+    from .derivatives import digest_of, model_resolution_copy, queue_derivatives
+
+    # Files first: storage isn't transactional, and this keeps the DB transaction short.
+    # Storage is content-addressed, so a re-uploaded image is not written again.
+    for record in records:
+        if 'image_path' in record:  # stored by an earlier attempt that failed in the transaction
+            continue
+        data = record.pop('image_bytes')
+        name = f"diagnoses/{record['image_name']}"
+        record['reduced'] = False
+        if not settings.DIAGNOSIS_STORE_ORIGINAL:
+            try:
+                data = model_resolution_copy(data)
+                name = f"{os.path.splitext(name)[0]}.jpg"
+                record['reduced'] = True
+            except Exception as e:
+                logger.warning(f'Keeping the original upload, reduced copy failed: {e}')
+        record['image_path'] = diagnosis_storage.save(name, ContentFile(data))
+
+    with transaction.atomic():
+        known = set(
+            PlantDisease.objects.filter(name__in={r['result'] for r in records}).values_list('name', flat=True)
+        )
+        for record in records:
+            if record['result'] not in known:
+                PlantDisease.objects.create(name=record['result'], **record['disease_defaults'])
+                known.add(record['result'])
+
+        diagnoses = Diagnosis.objects.bulk_create([
+            Diagnosis(
+                image=record['image_path'],
+                content_hash=digest_of(record['image_path']),
+                # When only the reduced copy is stored it is the model-resolution image
+                model_image=record['image_path'] if record['reduced'] else '',
+                result=record['result'],
+                confidence=record['confidence'],
+                plant_type=record['plant_type'],
+                is_healthy=record['is_healthy'],
+            )
+            for record in records
+        ])
+        DiagnosisHistory.objects.bulk_create([
+            DiagnosisHistory(
+                diagnosis=diagnosis, user_id=record['user_id'], result=record['result'], is_healthy=record['is_healthy']
+            )
+            for diagnosis, record in zip(diagnoses, records)
+        ])
+        # Same transaction: the analytics rollups never disagree with the rows they count
+        record_diagnoses(diagnoses)
+        # Only once the rows are committed (and never if an outer transaction rolls back)
+        transaction.on_commit(lambda: queue_derivatives(diagnoses))
+        embedded = [
+            (diagnosis, record['embedding'])
+            for diagnosis, record in zip(diagnoses, records) if record.get('embedding') is not None
+        ]
+        if embedded:
+            transaction.on_commit(lambda: index_embeddings(embedded))
+    return diagnoses
+
+
+def discard_records(records):
+    """Delete the stored images of records that could not be persisted, unless a saved diagnosis uses the same file"""
+    paths = {record['image_path'] for record in records if record.get('image_path')}
+    if not paths:
+        return
+    try:
+        # Content-addressed: another diagnosis of the same bytes points at the very same file
+        in_use = set(Diagnosis.objects.filter(image__in=paths).values_list('image', flat=True))
+        in_use.update(Diagnosis.objects.filter(model_image__in=paths).values_list('model_image', flat=True))
+    except Exception as e:
+        logger.warning(f'Keeping {len(paths)} images of dropped diagnoses, could not check who else uses them: {e}')
+        return
+    for path in paths - in_use:
+        try:
+            diagnosis_storage.delete(path)
+        except OSError as e:
+            logger.warning(f'Could not delete {path} of a dropped diagnosis: {e}')
+
+
+def index_embeddings(embedded):
+    """Append (diagnosis, Embedding) pairs to their model version's embedding index"""
+    by_index = {}
+    for diagnosis, embedding in embedded:
+        by_index.setdefault(embedding.index, []).append((diagnosis, embedding.vector))
+
+    with time_stage('embedding_index'):
+        for index, entries in by_index.items():
+            try:
+                index.add(
+                    [diagnosis.pk for diagnosis, _ in entries],
+                    [vector for _, vector in entries],
+                    [diagnosis.result for diagnosis, _ in entries],
+                    [diagnosis.confidence for diagnosis, _ in entries],
+                )
+            except Exception as e:
+                # Only costs similar-case recall; `manage.py build_embedding_index` fills the gaps
+                logger.warning(f'Could not index {len(entries)} embeddings in {index.directory}: {e}')
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of diagnosis records flushed by a background thread.
+
+    A flush happens when batch_size records are waiting or flush_interval seconds
+    have passed since the first one arrived. submit() never blocks: it returns
+    False when the queue is full (by count or by buffered image bytes) so the
+    caller can fall back to a synchronous write.
+
+    A failed flush is retried with exponential backoff; if the batch still fails,
+    its records are written one at a time so one bad record can't take its
+    neighbours down, and only the records that fail alone are handed to discard_fn.
+    """
+
+    def __init__(self, flush_fn, max_records=1000, max_bytes=256 * 1024 * 1024,
+                 batch_size=100, flush_interval=1.0, name='history-writer',
+                 retries=3, retry_backoff=0.5, discard_fn=None):
+        self.flush_fn = flush_fn
+        self.discard_fn = discard_fn
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.name = name
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_records)
+        self._lock = threading.Lock()
+        self._pending_bytes = 0
+        self._worker = None
+        self._worker_pid = None
+        self._stopping = threading.Event()
+
+        self.flushed = 0
+        self.rejected = 0
+        self.retried = 0
+        self.failed = 0
+        self._depth_gauge = QUEUE_DEPTH.labels(name.replace('-', '_'))
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so each gunicorn worker starts its own
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, record):
+        """Queue a record for background persistence; False means the caller must write it itself"""
+        size = len(record.get('image_bytes') or b'')
+        with self._lock:
+            if self._stopping.is_set() or self._pending_bytes + size > self.max_bytes:
+                self.rejected += 1
+                return False
+            self._pending_bytes += size
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._pending_bytes -= size
+                self.rejected += 1
+            return False
+        self._depth_gauge.inc()
+        self._ensure_worker()
+        return True
+
+    def _take(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        size = sum(len(record.get('image_bytes') or b'') for record in batch)
+        self._depth_gauge.dec(len(batch))
+        try:
+            if self._flush_with_retries(batch):
+                self.flushed += len(batch)
+                return
+            # One at a time: a single bad record only loses itself
+            dropped = batch if len(batch) == 1 else []
+            for record in batch if len(batch) > 1 else []:
+                try:
+                    self.flush_fn([record])
+                    self.flushed += 1
+                except Exception as e:
+                    logger.error(f'{self.name} dropped a record that cannot be written: {e}')
+                    dropped.append(record)
+                finally:
+                    close_old_connections()
+            self.failed += len(dropped)
+            if dropped and self.discard_fn is not None:
+                try:
+                    self.discard_fn(dropped)
+                except Exception as e:
+                    logger.error(f'{self.name} could not clean up {len(dropped)} dropped records: {e}')
+        finally:
+            with self._lock:
+                self._pending_bytes -= size
+            close_old_connections()
+
+    def _flush_with_retries(self, batch):
+        """True once flush_fn(batch) succeeds; False after retries more failed attempts"""
+        for attempt in range(self.retries + 1):
+            try:
+                self.flush_fn(batch)
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f'{self.name} flush of {len(batch)} records failed {attempt + 1} times: {e}')
+                    return False
+                self.retried += 1
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f'{self.name} flush of {len(batch)} records failed, retrying in {delay:.1f}s: {e}')
+                # Drop the connection a transient error ("database is locked", a restart) may have broken
+                close_old_connections()
+                time.sleep(delay)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take()
+            if batch:
+                self._flush(batch)
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting records and flush everything still queued"""
+        self._stopping.set()
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                break
+            self._flush(batch)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'pending_bytes': self._pending_bytes,
+            'flushed': self.flushed,
+            'rejected': self.rejected,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+
+history_writer = WriteBehindQueue(
+    persist_diagnoses,
+    max_records=settings.HISTORY_QUEUE_MAX_RECORDS,
+    max_bytes=settings.HISTORY_QUEUE_MAX_BYTES,
+    batch_size=settings.HISTORY_FLUSH_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    retries=settings.HISTORY_FLUSH_RETRIES,
+    retry_backoff=settings.HISTORY_FLUSH_RETRY_BACKOFF,
+    discard_fn=discard_records,
+)
+
+
+def shutdown_queues():
+    """Drain the history writer, then the derivative queue its last flushes feed"""
+    from .derivatives import derivative_queue
+
+    history_writer.shutdown()
+    derivative_queue.shutdown()
+
+
+# One hook for both, in order: atexit runs separately registered hooks last-registered first
+atexit.register(shutdown_queues)
+
+
+def save_diagnosis(record):
+    """Hand a record to the write-behind queue, or write it synchronously if disabled or full"""
+    if settings.HISTORY_WRITE_BEHIND and history_writer.submit(record):
+        return
+    persist_diagnoses([record])
@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+import time
+import logging
+from collections import Counter, deque
+from concurrent.futures import Future
+
+from .metrics import QUEUE_DEPTH, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStats:
+    """Rolling batch-size and queue-wait statistics for a MicroBatcher"""
+
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self._waits_ms = deque(maxlen=window)
+        self._sizes = Counter()
+        self.batches = 0
+        self.items = 0
+
+    def record(self, size, waits_ms):
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self._sizes[size] += 1
+            self._waits_ms.extend(waits_ms)
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+        return round(values[index], 3)
+
+    def snapshot(self):
+        """Return a JSON-serializable summary of the collected stats"""
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            sizes = dict(sorted(self._sizes.items()))
+            batches, items = self.batches, self.items
+
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": round(items / batches, 3) if batches else 0.0,
+            "batch_size_histogram": sizes,
+            "queue_wait_ms": {
+                "p50": self._percentile(waits, 50),
+                "p95": self._percentile(waits, 95),
+                "p99": self._percentile(waits, 99),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single-item requests into batches for one call of batch_fn.
+
+    A batch is dispatched as soon as it holds max_batch_size items or the oldest
+    item has waited max_wait_ms. batch_fn receives a list of items and must return
+    a list of results in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.stats = BatchStats()
+        self._depth_gauge = QUEUE_DEPTH.labels(name)
+        self._wait_histogram = STAGE_SECONDS.labels("queue_wait")
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a forked gunicorn worker starts its own.
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit_async(self, item):
+        """Queue an item and return a Future resolving to its result"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.monotonic()))
+        self._depth_gauge.inc()
+        return future
+
+    def submit(self, item, timeout=None):
+        """Queue an item and block until its result is ready"""
+        return self.submit_async(item).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            waits_ms = [(started - enqueued) * 1000.0 for _, _, enqueued in batch]
+            self.stats.record(len(batch), waits_ms)
+            self._depth_gauge.dec(len(batch))
+            for wait_ms in waits_ms:
+                self._wait_histogram.observe(wait_ms / 1000.0)
+
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
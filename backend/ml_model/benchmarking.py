@@ -0,0 +1,66 @@
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_leaf(width, height, seed=0):
+    """RGB uint8 array of a green leaf with brown lesions on a soil-coloured background"""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.ogrid[:height, :width]
+    cx, cy = width / 2, height / 2
+
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[...] = (110, 85, 60)
+
+    leaf = ((xs - cx) / (width * 0.42)) ** 2 + ((ys - cy) / (height * 0.3)) ** 2 <= 1.0
+    image[leaf] = (55, 140, 50)
+
+    radius = max(2, min(width, height) // 40)
+    for _ in range(12):
+        lx = rng.uniform(cx - width * 0.3, cx + width * 0.3)
+        ly = rng.uniform(cy - height * 0.2, cy + height * 0.2)
+        lesion = (xs - lx) ** 2 + (ys - ly) ** 2 <= rng.uniform(0.5, 1.5) * radius ** 2
+        image[lesion & leaf] = (120, 80, 30)
+
+    noise = rng.integers(-12, 12, size=(height, width, 1), dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_leaf_jpeg(width, height, seed=0, quality=90):
+    """Encoded JPEG bytes of synthetic_leaf()"""
+    buffer = io.BytesIO()
+    Image.fromarray(synthetic_leaf(width, height, seed)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def summarize(samples_ms, wall_seconds=None, items=None):
+    """Latency percentiles (ms) and, given the wall time, throughput in items per second"""
+    if not samples_ms:
+        return {"count": 0}
+
+    ordered = np.sort(np.asarray(samples_ms, dtype=np.float64))
+    summary = {
+        "count": len(ordered),
+        "mean_ms": round(float(ordered.mean()), 3),
+        "p50_ms": round(float(np.percentile(ordered, 50)), 3),
+        "p95_ms": round(float(np.percentile(ordered, 95)), 3),
+        "p99_ms": round(float(np.percentile(ordered, 99)), 3),
+        "max_ms": round(float(ordered[-1]), 3),
+    }
+    if wall_seconds:
+        summary["throughput_per_sec"] = round((items or len(ordered)) / wall_seconds, 2)
+    return summary
+
+
+def time_calls(fn, iterations, *args):
+    """Call fn(*args) repeatedly; returns (per-call ms samples, wall seconds, last result)"""
+    samples = []
+    result = None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        result = fn(*args)
+        samples.append((time.perf_counter() - call_started) * 1000.0)
+    return samples, time.perf_counter() - started, result
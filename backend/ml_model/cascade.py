@@ -0,0 +1,199 @@
+import os
+import json
+import hashlib
+import logging
+
+import numpy as np
+
+from .metrics import time_stage
+from .preprocessing import BatchPreprocessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAST_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trained_models", "fast")
+FAST_MODEL_DIR = os.environ.get("PREDICTOR_FAST_MODEL_DIR", DEFAULT_FAST_MODEL_DIR)
+
+# Written by the training code: the Keras model and its output class order
+FAST_MODEL_FILE = "model.keras"
+FAST_LABELS_FILE = "labels.json"
+# Written by the calibrate_cascade command
+CASCADE_CONFIG_FILE = "cascade.json"
+
+# The networks in model_architecture.py take 224x224 NHWC input scaled to [0, 1]
+DEFAULT_FAST_PREPROCESSOR = {
+    "size": [224, 224],
+    "mean": [0.0, 0.0, 0.0],
+    "std": [1.0, 1.0, 1.0],
+    "rescale": 1 / 255.0,
+    "layout": "NHWC",
+}
+
+# A threshold no softmax confidence can reach: the class always escalates
+NEVER_ACCEPT = 1.01
+
+
+def _read_labels(model_dir):
+    with open(os.path.join(model_dir, FAST_LABELS_FILE)) as f:
+        return json.load(f)
+
+
+def load_labels(model_dir):
+    """Class names in model output order, from labels.json (a list, or a dict with 'class_names')"""
+    labels = _read_labels(model_dir)
+    return labels["class_names"] if isinstance(labels, dict) else labels
+
+
+def load_preprocessor_config(model_dir):
+    """BatchPreprocessor arguments the model was trained with (labels.json 'preprocessor'), else the default"""
+    labels = _read_labels(model_dir)
+    if isinstance(labels, dict) and "preprocessor" in labels:
+        return labels["preprocessor"]
+    return DEFAULT_FAST_PREPROCESSOR
+
+
+def load_keras_model(model_dir):
+    """The fast model's Keras network, loaded for inference only"""
+    # Heavy import lives here so the ViT-only service never loads TensorFlow
+    import tensorflow as tf
+
+    return tf.keras.models.load_model(os.path.join(model_dir, FAST_MODEL_FILE), compile=False)
+
+
+def map_labels(class_names, label_map=None, vit_labels=None):
+    """
+    The label each fast-model class answers with: its name, or its entry in label_map
+    (cascade.json) for a model trained under another vocabulary. With vit_labels, a class
+    that still isn't a ViT label raises ValueError: the same disease must never be stored,
+    cached or counted under two names depending on which stage answered.
+    """
+    label_map = label_map or {}
+    mapped = [label_map.get(name, name) for name in class_names]
+    if vit_labels is not None:
+        known = set(vit_labels)
+        unknown = [name for name in mapped if name not in known]
+        if unknown:
+            raise ValueError(
+                f"Fast model classes that are not ViT labels: {', '.join(unknown)}. Map them with "
+                f"'label_map' in {CASCADE_CONFIG_FILE} (calibrate_cascade --label-map) or retrain with the ViT's labels"
+            )
+    return mapped
+
+
+def calibrate_thresholds(confidences, predicted, actual, num_classes,
+                         target_precision=0.98, min_support=20):
+    """
+    Per-class confidence thresholds for the fast model, from a labelled set.
+
+    For each predicted class c, pick the lowest threshold t such that among
+    samples predicted as c with confidence >= t, at least target_precision are
+    correct, counting only thresholds backed by min_support accepted samples.
+    Classes that never reach the target escalate every prediction (NEVER_ACCEPT).
+    """
+    confidences = np.asarray(confidences, dtype=np.float64)
+    predicted = np.asarray(predicted)
+    correct = predicted == np.asarray(actual)
+
+    thresholds = np.full(num_classes, NEVER_ACCEPT)
+    for cls in range(num_classes):
+        mask = predicted == cls
+        if mask.sum() < min_support:
+            continue
+
+        # Sweep thresholds from the most confident prediction downwards
+        order = np.argsort(-confidences[mask], kind="stable")
+        conf_sorted = confidences[mask][order]
+        precision = np.cumsum(correct[mask][order]) / np.arange(1, len(order) + 1)
+
+        ok = (precision >= target_precision) & (np.arange(1, len(order) + 1) >= min_support)
+        # Only cut where the confidence actually changes, so ties are accepted or rejected together
+        ok[:-1] &= conf_sorted[:-1] != conf_sorted[1:]
+        if ok.any():
+            thresholds[cls] = conf_sorted[np.flatnonzero(ok)[-1]]
+    return thresholds
+
+
+def cascade_report(confidences, predicted, actual, thresholds):
+    """Share of samples the fast path would answer and its accuracy on them, for a set of thresholds"""
+    confidences = np.asarray(confidences, dtype=np.float64)
+    predicted = np.asarray(predicted)
+    accepted = confidences >= np.asarray(thresholds)[predicted]
+    correct = predicted == np.asarray(actual)
+    return {
+        "samples": int(len(predicted)),
+        "fast_path_share": round(float(accepted.mean()), 4) if len(predicted) else 0.0,
+        "fast_path_accuracy": round(float(correct[accepted].mean()), 4) if accepted.any() else None,
+        "fast_model_accuracy": round(float(correct.mean()), 4) if len(predicted) else None,
+    }
+
+
+class FastClassifier:
+    """
+    First stage of the cascade: a small Keras CNN/MobileNetV2 (see model_architecture.py)
+    whose top-1 answer is accepted when its confidence clears a per-class threshold.
+
+    The model directory holds model.keras, labels.json and cascade.json; the
+    latter carries the calibrated thresholds, the preprocessing settings and an
+    optional label_map from the model's class names to the ViT's labels.
+    """
+
+    def __init__(self, model, class_names, thresholds, preprocessor, version):
+        self.model = model
+        self.class_names = list(class_names)
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.preprocessor = preprocessor
+        self.version = version
+
+        if len(self.thresholds) != len(self.class_names):
+            raise ValueError(
+                f"{len(self.thresholds)} thresholds for {len(self.class_names)} classes"
+            )
+
+    @classmethod
+    def load(cls, model_dir=FAST_MODEL_DIR, vit_labels=None):
+        """
+        Load a calibrated fast model; raises if the model or its cascade.json is missing,
+        or if given vit_labels, when any of its (mapped) classes is not one of them.
+        """
+        config_path = os.path.join(model_dir, CASCADE_CONFIG_FILE)
+        with open(config_path, "rb") as f:
+            raw = f.read()
+        config = json.loads(raw)
+
+        return cls(
+            load_keras_model(model_dir),
+            map_labels(config["class_names"], config.get("label_map"), vit_labels),
+            config["thresholds"],
+            BatchPreprocessor(**config.get("preprocessor", DEFAULT_FAST_PREPROCESSOR)),
+            # Recalibrating changes the answers, so the cache namespace must change with it
+            version=hashlib.sha256(raw).hexdigest()[:12],
+        )
+
+    def labels_match(self, vit_labels):
+        """Whether every answer this model can give is also a label of the given ViT"""
+        return set(self.class_names) <= set(vit_labels)
+
+    def predict_proba(self, images):
+        """Class probabilities (N, C) for a list of RGB PIL images"""
+        with time_stage("fast_preprocess"):
+            pixel_values = self.preprocessor(images)
+        with time_stage("fast_forward"):
+            return np.asarray(self.model(pixel_values, training=False))
+
+    def classify_batch(self, images):
+        """List of (label, confidence, accepted) per image"""
+        probs = self.predict_proba(images)
+        pred_idxs = probs.argmax(axis=1)
+        confidences = probs[np.arange(len(probs)), pred_idxs]
+        accepted = confidences >= self.thresholds[pred_idxs]
+
+        return [
+            (self.class_names[idx], round(conf, 4), ok)
+            for idx, conf, ok in zip(pred_idxs.tolist(), confidences.tolist(), accepted.tolist())
+        ]
+
+    def info(self):
+        return {
+            "version": self.version,
+            "num_labels": len(self.class_names),
+            "classes_enabled": int((self.thresholds <= 1.0).sum()),
+        }
@@ -1,147 +1,677 @@
-import torch
-from transformers import ViTFeatureExtractor, ViTForImageClassification
-from PIL import Image
 import os
+import time
 import logging
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from .batching import MicroBatcher
+from .cascade import FAST_MODEL_DIR, FastClassifier
+from .embedding_index import Embedding, open_index
+from .inference_backends import get_backend, softmax
+from .knowledge import BUILTIN_DISEASES, DiseaseKnowledgeIndex
+from .image_io import load_image, read_bytes
+from .metrics import (
+    BATCH_SIZE, CASCADE_ESCALATIONS, MODEL_LOAD_SECONDS, MODEL_LOADED, MODEL_READY, MODEL_SWAPS, NEAR_DUPLICATES,
+    PREDICTIONS, time_stage,
+)
+from . import model_registry, tiling
+from .model_registry import REGISTRY_CHECK_SECONDS, ShadowScorer
+from .prediction_cache import PredictionCache
+from .preprocessing import BatchPreprocessor
 
 logger = logging.getLogger(__name__)
 
+# Used when the model registry (model_registry.py, `manage.py model_registry`) has no active version
 MODEL_NAME = "wambugu71/crop_leaf_diseases_vit"
+MODEL_REVISION = os.environ.get("PREDICTOR_MODEL_REVISION", "main")
+
+# Inference engine: "torch" (eager PyTorch), "onnx" (ONNX Runtime CPU, see `manage.py export_onnx`),
+# "remote" (a shared `manage.py run_model_server` process) or "stub" (no model, for load-testing)
+BACKEND = os.environ.get("PREDICTOR_BACKEND", "torch")
+
+# Dynamic micro-batching: concurrent requests are grouped into one forward pass
+MAX_BATCH_SIZE = int(os.environ.get("PREDICTOR_MAX_BATCH_SIZE", 16))
+MAX_BATCH_WAIT_MS = float(os.environ.get("PREDICTOR_MAX_BATCH_WAIT_MS", 10))
+
+# Confidence-gated cascade: a small Keras model (model_architecture.py) answers first and
+# the ViT only sees images it is unsure about. Needs `manage.py calibrate_cascade` first.
+CASCADE_ENABLED = os.environ.get("PREDICTOR_CASCADE", "0") == "1"
+
+# Prediction cache keyed by upload content hash; set the path to "" to disable the SQLite tier
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 4096))
+PREDICTION_CACHE_TTL = int(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+PREDICTION_CACHE_PERSISTENT_TTL = int(os.environ.get("PREDICTION_CACHE_PERSISTENT_TTL", 7 * 24 * 3600))
+# Per model version, trimmed when a worker opens the cache; 0 for no cap
+PREDICTION_CACHE_PERSISTENT_MAX = int(os.environ.get("PREDICTION_CACHE_PERSISTENT_MAX", 200000))
+PREDICTION_CACHE_PATH = os.environ.get(
+    "PREDICTION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "predictions.sqlite3"),
+)
+
+# Embedding index (embedding_index.py): the ViT's pooled embedding of every saved diagnosis is
+# indexed for similar-case search, and a new image within DUPLICATE_DISTANCE (cosine) of an
+# indexed one gets that image's stored prediction. Set the distance to 0 to only search.
+EMBEDDINGS_ENABLED = os.environ.get("PREDICTOR_EMBEDDINGS", "0") == "1"
+DUPLICATE_DISTANCE = float(os.environ.get("PREDICTOR_DUPLICATE_DISTANCE", 0.02))
+
+# Run a few synthetic inferences before reporting ready
+WARMUP_ENABLED = os.environ.get("PREDICTOR_WARMUP", "1") == "1"
+WARMUP_ITERATIONS = int(os.environ.get("PREDICTOR_WARMUP_ITERATIONS", 2))
+
+def build_preprocessor(backend):
+    """Preprocessor matching the model: from the backend if it knows, else from the HF feature extractor config"""
+    config = backend.preprocessor_config()
+    if config is not None:
+        return BatchPreprocessor(**config)
+
+    # Heavy import lives here so importing this module (e.g. for manage.py migrate) stays cheap.
+    # The extractor is only read for its size/mean/std; the vectorized preprocessor does the work.
+    from transformers import ViTFeatureExtractor
+
+    feature_extractor = ViTFeatureExtractor.from_pretrained(MODEL_NAME, revision=MODEL_REVISION)
+    return BatchPreprocessor.from_feature_extractor(feature_extractor)
+
+
+class ModelVersion:
+    """
+    One loaded model: the backend plus everything derived from its labels and input size.
+
+    The predictor swaps these as a unit, and each batch reads the active one once,
+    so a batch always runs against a consistent backend, preprocessor and labels.
+    """
+
+    def __init__(self, version, backend, preprocessor, source):
+        self.version = version
+        self.source = source
+        self.backend = backend
+        self.preprocessor = preprocessor
+        self.id2label = backend.id2label
+        self.knowledge = DiseaseKnowledgeIndex(BUILTIN_DISEASES, self.id2label)
+        self.cache = None  # opened when the version becomes active
+        self.embeddings = None  # likewise, when EMBEDDINGS_ENABLED
+        self.loaded_at = time.time()
+
+    @classmethod
+    def from_hub(cls):
+        """MODEL_NAME at MODEL_REVISION on the BACKEND engine: the default without a registry"""
+        backend = get_backend(BACKEND)(MODEL_NAME, MODEL_REVISION)
+        return cls(backend.revision, backend, build_preprocessor(backend), "hub")
+
+    @classmethod
+    def from_registry(cls, version):
+        """A version directory under model_registry.REGISTRY_DIR"""
+        backend = model_registry.open_backend(version)
+        preprocessor = BatchPreprocessor(**model_registry.preprocessor_config(version, backend))
+        return cls(version, backend, preprocessor, "registry")
+
+    @property
+    def namespace(self):
+        # The hub namespace predates the registry: keep it so cached answers stay valid
+        if self.source == "hub":
+            return f"{MODEL_NAME}@{self.backend.revision}"
+        return model_registry.cache_namespace(self.version)
+
+    def score_batch(self, images, record_metrics=True, embeddings=None):
+        """
+        One batched forward pass over a list of RGB PIL images: (label, confidence, embedding)
+        per image. Embeddings are returned when the version has an index (or embeddings=True)
+        and the backend provides them, else None.
+        """
+        if embeddings is None:
+            embeddings = self.embeddings is not None
+        forward = self.backend.forward_with_embeddings if embeddings else self.backend.forward
+
+        if record_metrics:
+            BATCH_SIZE.observe(len(images))
+            with time_stage("preprocess"):
+                pixel_values = self.preprocessor(images)
+            with time_stage("forward"):
+                outputs = forward(pixel_values)
+        else:
+            outputs = forward(self.preprocessor(images))
+        logits, vectors = outputs if embeddings else (outputs, None)
+
+        probs = softmax(logits)
+        pred_idxs = probs.argmax(axis=1)
+        confidences = probs[np.arange(len(probs)), pred_idxs]
+
+        return [
+            (self.id2label.get(idx, "Unknown"), round(conf, 4), vectors[i] if vectors is not None else None)
+            for i, (idx, conf) in enumerate(zip(pred_idxs.tolist(), confidences.tolist()))
+        ]
+
+    def predict_batch(self, images, record_metrics=True):
+        """Run one batched forward pass over a list of RGB PIL images; (label, confidence) per image"""
+        return [result[:2] for result in self.score_batch(images, record_metrics, embeddings=False)]
+
+    def warm_up(self, iterations, batch_size):
+        """Run synthetic forward passes so the first real request doesn't pay allocator/kernel setup"""
+        from PIL import Image
+
+        image = Image.new("RGB", (224, 224), (60, 140, 60))
+        for _ in range(iterations):
+            self.predict_batch([image], record_metrics=False)
+            self.predict_batch([image] * batch_size, record_metrics=False)
+
+    def info(self):
+        return {"version": self.version, "source": self.source, "loaded_at": self.loaded_at}
+
 
 class HuggingFacePlantPredictor:
     def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._applied_state = None
+        self._registry_lock = threading.Lock()
+        self._registry_busy = False
+        self._next_registry_check = 0.0
+        self.registry_error = None
+        self.previous = None
+        self.shadow = None
+
+        active = None
+        try:
+            active = model_registry.read_state()["active"]
+            if active:
+                logger.info(f"Loading model version {active} from the registry...")
+                self.model = ModelVersion.from_registry(active)
+        except Exception as e:
+            self.registry_error = str(e)
+            logger.error(f"Registry model could not be loaded, falling back to {MODEL_NAME}: {e}")
+            active = None
+        if not active:
+            logger.info(f"Loading Hugging Face model with the {BACKEND} backend...")
+            self.model = ModelVersion.from_hub()
 
-        logger.info("Loading Hugging Face model...")
-        self.feature_extractor = ViTFeatureExtractor.from_pretrained(MODEL_NAME)
-        self.model = ViTForImageClassification.from_pretrained(MODEL_NAME)
-        self.model.to(self.device)
-        self.model.eval()
+        self.batcher = MicroBatcher(
+            self._score_batch,
+            max_batch_size=MAX_BATCH_SIZE,
+            max_wait_ms=MAX_BATCH_WAIT_MS,
+            name="vit-batcher",
+        )
 
-        self.id2label = self.model.config.id2label
+        self.fast = None
+        self.fast_batcher = None
+        if CASCADE_ENABLED:
+            try:
+                self.fast = FastClassifier.load(FAST_MODEL_DIR, vit_labels=self.model.id2label.values())
+                self.fast_batcher = MicroBatcher(
+                    self.fast.classify_batch,
+                    max_batch_size=MAX_BATCH_SIZE,
+                    max_wait_ms=MAX_BATCH_WAIT_MS,
+                    name="fast-batcher",
+                )
+            except Exception as e:
+                logger.error(f"Cascade disabled, fast model could not be loaded from {FAST_MODEL_DIR}: {e}")
+
+        self.model.cache = self.open_cache(self.model)
+        self.model.embeddings = self.open_embeddings(self.model)
         logger.info("Model loaded successfully.")
 
-    def predict_disease(self, image_path):
-        """Predict disease from image path"""
+    # The active version's parts, read once per call: a swap may happen between two reads
+
+    @property
+    def backend(self):
+        return self.model.backend
+
+    @property
+    def preprocessor(self):
+        return self.model.preprocessor
+
+    @property
+    def id2label(self):
+        return self.model.id2label
+
+    @property
+    def knowledge(self):
+        return self.model.knowledge
+
+    @property
+    def cache(self):
+        return self.model.cache
+
+    @property
+    def embeddings(self):
+        return self.model.embeddings
+
+    @property
+    def active_version(self):
+        return self.model.version
+
+    def open_cache(self, model):
+        """Prediction cache for a model version; answers depend on the fast model and its thresholds too"""
+        namespace = model.namespace
+        if self.fast is not None:
+            namespace += f"+fast@{self.fast.version}"
+
+        return PredictionCache(
+            namespace=namespace,
+            max_entries=PREDICTION_CACHE_SIZE,
+            ttl=PREDICTION_CACHE_TTL,
+            path=PREDICTION_CACHE_PATH,
+            persistent_ttl=PREDICTION_CACHE_PERSISTENT_TTL,
+            persistent_max_entries=PREDICTION_CACHE_PERSISTENT_MAX,
+        )
+
+    def open_embeddings(self, model):
+        """Embedding index of a model version: embeddings of different versions are not comparable"""
+        return open_index(model.namespace) if EMBEDDINGS_ENABLED else None
+
+    def _score_batch(self, images):
+        """The micro-batcher's function: one forward pass with the active model, embeddings included"""
+        results = self.model.score_batch(images)
+        shadow = self.shadow
+        if shadow is not None:
+            shadow.offer(images, [result[:2] for result in results])
+        return results
+
+    def predict_batch(self, images):
+        """Run one batched forward pass over a list of RGB PIL images with the active model"""
+        return [result[:2] for result in self._score_batch(images)]
+
+    def warm_up(self, iterations=WARMUP_ITERATIONS):
+        """Run synthetic forward passes so the first real request doesn't pay allocator/kernel setup"""
+        from PIL import Image
+
+        self.model.warm_up(iterations, self.batcher.max_batch_size)
+        if self.fast is not None:
+            image = Image.new("RGB", (224, 224), (60, 140, 60))
+            for _ in range(iterations):
+                self.fast.classify_batch([image])
+                self.fast.classify_batch([image] * self.fast_batcher.max_batch_size)
+
+    def check_registry(self):
+        """Follow registry.json: start loading a newly activated version or shadow candidate in the background"""
+        now = time.monotonic()
+        if now < self._next_registry_check:
+            return
+        with self._registry_lock:
+            if now < self._next_registry_check or self._registry_busy:
+                return
+            self._next_registry_check = now + REGISTRY_CHECK_SECONDS
+            try:
+                state = model_registry.read_state()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read the model registry state: {e}")
+                return
+            if state == self._applied_state:
+                return
+            self._registry_busy = True
+
+        threading.Thread(
+            target=self._apply_registry_state, args=(state,), name="model-registry", daemon=True
+        ).start()
+
+    def _apply_registry_state(self, state):
+        try:
+            self.registry_error = None
+            self._apply_active(state["active"])
+            self._apply_shadow(state["shadow"], state["shadow_percent"])
+        except Exception as e:
+            self.registry_error = str(e)
+            logger.error(f"Could not apply the model registry state: {e}")
+        finally:
+            # A failed load is not retried until registry.json changes again
+            self._applied_state = state
+            self._registry_busy = False
+
+    def _loaded_version(self, version):
+        """A registry version already in memory (active, previous or shadow candidate), if any"""
+        candidates = [self.model, self.previous, self.shadow.candidate if self.shadow is not None else None]
+        for model in candidates:
+            if model is not None and model.source == "registry" and model.version == version:
+                return model
+        return None
+
+    def _load_version(self, version):
+        # Each worker loads its own copy: the weights are no longer shared with the gunicorn master
+        started = time.monotonic()
+        model = ModelVersion.from_registry(version)
+        if WARMUP_ENABLED:
+            model.warm_up(WARMUP_ITERATIONS, self.batcher.max_batch_size)
+        logger.info(f"Model version {version} loaded and warmed up in {time.monotonic() - started:.2f}s")
+        return model
+
+    def _apply_active(self, version):
+        if not version or (self.model.source == "registry" and self.model.version == version):
+            return
+        model = self._loaded_version(version)
+        if model is None:
+            try:
+                model = self._load_version(version)
+            except Exception:
+                MODEL_SWAPS.labels("failed").inc()
+                raise
+        self.activate(model)
+
+    def activate(self, model):
+        """Make a loaded ModelVersion the active one; requests already in a batch finish on the old one"""
+        if self.fast is not None and not self.fast.labels_match(model.id2label.values()):
+            logger.error(f"Cascade disabled: the fast model answers with labels model version {model.version} lacks")
+            self.fast_batcher = None
+            self.fast = None
+        if model.cache is None:
+            model.cache = self.open_cache(model)
+            model.embeddings = self.open_embeddings(model)
+        self.previous, self.model = self.model, model
+        MODEL_SWAPS.labels("swapped").inc()
+        logger.info(f"Active model is now {model.version} (previous: {self.previous.version})")
+
+    def _apply_shadow(self, version, percent):
+        if not version or not percent:
+            self.shadow = None
+            return
+        if self.shadow is not None and self.shadow.candidate.version == version:
+            self.shadow.percent = percent
+            return
+        candidate = self._loaded_version(version) or self._load_version(version)
+        self.shadow = ShadowScorer(candidate, percent)
+        logger.info(f"Shadow scoring {percent}% of traffic with model version {version}")
+
+    def get_registry_info(self):
+        """Active, previous and shadow model versions, with the shadow agreement stats"""
+        return {
+            "active": self.model.info(),
+            "previous": self.previous.info() if self.previous is not None else None,
+            "shadow": self.shadow.stats() if self.shadow is not None else None,
+            "switching": self._registry_busy,
+            "error": self.registry_error,
+        }
+
+    def decode_image(self, source):
+        """Decode any supported source to RGB at the smallest JPEG scale that still covers the model input"""
+        return load_image(source, target_size=(self.preprocessor.width, self.preprocessor.height))
+
+    def predict_image_async(self, image, with_embedding=False):
+        """
+        Queue a decoded RGB PIL image; returns a Future of (disease_name, confidence, stage),
+        plus the ViT embedding (None if the fast model answered) when with_embedding is set.
+        """
+        result = Future()
+
+        def finish(future, stage):
+            try:
+                answer = future.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            PREDICTIONS.labels(stage).inc()
+            if with_embedding:
+                # Fast-model answers are (label, confidence, accepted)
+                result.set_result((answer[0], answer[1], stage, answer[2] if stage == "vit" else None))
+            else:
+                result.set_result((answer[0], answer[1], stage))
+
+        def escalate():
+            self.batcher.submit_async(image).add_done_callback(lambda future: finish(future, "vit"))
+
+        fast_batcher = self.fast_batcher  # may be switched off by a model swap meanwhile
+        if fast_batcher is None:
+            escalate()
+            return result
+
+        def on_fast(future):
+            try:
+                label, _, accepted = future.result()
+            except Exception as e:
+                logger.warning(f"Fast model failed, falling back to the ViT: {e}")
+                escalate()
+                return
+            if accepted:
+                finish(future, "fast")
+            else:
+                CASCADE_ESCALATIONS.labels(label).inc()
+                escalate()
+
+        # Callbacks run on the batcher threads, so escalation never blocks a request thread
+        fast_batcher.submit_async(image).add_done_callback(on_fast)
+        return result
+
+    def predict(self, image):
+        """
+        Predict disease from a path, bytes, file-like object, numpy array or PIL image.
+        Returns (disease_name, confidence, stage) where stage is "cache", "fast", "vit" or "similar",
+        or ("Error", 0.0, None) if the prediction failed.
+        """
+        return self.predict_with_embedding(image)[:3]
+
+    def predict_with_embedding(self, image):
+        """
+        predict(), plus the image's Embedding (for indexing it once the diagnosis is saved),
+        or None when it wasn't computed (cache or fast-model answers, embeddings disabled).
+        A ViT answer for an image within DUPLICATE_DISTANCE of an indexed one is replaced by
+        that image's stored prediction (stage "similar").
+        """
+        self.check_registry()
+        model = self.model
         try:
-            image = Image.open(image_path).convert("RGB")
+            with time_stage("cache_lookup"):
+                data = read_bytes(image)
+                cached = model.cache.get(data) if data is not None else None
+            if cached is not None:
+                PREDICTIONS.labels("cache").inc()
+                logger.info(f"Prediction (cached): {cached[0]}, confidence: {cached[1]:.4f}")
+                return cached[0], cached[1], "cache", None
+            if data is not None:
+                image = data
 
-            inputs = self.feature_extractor(images=image, return_tensors="pt")
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            with time_stage("decode"):
+                image = self.decode_image(image)
 
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits
-                probs = torch.softmax(logits, dim=1)
+            # Queued behind the micro-batchers; concurrent callers share one forward pass
+            disease_name, confidence, stage, vector = self.predict_image_async(image, with_embedding=True).result()
+            # After a swap mid-request the answer may come from the new model: don't file it under the old one
+            same_model = self.model is model
+            embedding = Embedding(model.embeddings, vector) if vector is not None and same_model else None
 
-                pred_idx = torch.argmax(probs, dim=1).item()
-                confidence = probs[0][pred_idx].item()
+            if embedding is not None and DUPLICATE_DISTANCE > 0:
+                # Several shots of the same plant get the same answer, not a different one per shot
+                with time_stage("similar_lookup"):
+                    neighbour = embedding.index.nearest(vector, DUPLICATE_DISTANCE)
+                if neighbour is not None:
+                    NEAR_DUPLICATES.inc()
+                    disease_name, confidence, stage = neighbour.label, neighbour.confidence, "similar"
 
-            disease_name = self.id2label.get(pred_idx, "Unknown")
+            if data is not None and same_model:
+                model.cache.set(data, (disease_name, confidence))
 
-            logger.info(f"Prediction: {disease_name}, confidence: {confidence:.4f}")
-            return disease_name, round(confidence, 4)
+            logger.info(f"Prediction ({stage}): {disease_name}, confidence: {confidence:.4f}")
+            return disease_name, confidence, stage, embedding
 
         except Exception as e:
             logger.error(f"Prediction error: {e}")
-            return "Error", 0.0
+            return "Error", 0.0, None, None
 
-    def get_disease_info(self, disease_name):
-        """Return basic disease info based on label"""
-        name = disease_name.lower()
-
-        database = {
-            "corn common rust": {
-                "scientific_name": "Puccinia sorghi",
-                "plant_type": "Corn",
-                "symptoms": "Small reddish-brown pustules on leaves.",
-                "causes": "Fungal infection in warm, humid conditions.",
-                "treatment_advice": [
-                    "Apply appropriate fungicides",
-                    "Remove infected leaves",
-                    "Use resistant varieties"
-                ],
-                "prevention_tips": [
-                    "Rotate crops",
-                    "Avoid overhead irrigation",
-                    "Plant resistant hybrids"
-                ],
-                "is_healthy": False
-            },
-            "corn healthy": {
-                "scientific_name": "Healthy plant",
-                "plant_type": "Corn",
-                "symptoms": "Green healthy leaves with no spots.",
-                "causes": "Good growing conditions.",
-                "treatment_advice": ["No treatment needed."],
-                "prevention_tips": ["Maintain good agronomic practices."],
-                "is_healthy": True
-            },
-            "potato early blight": {
-                "scientific_name": "Alternaria solani",
-                "plant_type": "Potato",
-                "symptoms": "Brown spots with concentric rings on leaves.",
-                "causes": "Fungal pathogen.",
-                "treatment_advice": [
-                    "Apply fungicides",
-                    "Remove infected leaves"
-                ],
-                "prevention_tips": [
-                    "Crop rotation",
-                    "Avoid wet foliage"
-                ],
-                "is_healthy": False
-            },
-            "potato healthy": {
-                "scientific_name": "Healthy plant",
-                "plant_type": "Potato",
-                "symptoms": "Normal green leaves.",
-                "causes": "Good plant health.",
-                "treatment_advice": ["No action needed."],
-                "prevention_tips": ["Continue good practices."],
-                "is_healthy": True
-            },
-            "tomato early blight": {
-                "scientific_name": "Alternaria solani",
-                "plant_type": "Tomato",
-                "symptoms": "Dark brown spots with rings.",
-                "causes": "Fungal disease.",
-                "treatment_advice": [
-                    "Apply copper-based fungicides",
-                    "Remove infected parts"
-                ],
-                "prevention_tips": [
-                    "Crop rotation",
-                    "Proper spacing"
-                ],
-                "is_healthy": False
-            },
-            "tomato healthy": {
-                "scientific_name": "Healthy plant",
-                "plant_type": "Tomato",
-                "symptoms": "Green healthy leaves.",
-                "causes": "Good care.",
-                "treatment_advice": ["No treatment needed."],
-                "prevention_tips": ["Maintain good care."],
-                "is_healthy": True
-            }
-        }
+    def embed_image(self, source):
+        """
+        (disease_name, confidence, embedding vector) straight from the ViT, bypassing the cache
+        and the cascade; the vector is None when embeddings are disabled or the backend has none.
+        """
+        with time_stage("decode"):
+            image = self.decode_image(source)
+        return self.batcher.submit_async(image).result()
+
+    def predict_disease(self, image):
+        """Predict disease from a path, bytes, file-like object, numpy array or PIL image"""
+        disease_name, confidence, _ = self.predict(image)
+        return disease_name, confidence
+
+    def predict_tiles(self, source, tile_size=tiling.TILE_SIZE, overlap=tiling.TILE_OVERLAP,
+                      prefilter=tiling.PREFILTER, is_healthy=None):
+        """
+        Tiled analysis of a large multi-leaf image: predictions for an overlapping
+        grid of tiles, a heat-grid of per-tile disease scores and an aggregated verdict.
+        Tiles the pre-filter takes for background are skipped, unless that would skip them all.
+        """
+        if is_healthy is None:
+            knowledge = self.knowledge
 
-        for key, info in database.items():
-            if key in name:
-                return info
+            def is_healthy(label):
+                return knowledge.lookup(label)["is_healthy"]
 
-        # Default fallback
+        with time_stage("decode"):
+            grid = tiling.TileGrid(source, self.preprocessor.height, tile_size, overlap)
+        with time_stage("tile_filter"):
+            foreground = grid.foreground(prefilter)
+        if not foreground.any():
+            foreground[...] = True
+        positions = [tuple(position) for position in np.argwhere(foreground).tolist()]
+
+        # Queued all at once: the micro-batchers turn them into full batches
+        futures = [self.predict_image_async(grid.tile(row, col)) for row, col in positions]
+        predictions = dict(zip(positions, (future.result() for future in futures)))
+
+        rows, cols = grid.shape
+        cells, heat = [], []
+        for row in range(rows):
+            cell_row, heat_row = [], []
+            for col in range(cols):
+                box = grid.box(row, col)
+                if (row, col) not in predictions:
+                    cell_row.append({"box": box, "skipped": True})
+                    heat_row.append(None)
+                    continue
+                label, confidence, stage = predictions[(row, col)]
+                healthy = bool(is_healthy(label))
+                cell_row.append({"box": box, "label": label, "confidence": confidence, "stage": stage})
+                # Disease score: the confidence of a disease label, or what a healthy label leaves over
+                heat_row.append(round(1.0 - confidence if healthy else confidence, 4))
+            cells.append(cell_row)
+            heat.append(heat_row)
+
+        verdict = tiling.aggregate([prediction[:2] for prediction in predictions.values()], is_healthy)
         return {
-            "scientific_name": "Unknown",
-            "plant_type": "Unknown",
-            "symptoms": "Symptoms not available.",
-            "causes": "Cause unknown.",
-            "treatment_advice": ["Consult agricultural expert."],
-            "prevention_tips": ["Monitor plant health regularly."],
-            "is_healthy": "healthy" in name
+            **verdict,
+            "tile_size": grid.tile_size,
+            "overlap": overlap,
+            "prefilter": prefilter,
+            "rows": rows,
+            "cols": cols,
+            "tiles_scored": len(predictions),
+            "tiles_skipped": rows * cols - len(predictions),
+            "heat": heat,
+            "grid": cells,
         }
 
+    def get_batching_stats(self):
+        """Return batch-size and queue-wait stats from the micro-batcher"""
+        stats = self.batcher.stats.snapshot()
+        stats["max_batch_size"] = self.batcher.max_batch_size
+        stats["max_wait_ms"] = self.batcher.max_wait * 1000.0
+        if self.fast_batcher is not None:
+            stats["fast"] = self.fast_batcher.stats.snapshot()
+        return stats
+
+    def get_backend_info(self):
+        """Describe the active inference engine"""
+        info = self.backend.info()
+        info["cascade"] = self.fast.info() if self.fast is not None else None
+        return info
+
+    def get_cache_stats(self):
+        """Return hit/miss counters from the prediction cache"""
+        return self.cache.stats()
+
+    def get_embedding_stats(self):
+        """Size of the active version's embedding index, or None when embeddings are disabled"""
+        embeddings = self.embeddings
+        if embeddings is None:
+            return None
+        return dict(embeddings.stats(), duplicate_distance=DUPLICATE_DISTANCE)
+
+    def find_similar(self, vector, k=10, exclude_id=None):
+        """Nearest indexed diagnoses to an embedding vector, as embedding_index.Neighbour tuples"""
+        embeddings = self.embeddings
+        if embeddings is None:
+            return []
+        with time_stage("similar_lookup"):
+            return embeddings.search(vector, k=k, exclude_id=exclude_id)
+
+    def get_disease_info(self, disease_name):
+        """Return basic disease info based on label (built-in knowledge only; see disease_detector.knowledge)"""
+        return self.knowledge.lookup(disease_name)
+
+
+class LazyPredictor:
+    """
+    Thread-safe lazy holder for the global predictor.
+
+    The model is built on first attribute access (or an explicit load()), so
+    importing the views costs nothing. Under gunicorn --preload, wsgi.py calls
+    load() in the master so forked workers share the weights copy-on-write.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self._warm = threading.Event()
+        self._warming = False
+        self.load_seconds = None
+        self.load_error = None
+
+    def load(self):
+        """Build the predictor if needed and return it"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.monotonic()
+                    try:
+                        self._instance = self._factory()
+                    except Exception as e:
+                        self.load_error = str(e)
+                        logger.error(f"Model load failed: {e}")
+                        raise
+                    self.load_error = None
+                    self.load_seconds = round(time.monotonic() - started, 3)
+                    self._publish_state()
+        return self._instance
+
+    def _publish_state(self):
+        # Gauges are per process, and a forked worker starts from zero: republish after fork too
+        MODEL_LOADED.set(1 if self._instance is not None else 0)
+        MODEL_READY.set(1 if self._warm.is_set() else 0)
+        if self.load_seconds is not None:
+            MODEL_LOAD_SECONDS.set(self.load_seconds)
+
+    def warm_up(self):
+        """Load (if needed) and run the warm-up inferences; blocks until done"""
+        instance = self.load()
+        if WARMUP_ENABLED:
+            started = time.monotonic()
+            instance.warm_up()
+            logger.info(f"Model warm-up finished in {time.monotonic() - started:.2f}s")
+        self._warm.set()
+        self._publish_state()
+
+    def start_warm_up(self):
+        """Kick off warm_up() in a background thread unless it already ran or is running"""
+        with self._lock:
+            if self._warming or self._warm.is_set():
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.warm_up()
+            except Exception as e:
+                logger.error(f"Model warm-up failed: {e}")
+            finally:
+                self._warming = False
+
+        threading.Thread(target=run, name="predictor-warmup", daemon=True).start()
+
+    @property
+    def model_loaded(self):
+        return self._instance is not None
+
+    @property
+    def is_ready(self):
+        return self._warm.is_set()
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
 
-# Global instance used by Django views
-predictor = HuggingFacePlantPredictor()
+# Global instance used by Django views; the model loads on first use
+predictor = LazyPredictor(HuggingFacePlantPredictor)
@@ -0,0 +1,315 @@
+"""
+Nearest-neighbour index over the model embeddings of past diagnoses.
+
+One directory per model namespace, since embeddings from different model
+versions are not comparable:
+
+    meta.json         dimension, projection seed, label names
+    vectors.f16       N x D unit-length embeddings, float16
+    codes.u64         N 64-bit SimHash codes (signs of 64 random projections)
+    labels.i32        N indices into the meta.json label names
+    confidences.f32   N model confidences
+    ids.i64           N diagnosis ids, written last: its length is the committed entry count
+
+The files are append-only and memory-mapped for reading, so all workers share
+one page-cached copy and see each other's appends on their next query. A
+query XORs its code against every stored code (8 bytes per entry instead of
+2*D), keeps the RERANK_CANDIDATES nearest by Hamming distance and ranks only
+those by exact cosine distance.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "embeddings")
+EMBEDDING_INDEX_DIR = os.environ.get("PREDICTOR_EMBEDDING_INDEX_DIR", DEFAULT_INDEX_DIR)
+# Entries re-ranked exactly per query; more means better recall and slower queries
+RERANK_CANDIDATES = int(os.environ.get("PREDICTOR_EMBEDDING_CANDIDATES", 512))
+
+CODE_BITS = 64
+META_FILE = "meta.json"
+# name: (file, dtype); ids last, so a reader never counts an entry whose other fields aren't written yet
+FIELDS = {
+    "vectors": ("vectors.f16", np.float16),
+    "codes": ("codes.u64", np.uint64),
+    "labels": ("labels.i32", np.int32),
+    "confidences": ("confidences.f32", np.float32),
+    "ids": ("ids.i64", np.int64),
+}
+
+# Codes per popcount pass: the scratch buffers (2 x 512 KB) stay in L2 across the ten in-place steps
+HAMMING_CHUNK = 1 << 16
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+Neighbour = namedtuple("Neighbour", "id distance label confidence")
+# An embedding together with the index it belongs in (i.e. the model version that produced it)
+Embedding = namedtuple("Embedding", "index vector")
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def hamming_distances(codes, code):
+    """Bits differing between each stored 64-bit code and one query code (SWAR popcount, no lookups)"""
+    out = np.empty(len(codes), dtype=np.uint8)
+    x_buffer = np.empty(min(len(codes), HAMMING_CHUNK), dtype=np.uint64)
+    t_buffer = np.empty_like(x_buffer)
+    for start in range(0, len(codes), HAMMING_CHUNK):
+        end = min(start + HAMMING_CHUNK, len(codes))
+        x, t = x_buffer[:end - start], t_buffer[:end - start]
+        np.bitwise_xor(codes[start:end], code, out=x)
+        np.right_shift(x, np.uint64(1), out=t)
+        t &= _M1
+        x -= t
+        np.right_shift(x, np.uint64(2), out=t)
+        t &= _M2
+        x &= _M2
+        x += t
+        np.right_shift(x, np.uint64(4), out=t)
+        x += t
+        x &= _M4
+        x *= _H01
+        x >>= np.uint64(56)
+        out[start:end] = x
+    return out
+
+
+@contextmanager
+def _file_lock(directory):
+    """Exclusive across processes (gunicorn workers, management commands) where fcntl exists"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class EmbeddingIndex:
+    """Append-only, memory-mapped float16 embedding index with SimHash pre-selection"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._meta = None
+        self._projection = None
+        self._arrays = {}
+        self._count = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path(META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta):
+        tmp_path = self._path(f"{META_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(META_FILE))
+
+    def _set_meta(self, meta):
+        if self._meta is None or self._meta["seed"] != meta["seed"]:
+            rng = np.random.default_rng(meta["seed"])
+            self._projection = rng.standard_normal((meta["dim"], CODE_BITS)).astype(np.float32)
+        self._meta = meta
+
+    @property
+    def dim(self):
+        self._refresh()
+        return self._meta["dim"] if self._meta else None
+
+    def encode(self, vectors):
+        """64-bit SimHash codes of unit vectors: entries at a small angle differ in few bits"""
+        bits = (vectors @ self._projection) > 0
+        return np.ascontiguousarray(np.packbits(bits, axis=1, bitorder="little")).view(np.uint64).ravel()
+
+    def add(self, ids, embeddings, labels, confidences):
+        """Append entries; safe to call from several processes at once"""
+        if not len(ids):
+            return
+        vectors = normalize(embeddings)
+        with self._lock, _file_lock(self.directory):
+            meta = self._read_meta()
+            if meta is None:
+                meta = {"dim": vectors.shape[1], "seed": int.from_bytes(os.urandom(4), "big"), "labels": []}
+            if vectors.shape[1] != meta["dim"]:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match the index ({meta['dim']})")
+
+            label_index = {label: i for i, label in enumerate(meta["labels"])}
+            new_labels = [label for label in dict.fromkeys(labels) if label not in label_index]
+            if new_labels or not os.path.exists(self._path(META_FILE)):
+                meta["labels"].extend(new_labels)
+                label_index.update((label, i) for i, label in enumerate(meta["labels"]))
+                self._write_meta(meta)
+            self._set_meta(meta)
+
+            columns = {
+                "vectors": vectors,
+                "codes": self.encode(vectors),
+                "labels": [label_index[label] for label in labels],
+                "confidences": confidences,
+                "ids": ids,
+            }
+            self._truncate_to_committed(meta["dim"])
+            for name, (filename, dtype) in FIELDS.items():
+                with open(self._path(filename), "ab") as f:
+                    f.write(np.asarray(columns[name], dtype=dtype).tobytes())
+
+    def _truncate_to_committed(self, dim):
+        """
+        Cut every column back to the committed entry count (the length of ids), dropping
+        what an interrupted append (a crash, ENOSPC) left behind; otherwise all later
+        entries would be written at misaligned offsets. Call with the file lock held.
+        """
+        try:
+            count = os.path.getsize(self._path(FIELDS["ids"][0])) // np.dtype(np.int64).itemsize
+        except FileNotFoundError:
+            count = 0
+        for name, (filename, dtype) in FIELDS.items():
+            path = self._path(filename)
+            expected = count * np.dtype(dtype).itemsize * (dim if name == "vectors" else 1)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                size = 0
+            if size < expected:
+                raise ValueError(f"{path} holds fewer entries than ids.i64; rebuild the index")
+            if size > expected:
+                logger.warning(f"Dropping {size - expected} bytes of an interrupted append from {path}")
+                os.truncate(path, expected)
+
+    def _refresh(self):
+        """Re-map the files if other processes (or this one) appended since the last look"""
+        try:
+            count = os.path.getsize(self._path(FIELDS["ids"][0])) // np.dtype(np.int64).itemsize
+        except FileNotFoundError:
+            count = 0
+        if count == self._count:
+            return count
+
+        with self._lock:
+            if count != self._count:
+                arrays = {}
+                if count:
+                    self._set_meta(self._read_meta())
+                    for name, (filename, dtype) in FIELDS.items():
+                        # Mapped to exactly `count` entries: a concurrent append may have written part of the next
+                        shape = (count, self._meta["dim"]) if name == "vectors" else (count,)
+                        arrays[name] = np.memmap(self._path(filename), dtype=dtype, mode="r", shape=shape)
+                self._arrays, self._count = arrays, count
+        return count
+
+    def __len__(self):
+        return self._refresh()
+
+    def _neighbour(self, row, distance):
+        arrays = self._arrays
+        return Neighbour(
+            int(arrays["ids"][row]),
+            round(float(distance), 5),
+            self._meta["labels"][arrays["labels"][row]],
+            round(float(arrays["confidences"][row]), 4),
+        )
+
+    def search(self, embedding, k=10, max_distance=None, exclude_id=None):
+        """Up to k Neighbours by ascending cosine distance, optionally only those within max_distance"""
+        if not self._refresh():
+            return []
+        arrays = self._arrays
+        count = len(arrays["ids"])
+        query = normalize(embedding)[0]
+        if query.shape[0] != self._meta["dim"]:
+            return []
+
+        code = self.encode(query[None, :])[0]
+        hamming = hamming_distances(arrays["codes"], code)
+        candidates = RERANK_CANDIDATES + k
+        if count > candidates:
+            # Smallest Hamming radius that holds enough candidates: a 65-bin histogram, no sort
+            radius = int(np.searchsorted(np.cumsum(np.bincount(hamming, minlength=CODE_BITS + 1)), candidates))
+            rows = np.flatnonzero(hamming <= radius)
+        else:
+            rows = np.arange(count)
+
+        distances = 1.0 - arrays["vectors"][rows].astype(np.float32) @ query
+        neighbours = []
+        for i in np.argsort(distances, kind="stable"):
+            if max_distance is not None and distances[i] > max_distance:
+                break
+            if exclude_id is not None and arrays["ids"][rows[i]] == exclude_id:
+                continue
+            neighbours.append(self._neighbour(rows[i], distances[i]))
+            if len(neighbours) == k:
+                break
+        return neighbours
+
+    def nearest(self, embedding, max_distance):
+        """The closest entry if it is within max_distance, else None"""
+        neighbours = self.search(embedding, k=1, max_distance=max_distance)
+        return neighbours[0] if neighbours else None
+
+    def vector(self, entry_id):
+        """Stored (float32) embedding of an id, or None if it isn't indexed"""
+        if not self._refresh():
+            return None
+        rows = np.flatnonzero(self._arrays["ids"] == entry_id)
+        return self._arrays["vectors"][rows[-1]].astype(np.float32) if len(rows) else None
+
+    def ids(self):
+        """Every indexed id (a copy)"""
+        return np.array(self._arrays["ids"]) if self._refresh() else np.empty(0, dtype=np.int64)
+
+    def stats(self):
+        count = self._refresh()
+        return {
+            "entries": count,
+            "dim": self._meta["dim"] if self._meta else None,
+            "bytes": sum(array.nbytes for array in self._arrays.values()) if count else 0,
+            "directory": self.directory,
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_directory(namespace, root=EMBEDDING_INDEX_DIR):
+    """Directory for a model namespace: readable slug plus a hash so distinct namespaces never collide"""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", namespace)[:80]
+    return os.path.join(root, f"{slug}-{hashlib.sha1(namespace.encode()).hexdigest()[:8]}")
+
+
+def open_index(namespace):
+    """The process-wide EmbeddingIndex of a model namespace"""
+    with _indexes_lock:
+        if namespace not in _indexes:
+            _indexes[namespace] = EmbeddingIndex(index_directory(namespace))
+        return _indexes[namespace]
@@ -0,0 +1,180 @@
+import io
+import os
+import logging
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Upload guards, enforced from the file header before any pixel data is decoded
+MAX_IMAGE_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 25 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 64_000_000))
+
+# EXIF orientations that rotate by 90/270 degrees and so swap width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an image exceeds the configured byte or pixel limits"""
+
+
+def _byte_size(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if hasattr(source, "size") and isinstance(source.size, int):
+        return source.size  # Django UploadedFile
+    if hasattr(source, "seek") and hasattr(source, "tell"):
+        position = source.tell()
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(position)
+        return size
+    if hasattr(source, "read"):
+        return None
+    return os.path.getsize(os.fspath(source))
+
+
+def _open(source):
+    """Open an encoded image lazily: only the header is parsed at this point"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    if hasattr(source, "read"):
+        # Django's UploadedFile may already have been read (e.g. by validation)
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return Image.open(source)
+    return Image.open(os.fspath(source))
+
+
+def check_limits(source, max_bytes=MAX_IMAGE_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """Raise ImageTooLarge if an encoded image is over the byte or pixel limit; reads the header only"""
+    size = _byte_size(source)
+    if max_bytes and size is not None and size > max_bytes:
+        raise ImageTooLarge(f"Image is {size} bytes; the limit is {max_bytes}")
+
+    image = _open(source)
+    try:
+        _check_pixels(image, max_pixels)
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def _check_pixels(image, max_pixels):
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} pixels; the limit is {max_pixels}")
+
+
+def _decode(image, target_size):
+    if target_size and image.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale while staying >= target_size
+        orientation = image.getexif().get(0x0112, 1)
+        width, height = target_size
+        if orientation in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        image.draft("RGB", (width, height))
+    elif target_size:
+        image.load()
+        # Integer box-reduce before the final resize for other formats
+        factor = min(image.size[0] // target_size[0], image.size[1] // target_size[1])
+        if factor >= 2:
+            image = image.reduce(factor)
+
+    image = ImageOps.exif_transpose(image)
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def load_image(source, target_size=None, max_bytes=MAX_IMAGE_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Return an RGB PIL image from any supported source:
+    a filesystem path, raw bytes, a file-like object (e.g. a Django UploadedFile),
+    a decoded numpy array (HxW or HxWx3/4, uint8, RGB order) or a PIL image.
+
+    Encoded sources are checked against the byte/pixel limits before decoding,
+    have their EXIF orientation applied, and when target_size (width, height) is
+    given are decoded at the smallest resolution that still covers it.
+    """
+    if isinstance(source, Image.Image):
+        return source if source.mode == "RGB" else source.convert("RGB")
+
+    if isinstance(source, np.ndarray):
+        array = source
+        if array.dtype != np.uint8:
+            array = np.clip(array, 0, 255).astype(np.uint8)
+        return Image.fromarray(array).convert("RGB")
+
+    size = _byte_size(source)
+    if max_bytes and size is not None and size > max_bytes:
+        raise ImageTooLarge(f"Image is {size} bytes; the limit is {max_bytes}")
+
+    image = _open(source)
+    try:
+        _check_pixels(image, max_pixels)
+        return _decode(image, target_size)
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def read_bytes(source):
+    """Return the encoded bytes behind a path, bytes or file-like source; None for decoded images"""
+    if isinstance(source, (Image.Image, np.ndarray)):
+        return None
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+
+    if hasattr(source, "read"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        data = source.read()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return data
+
+    with open(os.fspath(source), "rb") as f:
+        return f.read()
+
+
+def reduce_image(source, shorter_side):
+    """Decode any supported source with its shorter side scaled down to at most shorter_side, keeping aspect"""
+    image = load_image(source, target_size=(shorter_side, shorter_side))
+    scale = shorter_side / min(image.size)
+    if scale < 1:
+        size = (max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale)))
+        image = image.resize(size, Image.LANCZOS)
+    return image
+
+
+def thumbnail_image(source, max_side):
+    """Decode any supported source to fit within a max_side square, keeping aspect"""
+    image = load_image(source, target_size=(max_side, max_side))
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def encode_jpeg(image, quality=85):
+    """Encode an RGB PIL image as progressive JPEG bytes"""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def image_size(source, max_bytes=MAX_IMAGE_BYTES, max_pixels=MAX_IMAGE_PIXELS):
+    """(width, height) of an encoded image as displayed, i.e. after EXIF rotation; reads the header only"""
+    size = _byte_size(source)
+    if max_bytes and size is not None and size > max_bytes:
+        raise ImageTooLarge(f"Image is {size} bytes; the limit is {max_bytes}")
+
+    image = _open(source)
+    try:
+        _check_pixels(image, max_pixels)
+        width, height = image.size
+        if image.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        return width, height
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
@@ -0,0 +1,429 @@
+import os
+import json
+import time
+import socket
+import struct
+import atexit
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from .knowledge import BUILTIN_DISEASES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trained_models", "onnx")
+ONNX_MODEL_DIR = os.environ.get("PREDICTOR_ONNX_DIR", DEFAULT_ONNX_DIR)
+MODEL_SERVER_SOCKET = os.environ.get("PREDICTOR_MODEL_SOCKET", "/tmp/plant_disease_model.sock")
+
+# Simulated forward-pass cost of the stub backend: a fixed part per batch plus a part per image
+STUB_LATENCY_MS = float(os.environ.get("PREDICTOR_STUB_LATENCY_MS", 20))
+STUB_LATENCY_PER_IMAGE_MS = float(os.environ.get("PREDICTOR_STUB_LATENCY_PER_IMAGE_MS", 5))
+
+
+def softmax(logits):
+    """Numerically stable softmax over the class axis of an (N, C) array"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted, dtype=np.float32)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def deterministic_logits(pixel_values, num_classes):
+    """
+    Stand-in logits that depend only on each image's pixels: the top-1 class and its
+    confidence (between 0.5 and 0.99) are derived from a hash of the image, so the
+    same image always gets the same answer.
+    """
+    batch = np.ascontiguousarray(pixel_values)
+    logits = np.zeros((len(batch), num_classes), dtype=np.float32)
+    if num_classes < 2:
+        return logits
+    for i, image in enumerate(batch):
+        digest = int.from_bytes(hashlib.blake2b(image.tobytes(), digest_size=8).digest(), "big")
+        confidence = 0.5 + (digest >> 32) % 4900 / 10000.0
+        # softmax of [x, 0, ..., 0] puts `confidence` on the first entry
+        logits[i, digest % num_classes] = np.log(confidence * (num_classes - 1) / (1.0 - confidence))
+    return logits
+
+
+class InferenceBackend:
+    """
+    Engine-agnostic interface used by HuggingFacePlantPredictor.
+
+    forward() takes preprocessed float32 pixel values in NCHW layout and returns
+    raw (N, num_classes) logits as a numpy array. forward_with_embeddings() also
+    returns the (N, D) pooled image embedding the classifier head reads, or None
+    when the engine can't provide it.
+    """
+
+    name = "base"
+    framework = "Unknown"
+
+    def __init__(self, model_name, revision):
+        self.model_name = model_name
+        self.revision = revision
+        self.id2label = {}
+
+    @classmethod
+    def from_directory(cls, model_dir):
+        """Backend for a model saved in a local directory (a model registry version)"""
+        raise ValueError(f"The {cls.name} backend cannot load a model from a directory")
+
+    def forward(self, pixel_values):
+        raise NotImplementedError
+
+    def forward_with_embeddings(self, pixel_values):
+        return self.forward(pixel_values), None
+
+    def preprocessor_config(self):
+        """BatchPreprocessor arguments supplied by the backend itself, or None to read the HF config"""
+        return None
+
+    def info(self):
+        return {
+            "backend": self.name,
+            "framework": self.framework,
+            "model_name": self.model_name,
+            "revision": self.revision,
+            "num_labels": len(self.id2label),
+        }
+
+
+class TorchBackend(InferenceBackend):
+    """Eager PyTorch execution of the Hugging Face checkpoint"""
+
+    name = "torch"
+    framework = "PyTorch"
+
+    def __init__(self, model_name, revision):
+        super().__init__(model_name, revision)
+        import torch
+        from transformers import ViTForImageClassification
+
+        self._torch = torch
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = ViTForImageClassification.from_pretrained(model_name, revision=revision)
+        self.model.to(self.device)
+        self.model.eval()
+
+        self.id2label = self.model.config.id2label
+        # Resolved commit hash when available, so a moved branch is seen as a new revision
+        self.revision = getattr(self.model.config, "_commit_hash", None) or revision
+
+    @classmethod
+    def from_directory(cls, model_dir):
+        # A save_pretrained() checkpoint: from_pretrained takes the path in place of a hub id
+        return cls(model_dir, None)
+
+    def forward(self, pixel_values):
+        torch = self._torch
+        with torch.no_grad():
+            inputs = torch.from_numpy(np.ascontiguousarray(pixel_values)).to(self.device)
+            return self.model(pixel_values=inputs).logits.float().cpu().numpy()
+
+    def forward_with_embeddings(self, pixel_values):
+        torch = self._torch
+        with torch.no_grad():
+            inputs = torch.from_numpy(np.ascontiguousarray(pixel_values)).to(self.device)
+            # Same computation as model(...): the head classifies the final [CLS] token, which is the embedding
+            pooled = self.model.vit(pixel_values=inputs).last_hidden_state[:, 0, :]
+            logits = self.model.classifier(pooled)
+            return logits.float().cpu().numpy(), pooled.float().cpu().numpy()
+
+    def info(self):
+        info = super().info()
+        info["device"] = str(self.device)
+        return info
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU execution of a graph produced by `manage.py export_onnx`"""
+
+    name = "onnx"
+    framework = "ONNX Runtime"
+
+    def __init__(self, model_name, revision, model_dir=ONNX_MODEL_DIR):
+        super().__init__(model_name, revision)
+        import onnxruntime as ort
+
+        self.model_dir = model_dir
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found; run `manage.py export_onnx` first")
+
+        with open(os.path.join(model_dir, "config.json")) as f:
+            config = json.load(f)
+        self.id2label = {int(k): v for k, v in config["id2label"].items()}
+
+        export_info_path = os.path.join(model_dir, "export_info.json")
+        if os.path.exists(export_info_path):
+            with open(export_info_path) as f:
+                export_info = json.load(f)
+            if export_info.get("model_name") != model_name:
+                logger.warning(f"ONNX graph was exported from {export_info.get('model_name')}, not {model_name}")
+            self.revision = export_info.get("revision") or revision
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.environ.get("PREDICTOR_ONNX_THREADS", 0))  # 0 = onnxruntime default
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # Graphs exported before embeddings were added have the logits output only
+        outputs = [output.name for output in self.session.get_outputs()]
+        self.logits_name = outputs[0]
+        self.embedding_name = "embedding" if "embedding" in outputs else None
+
+    @classmethod
+    def from_directory(cls, model_dir):
+        # The output of `manage.py export_onnx`
+        model_name = model_dir
+        export_info_path = os.path.join(model_dir, "export_info.json")
+        if os.path.exists(export_info_path):
+            with open(export_info_path) as f:
+                model_name = json.load(f).get("model_name") or model_dir
+        return cls(model_name, None, model_dir=model_dir)
+
+    def forward(self, pixel_values):
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        return self.session.run([self.logits_name], {self.input_name: pixel_values})[0]
+
+    def forward_with_embeddings(self, pixel_values):
+        if self.embedding_name is None:
+            return self.forward(pixel_values), None
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        logits, embeddings = self.session.run(
+            [self.logits_name, self.embedding_name], {self.input_name: pixel_values}
+        )
+        return logits, embeddings
+
+    def info(self):
+        info = super().info()
+        info["model_dir"] = self.model_dir
+        info["providers"] = self.session.get_providers()
+        return info
+
+
+class StubBackend(InferenceBackend):
+    """
+    Deterministic stand-in for load-testing the web tier without a model.
+
+    The label is derived from a hash of the image and returned after a simulated
+    latency (PREDICTOR_STUB_LATENCY_MS per batch plus PREDICTOR_STUB_LATENCY_PER_IMAGE_MS
+    per image). Needs only numpy: no torch, transformers or TensorFlow import, so
+    start-up is instant and memory stays small.
+    """
+
+    name = "stub"
+    framework = "Stub (deterministic)"
+
+    def __init__(self, model_name, revision, latency_ms=None, latency_per_image_ms=None):
+        super().__init__(model_name, revision)
+        # Separate cache namespace: stub answers must never be served once the real model is back
+        self.revision = "stub"
+        self.latency_ms = STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.latency_per_image_ms = STUB_LATENCY_PER_IMAGE_MS if latency_per_image_ms is None else latency_per_image_ms
+        # Labels with built-in knowledge entries, so responses carry full disease info
+        self.id2label = {
+            i: "___".join(part.title() for part in name.split(" ", 1)).replace(" ", "_")
+            for i, name in enumerate(sorted(BUILTIN_DISEASES))
+        }
+
+    @classmethod
+    def from_directory(cls, model_dir):
+        return cls(model_dir, "stub")
+
+    def forward(self, pixel_values):
+        delay = self.latency_ms + self.latency_per_image_ms * len(pixel_values)
+        if delay > 0:
+            # Sleeping releases the GIL, like a real forward pass in native code
+            time.sleep(delay / 1000.0)
+        return deterministic_logits(pixel_values, len(self.id2label))
+
+    def forward_with_embeddings(self, pixel_values):
+        # Colour layout on an 8x8 grid: near-identical shots get near-identical embeddings
+        logits = self.forward(pixel_values)
+        n, channels, height, width = pixel_values.shape
+        pooled = pixel_values[:, :, :height // 8 * 8, :width // 8 * 8].reshape(
+            n, channels, 8, height // 8, 8, width // 8
+        ).mean(axis=(3, 5)).reshape(n, -1)
+        return logits, pooled - pooled.mean(axis=1, keepdims=True)
+
+    def preprocessor_config(self):
+        # Same input as the ViT, so decode and preprocessing cost what they do in production
+        return {"size": [224, 224], "mean": [0.5, 0.5, 0.5], "std": [0.5, 0.5, 0.5], "rescale": 1 / 255.0}
+
+    def info(self):
+        info = super().info()
+        info["latency_ms"] = self.latency_ms
+        info["latency_per_image_ms"] = self.latency_per_image_ms
+        return info
+
+
+_HEADER = struct.Struct("!II")
+
+
+def send_message(sock, header, payload=b""):
+    """Length-prefixed frame: JSON header followed by an optional raw payload"""
+    encoded = json.dumps(header).encode()
+    sock.sendall(_HEADER.pack(len(encoded), len(payload)) + encoded)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Model server connection closed")
+        received += count
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    header_size, payload_size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, header_size))
+    payload = _recv_exact(sock, payload_size) if payload_size else b""
+    return header, payload
+
+
+class RemoteBackend(InferenceBackend):
+    """
+    Client for `manage.py run_model_server`.
+
+    Pixel values are written into a shared-memory segment owned by the calling
+    thread; only a small header crosses the Unix socket, and the (N, C) logits
+    come back as the reply payload. Web workers using this backend never import
+    torch, transformers or onnxruntime.
+    """
+
+    name = "remote"
+    framework = "Model server"
+
+    def __init__(self, model_name, revision, socket_path=MODEL_SERVER_SOCKET):
+        super().__init__(model_name, revision)
+        self.socket_path = socket_path
+        self._local = threading.local()
+        self._segments = []
+        atexit.register(self.close)
+
+        self.server_info = self._request({"op": "info"})[0]
+        self.id2label = {int(k): v for k, v in self.server_info["id2label"].items()}
+        self.revision = self.server_info.get("revision") or revision
+        self.framework = f"Model server ({self.server_info.get('framework', 'unknown')})"
+
+    def _channel(self, min_bytes=0):
+        from multiprocessing import shared_memory
+
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            local.sock.connect(self.socket_path)
+            local.shm = None
+            local.pid = os.getpid()
+
+        if min_bytes and (local.shm is None or local.shm.size < min_bytes):
+            if local.shm is not None:
+                local.shm.close()
+                local.shm.unlink()
+                self._segments.remove(local.shm)
+            local.shm = shared_memory.SharedMemory(create=True, size=min_bytes)
+            self._segments.append(local.shm)
+        return local
+
+    def _request(self, header, pixel_values=None):
+        channel = self._channel(pixel_values.nbytes if pixel_values is not None else 0)
+        if pixel_values is not None:
+            np.ndarray(pixel_values.shape, dtype=np.float32, buffer=channel.shm.buf)[...] = pixel_values
+            header = dict(header, shm=channel.shm.name, shape=list(pixel_values.shape))
+        try:
+            send_message(channel.sock, header)
+            reply, payload = recv_message(channel.sock)
+        except OSError:
+            # Server restarted: reconnect on the next call
+            channel.pid = None
+            raise
+        if "error" in reply:
+            raise RuntimeError(f"Model server error: {reply['error']}")
+        return reply, payload
+
+    def forward(self, pixel_values):
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        reply, payload = self._request({"op": "forward"}, pixel_values)
+        return np.frombuffer(payload, dtype=np.float32).reshape(reply["shape"])
+
+    def preprocessor_config(self):
+        return self.server_info["preprocessing"]
+
+    def close(self):
+        for segment in self._segments:
+            try:
+                segment.close()
+                segment.unlink()
+            except OSError:
+                pass
+        self._segments = []
+
+    def info(self):
+        info = super().info()
+        info["socket"] = self.socket_path
+        info["server"] = {k: v for k, v in self.server_info.items() if k != "id2label"}
+        return info
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+    RemoteBackend.name: RemoteBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def get_backend(name):
+    """Look up a backend class by name"""
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+
+
+def compare_backends(reference, candidate, pixel_values, tolerance=1e-3):
+    """
+    Run both backends on the same preprocessed batch and report top-1 parity.
+
+    Returns a dict with per-image results and an overall 'passed' flag; an image
+    passes when both backends agree on the top-1 label and its confidence differs
+    by at most `tolerance`.
+    """
+    ref_probs = softmax(reference.forward(pixel_values))
+    cand_probs = softmax(candidate.forward(pixel_values))
+
+    rows = np.arange(len(ref_probs))
+    ref_idx = ref_probs.argmax(axis=1)
+    cand_idx = cand_probs.argmax(axis=1)
+    confidence_delta = np.abs(ref_probs[rows, ref_idx] - cand_probs[rows, ref_idx])
+
+    results = []
+    for i in rows:
+        results.append({
+            "reference_label": reference.id2label.get(int(ref_idx[i]), "Unknown"),
+            "candidate_label": candidate.id2label.get(int(cand_idx[i]), "Unknown"),
+            "confidence_delta": float(confidence_delta[i]),
+            "passed": bool(ref_idx[i] == cand_idx[i] and confidence_delta[i] <= tolerance),
+        })
+
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "tolerance": tolerance,
+        "max_confidence_delta": float(confidence_delta.max()) if len(rows) else 0.0,
+        "max_probability_delta": float(np.abs(ref_probs - cand_probs).max()) if len(rows) else 0.0,
+        "passed": all(r["passed"] for r in results),
+        "images": results,
+    }
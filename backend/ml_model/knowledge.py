@@ -0,0 +1,149 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shipped defaults; rows in the PlantDisease/Treatment/PreventionTip tables override these
+BUILTIN_DISEASES = {
+    "corn common rust": {
+        "scientific_name": "Puccinia sorghi",
+        "plant_type": "Corn",
+        "symptoms": "Small reddish-brown pustules on leaves.",
+        "causes": "Fungal infection in warm, humid conditions.",
+        "treatment_advice": [
+            "Apply appropriate fungicides",
+            "Remove infected leaves",
+            "Use resistant varieties"
+        ],
+        "prevention_tips": [
+            "Rotate crops",
+            "Avoid overhead irrigation",
+            "Plant resistant hybrids"
+        ],
+        "is_healthy": False
+    },
+    "corn healthy": {
+        "scientific_name": "Healthy plant",
+        "plant_type": "Corn",
+        "symptoms": "Green healthy leaves with no spots.",
+        "causes": "Good growing conditions.",
+        "treatment_advice": ["No treatment needed."],
+        "prevention_tips": ["Maintain good agronomic practices."],
+        "is_healthy": True
+    },
+    "potato early blight": {
+        "scientific_name": "Alternaria solani",
+        "plant_type": "Potato",
+        "symptoms": "Brown spots with concentric rings on leaves.",
+        "causes": "Fungal pathogen.",
+        "treatment_advice": [
+            "Apply fungicides",
+            "Remove infected leaves"
+        ],
+        "prevention_tips": [
+            "Crop rotation",
+            "Avoid wet foliage"
+        ],
+        "is_healthy": False
+    },
+    "potato healthy": {
+        "scientific_name": "Healthy plant",
+        "plant_type": "Potato",
+        "symptoms": "Normal green leaves.",
+        "causes": "Good plant health.",
+        "treatment_advice": ["No action needed."],
+        "prevention_tips": ["Continue good practices."],
+        "is_healthy": True
+    },
+    "tomato early blight": {
+        "scientific_name": "Alternaria solani",
+        "plant_type": "Tomato",
+        "symptoms": "Dark brown spots with rings.",
+        "causes": "Fungal disease.",
+        "treatment_advice": [
+            "Apply copper-based fungicides",
+            "Remove infected parts"
+        ],
+        "prevention_tips": [
+            "Crop rotation",
+            "Proper spacing"
+        ],
+        "is_healthy": False
+    },
+    "tomato healthy": {
+        "scientific_name": "Healthy plant",
+        "plant_type": "Tomato",
+        "symptoms": "Green healthy leaves.",
+        "causes": "Good care.",
+        "treatment_advice": ["No treatment needed."],
+        "prevention_tips": ["Maintain good care."],
+        "is_healthy": True
+    }
+}
+
+
+def normalize_label(label):
+    """Canonical form for matching: 'Corn___Common_Rust' -> 'corn common rust'"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", str(label).lower()).split())
+
+
+def default_info(label):
+    """Fallback info for labels with no knowledge entry"""
+    return {
+        "scientific_name": "Unknown",
+        "plant_type": "Unknown",
+        "symptoms": "Symptoms not available.",
+        "causes": "Cause unknown.",
+        "treatment_advice": ["Consult agricultural expert."],
+        "prevention_tips": ["Monitor plant health regularly."],
+        "is_healthy": "healthy" in normalize_label(label)
+    }
+
+
+class DiseaseKnowledgeIndex:
+    """
+    Disease information compiled once into O(1) lookups.
+
+    Every model label (from id2label) is matched against the knowledge entries
+    when the index is built: an exact normalized match wins, otherwise the
+    longest entry key contained in the label. Lookups are then plain dict hits
+    by class index or by normalized label.
+    """
+
+    def __init__(self, entries, id2label=None, version=None):
+        self.version = version
+        self._entries = {normalize_label(key): info for key, info in entries.items()}
+        # Longest keys first so "tomato early blight" beats "tomato blight"
+        self._keys_by_length = sorted(self._entries, key=len, reverse=True)
+
+        self.by_label = dict(self._entries)
+        self.by_index = {}
+        for index, label in (id2label or {}).items():
+            info = self._match(label)
+            self.by_index[int(index)] = info
+            self.by_label[normalize_label(label)] = info
+
+    def _match(self, label):
+        name = normalize_label(label)
+        if name in self._entries:
+            return self._entries[name]
+        for key in self._keys_by_length:
+            if key in name:
+                return self._entries[key]
+        return default_info(label)
+
+    def lookup(self, label):
+        """Info dict for a predicted label name"""
+        info = self.by_label.get(normalize_label(label))
+        if info is None:
+            # Labels outside id2label (e.g. "Error") are matched once, then memoized
+            info = self._match(label)
+            self.by_label[normalize_label(label)] = info
+        return info
+
+    def lookup_index(self, index):
+        """Info dict for a predicted class index"""
+        return self.by_index.get(int(index)) or default_info("Unknown")
+
+    def __len__(self):
+        return len(self._entries)
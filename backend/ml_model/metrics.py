@@ -0,0 +1,130 @@
+"""
+Prometheus metrics for the detection pipeline.
+
+Every update is an in-memory (or mmap) write, cheap enough to leave on for
+every request. Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set before this module
+is imported (see plant_disease/gunicorn_conf.py), so each worker writes its
+samples to its own files in that directory and render() merges them: counters
+and histograms are summed across workers, gauges are summed over live workers.
+Without it (runserver, management commands) the in-process registry is used.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Sub-millisecond lookups up to multi-second forward passes on CPU
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "plant_disease_stage_seconds",
+    "Time spent in each detection pipeline stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "plant_disease_stage_errors_total",
+    "Pipeline stage calls that raised",
+    ["stage"],
+)
+BATCH_SIZE = Histogram(
+    "plant_disease_batch_size",
+    "Images per model forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+PREDICTIONS = Counter(
+    "plant_disease_predictions_total",
+    "Predictions served, by the stage that answered (cache, fast or vit)",
+    ["source"],
+)
+NEAR_DUPLICATES = Counter(
+    "plant_disease_near_duplicates_total",
+    "ViT answers replaced by the stored prediction of a near-duplicate past image",
+)
+CASCADE_ESCALATIONS = Counter(
+    "plant_disease_cascade_escalations_total",
+    "Fast-model answers below their class threshold, sent on to the ViT",
+    ["label"],
+)
+MODEL_SWAPS = Counter(
+    "plant_disease_model_swaps_total",
+    "Active model version switches made without a restart, by outcome (swapped or failed)",
+    ["outcome"],
+)
+SHADOW_COMPARISONS = Counter(
+    "plant_disease_shadow_comparisons_total",
+    "Live images re-scored by the shadow candidate model, by whether its top-1 label agreed",
+    ["outcome"],
+)
+
+IN_FLIGHT = Gauge(
+    "plant_disease_requests_in_flight",
+    "Detection requests currently being processed",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+QUEUE_DEPTH = Gauge(
+    "plant_disease_queue_depth",
+    "Items waiting in an internal queue",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+MODEL_LOADED = Gauge(
+    "plant_disease_model_loaded",
+    "Worker processes with the model loaded",
+    multiprocess_mode="livesum",
+)
+MODEL_READY = Gauge(
+    "plant_disease_model_ready",
+    "Worker processes with the model loaded and warmed up",
+    multiprocess_mode="livesum",
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "plant_disease_model_load_seconds",
+    "Time taken to load the model",
+    multiprocess_mode="max",
+)
+
+
+@contextmanager
+def time_stage(stage):
+    """Observe the wall time of the enclosed block under the given stage; count it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def track_in_flight(endpoint):
+    """Count the enclosed block as an in-flight request for the endpoint"""
+    gauge = IN_FLIGHT.labels(endpoint)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def render():
+    """Return (body, content_type) of every metric in the Prometheus text format, merged across workers"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
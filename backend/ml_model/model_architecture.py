@@ -33,7 +33,8 @@ def create_model(num_classes, input_shape=(224, 224, 3)):
         layers.Dropout(0.5),
         layers.Dense(256, activation='relu'),
         layers.Dropout(0.3),
-        layers.Dense(num_classes, activation='softmax')
+        # float32 output keeps the softmax stable under a mixed_float16 policy
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model
@@ -58,7 +59,8 @@ def create_pretrained_model(num_classes, input_shape=(224, 224, 3)):
         layers.Dropout(0.5),
         layers.Dense(256, activation='relu'),
         layers.Dropout(0.3),
-        layers.Dense(num_classes, activation='softmax')
+        # float32 output keeps the softmax stable under a mixed_float16 policy
+        layers.Dense(num_classes, activation='softmax', dtype='float32')
     ])
     
     return model
\ No newline at end of file
@@ -1,30 +1,68 @@
 import tensorflow as tf
 import numpy as np
-import cv2
 import os
 import requests
 from django.conf import settings
 import logging
 
+from .image_io import load_image
+from .inference_backends import deterministic_logits, softmax
+from .preprocessing import BatchPreprocessor
+
 logger = logging.getLogger(__name__)
 
+TREATMENT_ADVICE = {
+    'Early_blight': [
+        "Apply copper-based fungicides every 7-10 days",
+        "Remove and destroy infected plant parts",
+        "Use chlorothalonil or mancozeb fungicides"
+    ],
+    'Late_blight': [
+        "Apply fungicides containing chlorothalonil or metalaxyl",
+        "Remove infected plants immediately",
+        "Avoid overhead watering"
+    ],
+    'Powdery_mildew': [
+        "Apply sulfur-based fungicides",
+        "Use neem oil as organic treatment",
+        "Improve air circulation around plants"
+    ],
+    'Bacterial_spot': [
+        "Apply copper-based bactericides",
+        "Use streptomycin sprays",
+        "Remove and destroy infected plants"
+    ]
+}
+
+DEFAULT_TREATMENT_ADVICE = [
+    "Consult with local agricultural extension",
+    "Use appropriate fungicides/bactericides",
+    "Remove infected plant material"
+]
+
+# Output order of the Keras classifiers (model_architecture.py); train_model exports models in this order
+CLASS_NAMES = [
+    'Apple_Apple_scab', 'Apple_Black_rot', 'Apple_Cedar_apple_rust', 'Apple_healthy',
+    'Blueberry_healthy', 'Cherry_healthy', 'Cherry_Powdery_mildew',
+    'Corn_Cercospora_leaf_spot Gray_leaf_spot', 'Corn_Common_rust', 'Corn_healthy', 'Corn_Northern_Leaf_Blight',
+    'Grape_Black_rot', 'Grape_Esca_(Black_Measles)', 'Grape_healthy', 'Grape_Leaf_blight_(Isariopsis_Leaf_Spot)',
+    'Orange_Haunglongbing_(Citrus_greening)', 'Peach_Bacterial_spot', 'Peach_healthy',
+    'Pepper_bell_Bacterial_spot', 'Pepper_bell_healthy',
+    'Potato_Early_blight', 'Potato_healthy', 'Potato_Late_blight',
+    'Raspberry_healthy', 'Soybean_healthy',
+    'Squash_Powdery_mildew', 'Strawberry_healthy', 'Strawberry_Leaf_scorch',
+    'Tomato_Bacterial_spot', 'Tomato_Early_blight', 'Tomato_healthy', 'Tomato_Late_blight',
+    'Tomato_Leaf_Mold', 'Tomato_Septoria_leaf_spot', 'Tomato_Spider_mites Two-spotted_spider_mite',
+    'Tomato_Target_Spot', 'Tomato_Tomato_mosaic_virus', 'Tomato_Tomato_YellowLeaf_Curl_Virus'
+]
+
 class PlantDiseasePredictor:
     def __init__(self):
         self.model = None
-        self.class_names = [
-            'Apple_Apple_scab', 'Apple_Black_rot', 'Apple_Cedar_apple_rust', 'Apple_healthy',
-            'Blueberry_healthy', 'Cherry_healthy', 'Cherry_Powdery_mildew',
-            'Corn_Cercospora_leaf_spot Gray_leaf_spot', 'Corn_Common_rust', 'Corn_healthy', 'Corn_Northern_Leaf_Blight',
-            'Grape_Black_rot', 'Grape_Esca_(Black_Measles)', 'Grape_healthy', 'Grape_Leaf_blight_(Isariopsis_Leaf_Spot)',
-            'Orange_Haunglongbing_(Citrus_greening)', 'Peach_Bacterial_spot', 'Peach_healthy',
-            'Pepper_bell_Bacterial_spot', 'Pepper_bell_healthy',
-            'Potato_Early_blight', 'Potato_healthy', 'Potato_Late_blight',
-            'Raspberry_healthy', 'Soybean_healthy',
-            'Squash_Powdery_mildew', 'Strawberry_healthy', 'Strawberry_Leaf_scorch',
-            'Tomato_Bacterial_spot', 'Tomato_Early_blight', 'Tomato_healthy', 'Tomato_Late_blight',
-            'Tomato_Leaf_Mold', 'Tomato_Septoria_leaf_spot', 'Tomato_Spider_mites Two-spotted_spider_mite',
-            'Tomato_Target_Spot', 'Tomato_Tomato_mosaic_virus', 'Tomato_Tomato_YellowLeaf_Curl_Virus'
-        ]
+        self.class_names = list(CLASS_NAMES)
+        self.preprocessors = {}
+        # Match every class label to its advice once instead of scanning per call
+        self.treatment_index = {name: self._match_treatment(name) for name in self.class_names}
         self.load_model()
     
     def load_model(self):
@@ -43,36 +81,31 @@ class PlantDiseasePredictor:
         """Create a mock model for testing"""
         # This is a placeholder. In production, replace with actual model loading.
         class MockModel:
+            def __init__(self, num_classes):
+                self.num_classes = num_classes
+
             def predict(self, x):
-                # Mock predictions - in real implementation, this would be actual model predictions
-                batch_size = x.shape[0]
-                # Generate random probabilities that sum to 1
-                predictions = np.random.rand(batch_size, len(self.class_names))
-                predictions = predictions / predictions.sum(axis=1, keepdims=True)
-                return predictions
-        return MockModel()
+                # Same image, same answer: probabilities derived from a hash of the pixels
+                return softmax(deterministic_logits(x, self.num_classes))
+        return MockModel(len(self.class_names))
     
+    def get_preprocessor(self, target_size=(256, 256)):
+        """Return a cached batch preprocessor that rescales to [0, 1] in NHWC float32"""
+        if target_size not in self.preprocessors:
+            # target_size is (width, height), like cv2 and PIL
+            self.preprocessors[target_size] = BatchPreprocessor(
+                size=(target_size[1], target_size[0]), mean=(0.0, 0.0, 0.0), std=(1.0, 1.0, 1.0), layout="NHWC"
+            )
+        return self.preprocessors[target_size]
+
     def preprocess_image(self, image_path, target_size=(256, 256)):
         """Preprocess image for model prediction"""
         try:
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError("Could not read image")
-            
-            # Convert BGR to RGB
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Resize image
-            image = cv2.resize(image, target_size)
+            # Reduced-resolution decode with EXIF orientation and size limits applied
+            image = load_image(image_path, target_size=target_size)
             
-            # Normalize pixel values
-            image = image / 255.0
-            
-            # Add batch dimension
-            image = np.expand_dims(image, axis=0)
-            
-            return image
+            # Resize, scale to [0, 1] and add the batch dimension in one float32 pass
+            return self.get_preprocessor(target_size)([image]).copy()
         except Exception as e:
             logger.error(f"Error preprocessing image: {e}")
             return None
@@ -119,40 +152,19 @@ class PlantDiseasePredictor:
             return disease_name.split('_')[0]
         return "Unknown"
     
+    def _match_treatment(self, disease_name):
+        name = disease_name.lower()
+        for key, treatment in TREATMENT_ADVICE.items():
+            if key.lower() in name:
+                return treatment
+        return DEFAULT_TREATMENT_ADVICE
+
     def get_treatment_advice(self, disease_name):
         """Get treatment advice based on disease"""
-        treatments = {
-            'Early_blight': [
-                "Apply copper-based fungicides every 7-10 days",
-                "Remove and destroy infected plant parts",
-                "Use chlorothalonil or mancozeb fungicides"
-            ],
-            'Late_blight': [
-                "Apply fungicides containing chlorothalonil or metalaxyl",
-                "Remove infected plants immediately",
-                "Avoid overhead watering"
-            ],
-            'Powdery_mildew': [
-                "Apply sulfur-based fungicides",
-                "Use neem oil as organic treatment",
-                "Improve air circulation around plants"
-            ],
-            'Bacterial_spot': [
-                "Apply copper-based bactericides",
-                "Use streptomycin sprays",
-                "Remove and destroy infected plants"
-            ]
-        }
-        
-        for key, treatment in treatments.items():
-            if key.lower() in disease_name.lower():
-                return treatment
-        
-        return [
-            "Consult with local agricultural extension",
-            "Use appropriate fungicides/bactericides",
-            "Remove infected plant material"
-        ]
+        treatment = self.treatment_index.get(disease_name)
+        if treatment is None:
+            treatment = self.treatment_index[disease_name] = self._match_treatment(disease_name)
+        return treatment
     
     def get_prevention_tips(self, disease_name):
         """Get prevention tips based on disease"""
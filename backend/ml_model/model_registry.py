@@ -0,0 +1,192 @@
+"""
+Local model registry: one directory per model version, plus a small state file.
+
+    trained_models/registry/
+        registry.json        {"active": "v2", "previous": "v1", "shadow": "v3", "shadow_percent": 5.0}
+        v1/version.json      {"backend": "torch", "source": ..., "created_at": ...} + model files
+        v2/...
+
+Only `manage.py model_registry` writes registry.json (atomically, with
+os.replace). Every web worker re-reads it at most every REGISTRY_CHECK_SECONDS
+and switches models itself, in the background, without a restart.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from types import SimpleNamespace
+
+from .inference_backends import get_backend
+from .metrics import SHADOW_COMPARISONS
+from .preprocessing import BatchPreprocessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trained_models", "registry")
+REGISTRY_DIR = os.environ.get("PREDICTOR_REGISTRY_DIR", DEFAULT_REGISTRY_DIR)
+REGISTRY_CHECK_SECONDS = float(os.environ.get("PREDICTOR_REGISTRY_CHECK_SECONDS", 5))
+
+STATE_FILE = "registry.json"
+MANIFEST_FILE = "version.json"
+EMPTY_STATE = {"active": None, "previous": None, "shadow": None, "shadow_percent": 0.0}
+
+# Shadow batches waiting for the candidate; beyond this, samples are dropped rather than queued
+SHADOW_MAX_PENDING = int(os.environ.get("PREDICTOR_SHADOW_MAX_PENDING", 4))
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    if not version or version != os.path.basename(version) or version.startswith("."):
+        raise ValueError(f"Invalid model version name {version!r}")
+    return os.path.join(registry_dir, version)
+
+
+def cache_namespace(version):
+    """Prediction cache (and embedding index) namespace of a registered version"""
+    return f"registry/{version}"
+
+
+def read_manifest(version, registry_dir=REGISTRY_DIR):
+    """version.json of one version; raises LookupError for an unknown version"""
+    path = os.path.join(version_dir(version, registry_dir), MANIFEST_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise LookupError(f"Model version '{version}' is not in the registry ({registry_dir})")
+
+
+def write_manifest(version, manifest, registry_dir=REGISTRY_DIR):
+    _write_json(os.path.join(version_dir(version, registry_dir), MANIFEST_FILE), manifest)
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Manifests of all registered versions, oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    versions = []
+    for name in os.listdir(registry_dir):
+        if os.path.isfile(os.path.join(registry_dir, name, MANIFEST_FILE)):
+            versions.append(dict(read_manifest(name, registry_dir), version=name))
+    return sorted(versions, key=lambda manifest: (manifest.get("created_at", 0), manifest["version"]))
+
+
+def read_state(registry_dir=REGISTRY_DIR):
+    """Contents of registry.json; EMPTY_STATE when nothing was ever activated"""
+    try:
+        with open(os.path.join(registry_dir, STATE_FILE)) as f:
+            return dict(EMPTY_STATE, **json.load(f))
+    except FileNotFoundError:
+        return dict(EMPTY_STATE)
+
+
+def write_state(state, registry_dir=REGISTRY_DIR):
+    _write_json(os.path.join(registry_dir, STATE_FILE), dict(state, updated_at=time.time()))
+
+
+def _write_json(path, data):
+    # Workers may read at any moment: never let them see a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def open_backend(version, registry_dir=REGISTRY_DIR):
+    """Inference backend for a registered version, built from its directory"""
+    manifest = read_manifest(version, registry_dir)
+    return get_backend(manifest.get("backend", "torch")).from_directory(version_dir(version, registry_dir))
+
+
+def preprocessor_config(version, backend, registry_dir=REGISTRY_DIR):
+    """
+    BatchPreprocessor arguments for a version: the manifest's, the backend's, or
+    read from a saved Hugging Face preprocessor_config.json (without importing transformers).
+    """
+    manifest = read_manifest(version, registry_dir)
+    if manifest.get("preprocessor"):
+        return manifest["preprocessor"]
+    config = backend.preprocessor_config()
+    if config is not None:
+        return config
+
+    path = os.path.join(version_dir(version, registry_dir), "preprocessor_config.json")
+    with open(path) as f:
+        # from_feature_extractor only reads attributes, which the saved JSON has under the same names
+        extractor = SimpleNamespace(**json.load(f))
+    return BatchPreprocessor.from_feature_extractor(extractor).config()
+
+
+class ShadowScorer:
+    """
+    Re-scores a random sample of live traffic with a candidate model and records
+    how often it agrees with the active one.
+
+    Scoring runs on its own thread, after the active model has answered, so it
+    never adds latency; when the candidate can't keep up, samples are dropped.
+    """
+
+    def __init__(self, candidate, percent, max_pending=SHADOW_MAX_PENDING):
+        self.candidate = candidate
+        self.percent = percent
+        self.max_pending = max_pending
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.compared = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.errors = 0
+        self._confidence_delta = 0.0
+        self._seconds = 0.0
+        self.started_at = time.time()
+
+    def offer(self, images, results):
+        """Maybe shadow-score some of a batch the active model just answered with results"""
+        fraction = self.percent / 100.0
+        sample = [(image, result) for image, result in zip(images, results) if random.random() < fraction]
+        if not sample:
+            return
+        if not self._pending.acquire(blocking=False):
+            with self._lock:
+                self.dropped += len(sample)
+            return
+        threading.Thread(target=self._score, args=(sample,), name="shadow-scorer", daemon=True).start()
+
+    def _score(self, sample):
+        try:
+            started = time.perf_counter()
+            results = self.candidate.predict_batch([image for image, _ in sample], record_metrics=False)
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            logger.warning(f"Shadow scoring with {self.candidate.version} failed: {e}")
+            with self._lock:
+                self.errors += len(sample)
+            return
+        finally:
+            self._pending.release()
+
+        with self._lock:
+            for (_, (label, confidence)), (shadow_label, shadow_confidence) in zip(sample, results):
+                agreed = label == shadow_label
+                self.compared += 1
+                self.agreed += agreed
+                self._confidence_delta += abs(confidence - shadow_confidence)
+                SHADOW_COMPARISONS.labels("agree" if agreed else "disagree").inc()
+            self._seconds += elapsed
+
+    def stats(self):
+        with self._lock:
+            compared = self.compared
+            return {
+                "version": self.candidate.version,
+                "percent": self.percent,
+                "compared": compared,
+                "agreement": round(self.agreed / compared, 4) if compared else None,
+                "mean_confidence_delta": round(self._confidence_delta / compared, 4) if compared else None,
+                "mean_ms_per_image": round(self._seconds * 1000.0 / compared, 3) if compared else None,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "since": self.started_at,
+            }
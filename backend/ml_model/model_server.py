@@ -0,0 +1,103 @@
+import os
+import logging
+import socketserver
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .batching import MicroBatcher
+from .inference_backends import recv_message, send_message
+
+logger = logging.getLogger(__name__)
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    """One web-worker thread's connection; requests on it are strictly sequential"""
+
+    def setup(self):
+        self.segment = None
+
+    def _attach(self, name):
+        # Clients reuse one segment per thread and only replace it to grow it
+        if self.segment is None or self.segment.name.lstrip("/") != name.lstrip("/"):
+            if self.segment is not None:
+                self.segment.close()
+            self.segment = shared_memory.SharedMemory(name=name)
+            # The client owns the segment; stop this process's tracker from unlinking it on exit
+            resource_tracker.unregister(self.segment._name, "shared_memory")
+        return self.segment
+
+    def handle(self):
+        server = self.server.model_server
+        while True:
+            try:
+                header, _ = recv_message(self.request)
+            except ConnectionError:
+                return
+
+            try:
+                if header["op"] == "info":
+                    send_message(self.request, server.info())
+                elif header["op"] == "forward":
+                    segment = self._attach(header["shm"])
+                    pixel_values = np.ndarray(header["shape"], dtype=np.float32, buffer=segment.buf)
+                    logits = np.ascontiguousarray(server.batcher.submit(pixel_values), dtype=np.float32)
+                    send_message(self.request, {"shape": list(logits.shape)}, logits.tobytes())
+                else:
+                    send_message(self.request, {"error": f"Unknown op {header['op']!r}"})
+            except Exception as e:
+                logger.error(f"Model server request failed: {e}")
+                send_message(self.request, {"error": str(e)})
+
+    def finish(self):
+        if self.segment is not None:
+            self.segment.close()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ModelServer:
+    """
+    Owns the model for every web worker on the host.
+
+    Requests from all connections go through one MicroBatcher, so concurrent
+    workers' images are merged into shared forward passes on a single,
+    right-sized inference thread pool.
+    """
+
+    def __init__(self, backend, preprocessor, socket_path, max_batch_size=8, max_wait_ms=5.0):
+        self.backend = backend
+        self.preprocessor = preprocessor
+        self.socket_path = socket_path
+        self.batcher = MicroBatcher(
+            self.forward_many, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="model-server"
+        )
+
+    def forward_many(self, batches):
+        """Concatenate several clients' pixel batches into one forward pass and split the logits back"""
+        sizes = [len(batch) for batch in batches]
+        logits = self.backend.forward(np.concatenate(batches))
+        return np.split(logits, np.cumsum(sizes)[:-1])
+
+    def info(self):
+        info = self.backend.info()
+        info["id2label"] = {str(k): v for k, v in self.backend.id2label.items()}
+        info["preprocessing"] = self.preprocessor.config()
+        return info
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = _UnixServer(self.socket_path, _ConnectionHandler)
+        server.model_server = self
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Model server listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
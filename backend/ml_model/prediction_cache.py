@@ -0,0 +1,211 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    """Stable content hash of raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUTier:
+    """Thread-safe in-process LRU with size and TTL eviction"""
+
+    def __init__(self, max_entries=4096, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """
+    Persistent tier shared by all workers on the host; survives worker restarts.
+
+    Entries of other namespaces are left alone: during a hot swap other workers
+    still serve the previous model version, and a rollback should find it warm.
+    A retired version's entries go with purge_namespace().
+    """
+
+    def __init__(self, path, namespace, ttl=7 * 24 * 3600, max_entries=None):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " key TEXT PRIMARY KEY,"
+            " namespace TEXT NOT NULL,"
+            " disease_name TEXT NOT NULL,"
+            " confidence REAL NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS predictions_namespace ON predictions (namespace, created_at)")
+        conn.execute("DELETE FROM predictions WHERE created_at < ?", (time.time() - ttl,))
+        if max_entries:
+            # Keep this namespace's newest max_entries
+            conn.execute(
+                "DELETE FROM predictions WHERE namespace = ? AND created_at < ("
+                " SELECT created_at FROM predictions WHERE namespace = ?"
+                " ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                (namespace, namespace, max_entries - 1),
+            )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not cross threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT disease_name, confidence FROM predictions"
+            " WHERE key = ? AND namespace = ? AND created_at >= ?",
+            (key, self.namespace, time.time() - self.ttl),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key, value):
+        disease_name, confidence = value
+        self._connection().execute(
+            "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+            (key, self.namespace, disease_name, confidence, time.time()),
+        )
+
+
+def purge_namespace(path, namespace):
+    """Delete a retired model version's persistent entries, including its +fast@... variants; returns the count"""
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        with conn:
+            return conn.execute(
+                "DELETE FROM predictions WHERE namespace = ? OR substr(namespace, 1, ?) = ?",
+                (namespace, len(namespace) + 1, f"{namespace}+"),
+            ).rowcount
+    except sqlite3.OperationalError:  # no predictions table yet
+        return 0
+    finally:
+        conn.close()
+
+
+class PredictionCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of (disease_name, confidence) keyed by image content hash.
+
+    The namespace should identify the model and revision so that loading a
+    different model never returns another model's answers.
+    """
+
+    def __init__(self, namespace, max_entries=4096, ttl=3600, path=None, persistent_ttl=7 * 24 * 3600,
+                 persistent_max_entries=None):
+        self.namespace = namespace
+        self.memory = LRUTier(max_entries=max_entries, ttl=ttl)
+        self.disk = None
+        if path:
+            try:
+                self.disk = SQLiteTier(path, namespace, ttl=persistent_ttl, max_entries=persistent_max_entries)
+            except sqlite3.Error as e:
+                logger.error(f"Persistent prediction cache disabled: {e}")
+
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key_for(self, data):
+        """Cache key for raw image bytes under the current model namespace"""
+        return f"{self.namespace}:{content_hash(data)}"
+
+    def get(self, data):
+        return self.get_by_key(self.key_for(data))
+
+    def set(self, data, value):
+        self.set_by_key(self.key_for(data), value)
+
+    def get_by_key(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Prediction cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set_by_key(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except sqlite3.Error as e:
+                logger.warning(f"Prediction cache write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_evictions": self.memory.evictions,
+                "persistent": self.disk is not None,
+            }
@@ -0,0 +1,111 @@
+import threading
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class BatchPreprocessor:
+    """
+    Resize, normalize and lay out a whole batch of images in one vectorized pass.
+
+    Images are resized into a reusable uint8 staging buffer, then scaled with a
+    single fused multiply-add per channel into a reusable float32 output buffer:
+        out = pixel * (rescale / std) - mean / std
+    Buffers are per thread and grow to the largest batch seen, so steady-state
+    calls allocate nothing. The returned array is a view into that buffer and is
+    only valid until the next call on the same thread.
+    """
+
+    def __init__(self, size=(224, 224), mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5),
+                 rescale=1 / 255.0, layout="NCHW", resample=Image.BILINEAR):
+        if layout not in ("NCHW", "NHWC"):
+            raise ValueError(f"Unsupported layout '{layout}'")
+
+        self.height, self.width = size
+        self.layout = layout
+        self.resample = resample
+
+        self.mean = [float(m) for m in mean]
+        self.std = [float(s) for s in std]
+        self.rescale = float(rescale)
+
+        mean = np.asarray(mean, dtype=np.float32)
+        std = np.asarray(std, dtype=np.float32)
+        self.scale = (rescale / std).astype(np.float32)
+        self.offset = (-mean / std).astype(np.float32)
+
+        self._local = threading.local()
+
+    @classmethod
+    def from_feature_extractor(cls, feature_extractor, layout="NCHW"):
+        """Mirror the resize/normalize settings of a Hugging Face ViT feature extractor"""
+        size = feature_extractor.size
+        if isinstance(size, dict):
+            size = (size["height"], size["width"])
+        elif isinstance(size, int):
+            size = (size, size)
+
+        do_normalize = getattr(feature_extractor, "do_normalize", True)
+        do_rescale = getattr(feature_extractor, "do_rescale", True)
+        return cls(
+            size=size,
+            mean=feature_extractor.image_mean if do_normalize else (0.0, 0.0, 0.0),
+            std=feature_extractor.image_std if do_normalize else (1.0, 1.0, 1.0),
+            rescale=getattr(feature_extractor, "rescale_factor", 1 / 255.0) if do_rescale else 1.0,
+            layout=layout,
+            resample=int(getattr(feature_extractor, "resample", Image.BILINEAR)),
+        )
+
+    def config(self):
+        """Constructor arguments, JSON-serializable, to rebuild an identical preprocessor elsewhere"""
+        return {
+            "size": [self.height, self.width],
+            "mean": self.mean,
+            "std": self.std,
+            "rescale": self.rescale,
+            "layout": self.layout,
+            "resample": int(self.resample),
+        }
+
+    def _buffers(self, batch_size):
+        local = self._local
+        if getattr(local, "capacity", 0) < batch_size:
+            local.capacity = batch_size
+            local.staging = np.empty((batch_size, self.height, self.width, 3), dtype=np.uint8)
+            if self.layout == "NCHW":
+                local.output = np.empty((batch_size, 3, self.height, self.width), dtype=np.float32)
+            else:
+                local.output = np.empty((batch_size, self.height, self.width, 3), dtype=np.float32)
+        return local.staging[:batch_size], local.output[:batch_size]
+
+    def _resize_into(self, image, target):
+        if isinstance(image, np.ndarray):
+            if image.shape[:2] == (self.height, self.width) and image.dtype == np.uint8:
+                target[...] = image[..., :3]
+                return
+            image = Image.fromarray(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (self.width, self.height):
+            image = image.resize((self.width, self.height), self.resample)
+        target[...] = np.asarray(image)
+
+    def __call__(self, images):
+        """Return a float32 (N, 3, H, W) or (N, H, W, 3) array for a list of RGB PIL images or uint8 arrays"""
+        images = list(images)
+        staging, output = self._buffers(len(images))
+
+        for image, target in zip(images, staging):
+            self._resize_into(image, target)
+
+        if self.layout == "NCHW":
+            # Strided read of the NHWC staging buffer, contiguous NCHW write
+            np.multiply(staging.transpose(0, 3, 1, 2), self.scale[:, None, None], out=output, casting="unsafe")
+            output += self.offset[:, None, None]
+        else:
+            np.multiply(staging, self.scale, out=output, casting="unsafe")
+            output += self.offset
+        return output
@@ -0,0 +1,175 @@
+"""
+Tiled analysis of large field and canopy images.
+
+The image is decoded once, already scaled so that one tile is exactly the
+model input size. Tiles are then strided views into that single array, so a
+photo with a hundred leaves costs one decode and one resize, not a hundred,
+and the preprocessor copies each tile straight into its batch buffer.
+"""
+import os
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from .image_io import image_size, load_image
+
+# Tile edge in source-image pixels, and the share of it neighbouring tiles overlap by
+TILE_SIZE = int(os.environ.get("TILED_TILE_SIZE", 448))
+TILE_OVERLAP = float(os.environ.get("TILED_OVERLAP", 0.25))
+# Larger tiles are used when the grid would exceed this many tiles
+MAX_TILES = int(os.environ.get("TILED_MAX_TILES", 256))
+
+# Background pre-filter: "green" (excess-green pixels, for foliage), "variance" (texture, for
+# non-green crops or heavy lesions) or "none"
+PREFILTERS = ("green", "variance", "none")
+PREFILTER = os.environ.get("TILED_PREFILTER", "green")
+MIN_GREEN_FRACTION = float(os.environ.get("TILED_MIN_GREEN_FRACTION", 0.15))
+MIN_TILE_STD = float(os.environ.get("TILED_MIN_STD", 12.0))
+# A pixel is foliage when 2G - R - B exceeds this
+GREEN_EXCESS = 20
+# Pre-filter statistics are computed on every FILTER_STEP-th pixel in each direction
+FILTER_STEP = 4
+
+# Tiles answered with less confidence than this don't count towards the verdict
+MIN_TILE_CONFIDENCE = float(os.environ.get("TILED_MIN_CONFIDENCE", 0.5))
+
+
+def tile_starts(length, tile, stride):
+    """Evenly spaced tile offsets along one axis, the last tile flush with the far edge"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / stride) + 1
+    return np.linspace(0, length - tile, count).round().astype(int).tolist()
+
+
+def plan_tile_size(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=MAX_TILES):
+    """Tile edge in source pixels: tile_size, grown if needed to keep the grid within max_tiles"""
+    largest = min(width, height)
+    tile = min(tile_size, largest)
+    while True:
+        stride = max(1, round(tile * (1 - overlap)))
+        count = len(tile_starts(height, tile, stride)) * len(tile_starts(width, tile, stride))
+        if count <= max_tiles or tile >= largest:
+            return tile
+        tile = min(largest, math.ceil(tile * math.sqrt(count / max_tiles)))
+
+
+def _integral(values):
+    """Summed-area table with a zero first row and column"""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=table[1:, 1:])
+    return table
+
+
+def _window_means(table, ys, xs, tile, step):
+    """Mean of the sampled values under every tile, four table lookups each"""
+    rows, cols = table.shape[0] - 1, table.shape[1] - 1
+    y0 = np.minimum(np.asarray(ys) // step, rows - 1)
+    x0 = np.minimum(np.asarray(xs) // step, cols - 1)
+    y1 = np.minimum(-(-(np.asarray(ys) + tile) // step), rows)
+    x1 = np.minimum(-(-(np.asarray(xs) + tile) // step), cols)
+    sums = (
+        table[np.ix_(y1, x1)] - table[np.ix_(y0, x1)] - table[np.ix_(y1, x0)] + table[np.ix_(y0, x0)]
+    )
+    return sums / ((y1 - y0)[:, None] * (x1 - x0)[None, :])
+
+
+class TileGrid:
+    """
+    One image cut into overlapping square tiles of the model input size.
+
+    tile(row, col) is a view into the scaled image; no pixels are copied until
+    the preprocessor writes the tile into its batch buffer.
+    """
+
+    def __init__(self, source, model_size, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=MAX_TILES):
+        if isinstance(source, (Image.Image, np.ndarray)):
+            source = load_image(source)
+            width, height = source.size
+        else:
+            width, height = image_size(source)
+
+        self.overlap = overlap
+        self.tile_size = plan_tile_size(width, height, tile_size, overlap, max_tiles)
+        self.scale = model_size / self.tile_size
+        self.model_size = model_size
+
+        # Scaled at decode time (JPEG DCT scaling where possible): one tile becomes model_size pixels
+        target = (max(model_size, round(width * self.scale)), max(model_size, round(height * self.scale)))
+        image = load_image(source, target_size=target)
+        if image.size != target:
+            image = image.resize(target, Image.BILINEAR, reducing_gap=3.0)
+        self.array = np.asarray(image)
+
+        stride = max(1, round(model_size * (1 - overlap)))
+        self.ys = tile_starts(self.array.shape[0], model_size, stride)
+        self.xs = tile_starts(self.array.shape[1], model_size, stride)
+        self._windows = sliding_window_view(self.array, (model_size, model_size, 3))[:, :, 0]
+
+    @property
+    def shape(self):
+        return len(self.ys), len(self.xs)
+
+    def tile(self, row, col):
+        return self._windows[self.ys[row], self.xs[col]]
+
+    def box(self, row, col):
+        """[x, y, width, height] of a tile in source-image pixels"""
+        return [
+            round(self.xs[col] / self.scale),
+            round(self.ys[row] / self.scale),
+            self.tile_size,
+            self.tile_size,
+        ]
+
+    def foreground(self, prefilter=PREFILTER, min_green=MIN_GREEN_FRACTION, min_std=MIN_TILE_STD):
+        """(rows, cols) bool array, False for tiles the pre-filter takes for background (soil, sky, sheeting)"""
+        if prefilter not in PREFILTERS:
+            raise ValueError(f"Unknown pre-filter '{prefilter}'. Choose from: {', '.join(PREFILTERS)}")
+        if prefilter == "none":
+            return np.ones(self.shape, dtype=bool)
+
+        sample = self.array[::FILTER_STEP, ::FILTER_STEP].astype(np.int16)
+        if prefilter == "green":
+            red, green, blue = sample[..., 0], sample[..., 1], sample[..., 2]
+            foliage = (2 * green - red - blue) > GREEN_EXCESS
+            return _window_means(_integral(foliage), self.ys, self.xs, self.model_size, FILTER_STEP) >= min_green
+
+        gray = sample.mean(axis=2)
+        mean = _window_means(_integral(gray), self.ys, self.xs, self.model_size, FILTER_STEP)
+        mean_sq = _window_means(_integral(gray * gray), self.ys, self.xs, self.model_size, FILTER_STEP)
+        return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0)) >= min_std
+
+
+def aggregate(results, is_healthy, min_confidence=MIN_TILE_CONFIDENCE):
+    """
+    Whole-image verdict from per-tile (label, confidence) results: the disease
+    with the most confident tile evidence, else the dominant healthy label.
+    """
+    by_label = {}
+    for label, confidence in results:
+        if confidence < min_confidence:
+            continue
+        entry = by_label.setdefault(label, [0, 0.0])
+        entry[0] += 1
+        entry[1] += confidence
+
+    labels = sorted(
+        (
+            {"label": label, "tiles": count, "mean_confidence": round(total / count, 4),
+             "is_healthy": bool(is_healthy(label))}
+            for label, (count, total) in by_label.items()
+        ),
+        key=lambda entry: entry["tiles"] * entry["mean_confidence"],
+        reverse=True,
+    )
+    diseased = [entry for entry in labels if not entry["is_healthy"]]
+    top = diseased[0] if diseased else labels[0] if labels else None
+    return {
+        "disease_detected": top["label"] if top else "Unknown",
+        "confidence": top["mean_confidence"] if top else 0.0,
+        "affected_fraction": round(sum(entry["tiles"] for entry in diseased) / len(results), 4) if results else 0.0,
+        "labels": labels,
+    }
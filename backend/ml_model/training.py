@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+import numpy as np
+import tensorflow as tf
+
+from .cascade import DEFAULT_FAST_PREPROCESSOR, FAST_LABELS_FILE, FAST_MODEL_FILE
+from .model_architecture import create_model, create_pretrained_model
+
+logger = logging.getLogger(__name__)
+
+AUTOTUNE = tf.data.AUTOTUNE
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+ARCHITECTURES = {
+    "cnn": create_model,
+    "mobilenet": create_pretrained_model,
+}
+
+
+def list_dataset(data_dir, class_names):
+    """(paths, label indices) for a class-per-folder dataset; folders not in class_names are skipped"""
+    index = {name: i for i, name in enumerate(class_names)}
+    paths, labels = [], []
+    for folder in sorted(os.listdir(data_dir)):
+        folder_path = os.path.join(data_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        if folder not in index:
+            logger.warning(f"Skipping folder '{folder}': not a known class")
+            continue
+        for root, _, names in os.walk(folder_path):
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+                    labels.append(index[folder])
+    return paths, labels
+
+
+def split_dataset(paths, labels, validation_split, seed):
+    """Shuffle once with a fixed seed (so classes interleave in the cache) and split off a validation set"""
+    order = np.random.default_rng(seed).permutation(len(paths))
+    paths = [paths[i] for i in order]
+    labels = [labels[i] for i in order]
+    n_val = int(len(paths) * validation_split)
+    return (paths[n_val:], labels[n_val:]), (paths[:n_val], labels[:n_val])
+
+
+def _decode(path, label, image_size):
+    data = tf.io.read_file(path)
+    image = tf.io.decode_image(data, channels=3, expand_animations=False)
+    image = tf.image.resize(image, image_size, antialias=True)
+    # Cached as uint8: a quarter of the disk and read bandwidth of float32
+    return tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8), label
+
+
+def _augment(image, label):
+    image = tf.image.random_flip_left_right(image)
+    image = tf.image.random_flip_up_down(image)
+    image = tf.image.rot90(image, k=tf.random.uniform([], 0, 4, dtype=tf.int32))
+    image = tf.cast(image, tf.float32)
+    image = tf.image.random_brightness(image, max_delta=0.1 * 255)
+    image = tf.image.random_contrast(image, 0.85, 1.15)
+    image = tf.image.random_saturation(image, 0.85, 1.15)
+    return tf.clip_by_value(image, 0, 255), label
+
+
+def _normalize(images, labels):
+    # Same scaling as the cascade's BatchPreprocessor at inference: [0, 1] NHWC
+    return tf.cast(images, tf.float32) * DEFAULT_FAST_PREPROCESSOR["rescale"], labels
+
+
+def cache_key(paths, image_size):
+    """Changes whenever the file list or resolution does, so a stale on-disk cache is never reused"""
+    digest = hashlib.sha256(repr(image_size).encode())
+    for path in paths:
+        digest.update(path.encode())
+    return digest.hexdigest()[:16]
+
+
+def build_dataset(paths, labels, image_size=(224, 224), batch_size=32, training=False,
+                  cache_dir=None, shuffle_buffer=1024, seed=42):
+    """
+    Streaming input pipeline: parallel decode and resize, cache of the decoded
+    uint8 images (on disk when cache_dir is given, else in memory), shuffle,
+    parallel augmentation, batching and prefetch.
+
+    Decoding happens once; later epochs read the cache, so only augmentation runs per step.
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(
+        lambda path, label: _decode(path, label, image_size),
+        num_parallel_calls=AUTOTUNE, deterministic=False,
+    )
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        split = "train" if training else "val"
+        dataset = dataset.cache(os.path.join(cache_dir, f"{split}-{cache_key(paths, image_size)}"))
+    else:
+        dataset = dataset.cache()
+
+    if training:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.map(_augment, num_parallel_calls=AUTOTUNE, deterministic=False)
+
+    dataset = dataset.batch(batch_size, drop_remainder=training)
+    dataset = dataset.map(_normalize, num_parallel_calls=AUTOTUNE)
+    return dataset.prefetch(AUTOTUNE)
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Log training steps/sec and images/sec every log_every steps and per epoch"""
+
+    def __init__(self, batch_size, log_every=50, log=logger.info):
+        super().__init__()
+        self.batch_size = batch_size
+        self.log_every = log_every
+        self.log = log
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.epoch_started = self.window_started = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        step = batch + 1
+        if step % self.log_every:
+            return
+        now = time.perf_counter()
+        rate = self.log_every / (now - self.window_started)
+        self.window_started = now
+        self.log(
+            f"epoch {self.epoch + 1} step {step}: {rate:.2f} steps/sec, "
+            f"{rate * self.batch_size:.1f} images/sec, loss {logs.get('loss', float('nan')):.4f}"
+        )
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.epoch_started
+        steps = self.params.get("steps") or 0
+        self.log(
+            f"epoch {epoch + 1} done in {elapsed:.1f}s: {steps / elapsed:.2f} steps/sec, "
+            f"{steps * self.batch_size / elapsed:.1f} images/sec"
+        )
+
+
+def benchmark_input(dataset, steps):
+    """Steps/sec the input pipeline alone can deliver; compare with training steps/sec to spot I/O starvation"""
+    iterator = iter(dataset)
+    next(iterator)  # first element pays graph tracing and thread start-up
+    started = time.perf_counter()
+    count = 0
+    for _ in range(steps):
+        try:
+            next(iterator)
+        except StopIteration:
+            break
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def export_model(model, architecture, class_names, output_dir, image_size):
+    """Save model.keras and labels.json where the cascade's FastClassifier loads them"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    if tf.keras.mixed_precision.global_policy().name != "float32":
+        # Serving runs on CPU, where float16 compute is slower: re-export in float32
+        tf.keras.mixed_precision.set_global_policy("float32")
+        serving = ARCHITECTURES[architecture](len(class_names), input_shape=(*image_size, 3))
+        serving.set_weights(model.get_weights())
+        model = serving
+
+    model.save(os.path.join(output_dir, FAST_MODEL_FILE))
+    with open(os.path.join(output_dir, FAST_LABELS_FILE), "w") as f:
+        json.dump({
+            "class_names": list(class_names),
+            "architecture": architecture,
+            "preprocessor": {**DEFAULT_FAST_PREPROCESSOR, "size": list(image_size)},
+        }, f, indent=2)
@@ -0,0 +1,12 @@
+"""
+ASGI entry point, e.g.:
+    gunicorn plant_disease.asgi:application -k uvicorn.workers.UvicornWorker
+
+Uploads are received on the event loop and /api/detect/async/ runs inference on
+a bounded executor, shedding load with 429 once its queue is full.
+"""
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'plant_disease.settings')
+application = get_asgi_application()
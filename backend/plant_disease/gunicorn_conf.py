@@ -0,0 +1,55 @@
+"""
+Gunicorn settings, loaded with: gunicorn plant_disease.wsgi --config python:plant_disease.gunicorn_conf
+
+The app (and with it the model weights) is preloaded in the master so workers
+share one copy of the weights. Warm-up inference runs in each worker after fork,
+never in the master: a torch thread pool started before fork is not fork-safe.
+
+Each worker writes Prometheus samples to its own files under
+PROMETHEUS_MULTIPROC_DIR, merged by /api/metrics/. The variable is set here,
+before the app (and prometheus_client) is imported.
+"""
+import os
+import shutil
+import tempfile
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'plant_disease_metrics')
+)
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Runs after --preload: drop samples left by a previous run and those the master
+    # wrote while loading the model, so gauges only sum over workers
+    for name in os.listdir(metrics_dir):
+        path = os.path.join(metrics_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    # Marks the worker ready once done; skips the inferences when PREDICTOR_WARMUP=0
+    from ml_model.custom_predictor import predictor
+
+    predictor.start_warm_up()
+
+
+def worker_exit(server, worker):
+    # Persist any diagnoses still waiting in the write-behind queue, then build their thumbnails
+    from disease_detector.write_behind import shutdown_queues
+
+    shutdown_queues()
+
+
+def child_exit(server, worker):
+    # Stop summing the dead worker's live gauges (in-flight, queue depth, model state)
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
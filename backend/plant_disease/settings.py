@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_filters',
     'corsheaders',
     'disease_detector',
 ]
@@ -51,6 +52,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'plant_disease.wsgi.application'
+ASGI_APPLICATION = 'plant_disease.asgi.application'
 
 DATABASES = {
     'default': {
@@ -85,6 +87,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Keep typical phone photos (3-8 MB) in memory so detection never touches disk
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_MEMORY_SIZE', 10 * 1024 * 1024))
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -98,4 +103,39 @@ STATIC_URL = '/static/'
 
 # Create directories if they don't exist
 os.makedirs(os.path.join(BASE_DIR, 'media/diagnosis_images'), exist_ok=True)
-os.makedirs(os.path.join(BASE_DIR, 'ml_model/trained_models'), exist_ok=True)
\ No newline at end of file
+os.makedirs(os.path.join(BASE_DIR, 'ml_model/trained_models'), exist_ok=True)
+
+# How often each worker checks whether the disease catalogue was edited (seconds)
+KNOWLEDGE_VERSION_CHECK_SECONDS = float(os.environ.get('KNOWLEDGE_VERSION_CHECK_SECONDS', 5))
+
+# Diagnosis history is written behind the response by a background thread;
+# when the queue is full (records or buffered image bytes) the view writes synchronously
+HISTORY_WRITE_BEHIND = os.environ.get('HISTORY_WRITE_BEHIND', '1') == '1'
+HISTORY_QUEUE_MAX_RECORDS = int(os.environ.get('HISTORY_QUEUE_MAX_RECORDS', 1000))
+HISTORY_QUEUE_MAX_BYTES = int(os.environ.get('HISTORY_QUEUE_MAX_BYTES', 256 * 1024 * 1024))
+HISTORY_FLUSH_BATCH_SIZE = int(os.environ.get('HISTORY_FLUSH_BATCH_SIZE', 100))
+HISTORY_FLUSH_INTERVAL = float(os.environ.get('HISTORY_FLUSH_INTERVAL', 1.0))
+# A failed flush is retried this often (backoff doubling from the given seconds), then written record by record
+HISTORY_FLUSH_RETRIES = int(os.environ.get('HISTORY_FLUSH_RETRIES', 3))
+HISTORY_FLUSH_RETRY_BACKOFF = float(os.environ.get('HISTORY_FLUSH_RETRY_BACKOFF', 0.5))
+
+# Diagnosis images are stored content-addressed (identical uploads share one file). A thumbnail and a
+# re-encoded model-resolution copy are made in the background; with DIAGNOSIS_STORE_ORIGINAL=0 only
+# the model-resolution copy is kept and the original upload is never written to disk
+DIAGNOSIS_STORE_ORIGINAL = os.environ.get('DIAGNOSIS_STORE_ORIGINAL', '1') == '1'
+DIAGNOSIS_THUMBNAIL_SIZE = int(os.environ.get('DIAGNOSIS_THUMBNAIL_SIZE', 160))
+DIAGNOSIS_MODEL_IMAGE_SIZE = int(os.environ.get('DIAGNOSIS_MODEL_IMAGE_SIZE', 224))
+DIAGNOSIS_JPEG_QUALITY = int(os.environ.get('DIAGNOSIS_JPEG_QUALITY', 85))
+DIAGNOSIS_DERIVATIVE_QUEUE_MAX = int(os.environ.get('DIAGNOSIS_DERIVATIVE_QUEUE_MAX', 5000))
+
+# Analytics API (/api/analytics/diagnoses/): longest range, in days or weeks, one query may cover
+ANALYTICS_MAX_PERIODS = int(os.environ.get('ANALYTICS_MAX_PERIODS', 400))
+
+# Async detection (/api/detect/async/): inference thread pool and the queue depth beyond which requests get 429
+INFERENCE_EXECUTOR_WORKERS = int(os.environ.get('INFERENCE_EXECUTOR_WORKERS', 4))
+INFERENCE_MAX_QUEUE_DEPTH = int(os.environ.get('INFERENCE_MAX_QUEUE_DEPTH', 32))
+
+# Batch detection endpoint (/api/detect/batch/)
+BATCH_DETECT_MAX_IMAGES = int(os.environ.get('BATCH_DETECT_MAX_IMAGES', 500))
+BATCH_DETECT_MAX_IMAGE_BYTES = int(os.environ.get('BATCH_DETECT_MAX_IMAGE_BYTES', 20 * 1024 * 1024))
+BATCH_DETECT_WINDOW = int(os.environ.get('BATCH_DETECT_WINDOW', 32))
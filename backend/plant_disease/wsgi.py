@@ -1,5 +1,15 @@
+import gc
 import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'plant_disease.settings')
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# With gunicorn --preload this module is imported once in the master. Loading the
+# weights here lets every forked worker share them copy-on-write; gc.freeze() keeps
+# the collector from touching (and so copying) those pages in the workers.
+if os.environ.get('PREDICTOR_PRELOAD', '1') == '1':
+    from ml_model.custom_predictor import predictor
+
+    predictor.load()
+    gc.freeze()